@@ -0,0 +1,223 @@
+"""
+Activation regions.
+
+Only the actors near the camera are moved every step. The others sleep,
+and since patrols are deterministic, an actor waking up is fast-forwarded
+to where it would be had it kept moving: long stretches of a patrol are
+skipped in one go, whole laps are skipped once the patrol repeats, and
+only the few steps around each turn are played exactly. The cost of a
+step therefore depends on the actors near the player rather than on how
+many there are in the level.
+
+Actors are found by the span of the level they can ever occupy, which
+never changes, so finding the ones overlapping the active region is a
+binary search.
+"""
+
+import math
+
+import arcade
+import numpy as np
+
+
+class SpanIndex:
+    """Finds which of a fixed set of horizontal spans overlap a range."""
+
+    def __init__(self, lefts, rights):
+        """
+        :param lefts: Left end of every span, -inf for spans without one.
+        :param rights: Right end of every span, inf for spans without one.
+        """
+        lefts = np.asarray(lefts, dtype=float)
+        rights = np.asarray(rights, dtype=float)
+
+        # Spans reaching infinitely far overlap every range
+        endless = ~(np.isfinite(lefts) & np.isfinite(rights))
+        self.endless = np.flatnonzero(endless)
+
+        # The others sorted by their left end; a span overlapping a range
+        # starts at most the widest span's width before it
+        bounded = np.flatnonzero(~endless)
+        self.order = bounded[np.argsort(lefts[bounded], kind="stable")]
+        self.lefts = lefts[self.order]
+        self.rights = rights[self.order]
+        self.reach = float((self.rights - self.lefts).max()) if len(self.order) else 0.0
+
+    def query(self, left, right):
+        """Sorted indices of the spans overlapping [left, right]."""
+        start = np.searchsorted(self.lefts, left - self.reach, side="left")
+        stop = np.searchsorted(self.lefts, right, side="right")
+        rows = self.order[start:stop][self.rights[start:stop] >= left]
+        return np.sort(np.concatenate((self.endless, rows)))
+
+
+def activation_region(left, right, margin):
+    """
+    The range [left, right] widened by at least ``margin`` on both sides.
+
+    Its ends move in steps of half a margin, so the actors only need to be
+    woken up or put to sleep every few frames.
+    """
+    if math.isinf(margin):
+        return -math.inf, math.inf
+    step = margin / 2
+    return math.floor((left - margin) / step) * step, math.ceil((right + margin) / step) * step
+
+
+def step_platform(platform):
+    """
+    Move a platform by one step: Sprite.update(), then the bounce and
+    second move arcade.PhysicsEnginePlatformer used to give it.
+    """
+    platform.update()
+
+    if platform.change_x != 0 or platform.change_y != 0:
+        if platform.boundary_left and platform.left <= platform.boundary_left:
+            platform.left = platform.boundary_left
+            if platform.change_x < 0:
+                platform.change_x *= -1
+
+        if platform.boundary_right and platform.right >= platform.boundary_right:
+            platform.right = platform.boundary_right
+            if platform.change_x > 0:
+                platform.change_x *= -1
+
+        platform.center_x += platform.change_x
+
+        if platform.boundary_top is not None and platform.top >= platform.boundary_top:
+            platform.top = platform.boundary_top
+            if platform.change_y > 0:
+                platform.change_y *= -1
+
+        if platform.boundary_bottom is not None and platform.bottom <= platform.boundary_bottom:
+            platform.bottom = platform.boundary_bottom
+            if platform.change_y < 0:
+                platform.change_y *= -1
+
+        platform.center_y += platform.change_y
+
+
+def _free_steps(change, low, high, lower_bound, upper_bound):
+    """
+    Steps a platform moving by ``change`` twice a step can surely take
+    along one axis without touching a boundary.
+
+    :param low: Edge of the platform facing lower_bound.
+    :param high: Edge of the platform facing upper_bound.
+    """
+    if change == 0:
+        return math.inf
+    if lower_bound is not None and low <= lower_bound or upper_bound is not None and high >= upper_bound:
+        return 0
+    bound = upper_bound if change > 0 else lower_bound
+    if bound is None:
+        return math.inf
+    gap = upper_bound - high if change > 0 else low - lower_bound
+    # One step less than the estimate keeps rounding from skipping a bounce
+    return max(math.floor(gap / (2 * abs(change))) - 1, 0)
+
+
+def fast_forward_platform(platform, steps):
+    """Move a platform as if it had been stepped ``steps`` times."""
+    seen = {}
+    while steps > 0:
+        free = min(_free_steps(platform.change_x, platform.left, platform.right,
+                               platform.boundary_left or None, platform.boundary_right or None),
+                   _free_steps(platform.change_y, platform.bottom, platform.top,
+                               platform.boundary_bottom, platform.boundary_top))
+        if free >= steps:
+            free = steps
+        if free:
+            platform.center_x += 2 * platform.change_x * free
+            platform.center_y += 2 * platform.change_y * free
+            steps -= free
+            if not steps:
+                break
+
+        # Close to a boundary, play the steps exactly
+        step_platform(platform)
+        steps -= 1
+
+        # Once a state comes back, the patrol is a loop and whole laps can be skipped
+        state = (platform.center_x, platform.center_y, platform.change_x, platform.change_y)
+        if state in seen:
+            steps %= seen[state] - steps
+            seen.clear()
+        seen[state] = steps
+
+
+def platform_span(platform):
+    """Horizontal span a moving platform can ever occupy."""
+    left, right = platform.left, platform.right
+    if platform.change_x == 0:
+        return left, right
+    reach = 2 * abs(platform.change_x)
+    if not platform.boundary_left or not platform.boundary_right:
+        return -math.inf, math.inf
+    return min(left, platform.boundary_left) - reach, max(right, platform.boundary_right) + reach
+
+
+class MovingPlatforms:
+    """The moving platforms of a level, of which only those near the camera move."""
+
+    def __init__(self, sprites):
+        self.sprites = list(sprites)
+
+        # Platforms moving this step, the ones the player can stand on
+        self.awake = arcade.SpriteList(use_spatial_hash=True)
+        self.awake_rows = set()
+
+        # Steps taken so far, and the step at which every platform fell asleep
+        self.tick = 0
+        self.region = None
+        self.slept_at = [0] * len(self.sprites)
+
+        spans = [platform_span(platform) for platform in self.sprites]
+        self.index = SpanIndex([left for left, _ in spans], [right for _, right in spans])
+
+    def activate(self, left, right):
+        """Wake the platforms whose span overlaps [left, right] and put the others to sleep."""
+        if (left, right) == self.region:
+            return
+        self.region = left, right
+
+        rows = set(self.index.query(left, right).tolist())
+        if rows == self.awake_rows:
+            return
+
+        for i in sorted(rows - self.awake_rows):
+            platform = self.sprites[i]
+            fast_forward_platform(platform, self.tick - self.slept_at[i])
+            self.awake.append(platform)
+
+        for i in sorted(self.awake_rows - rows):
+            self.slept_at[i] = self.tick
+            self.awake.remove(self.sprites[i])
+
+        self.awake_rows = rows
+
+    def update(self):
+        """Move the awake platforms by one step."""
+        for platform in self.awake:
+            step_platform(platform)
+        self.tick += 1
+
+    def get_state(self):
+        """Position and velocity of every platform as of now, the sleeping ones included."""
+        states = []
+        for i, platform in enumerate(self.sprites):
+            state = (platform.center_x, platform.center_y, platform.change_x, platform.change_y)
+            steps = self.tick - self.slept_at[i]
+            if i not in self.awake_rows and steps:
+                fast_forward_platform(platform, steps)
+                states.append((platform.center_x, platform.center_y, platform.change_x, platform.change_y))
+                platform.center_x, platform.center_y, platform.change_x, platform.change_y = state
+            else:
+                states.append(state)
+        return states
+
+    def set_state(self, states):
+        """Restore a state from get_state(); sleeping platforms sleep on from there."""
+        for i, (platform, state) in enumerate(zip(self.sprites, states)):
+            platform.center_x, platform.center_y, platform.change_x, platform.change_y = state
+            self.slept_at[i] = self.tick
@@ -0,0 +1,150 @@
+"""
+Time-based animation.
+
+A Clip is a sequence of frames, each shown for its own duration in
+seconds. An Animator is a small state machine playing one clip of a
+sprite at a time: every update it picks the first state whose condition
+holds for the sprite, restarts the clip when the state changed, and
+advances it by the elapsed time, so animations run at the same speed
+whatever the frame rate.
+
+Animated tiles of a level all share one clock, so the frame a tile shows
+only depends on the time. LayerAnimator therefore only touches the tiles
+on screen; tiles that scroll back into view are simply set to the current
+frame.
+"""
+
+import bisect
+import itertools
+import math
+
+import level_cache
+import textures
+
+# Clips built by load_clips(), shared by every sprite using them
+_clips = {}
+
+
+class Clip:
+    """Frames of one animation and how long each is shown."""
+
+    def __init__(self, frames, durations, loop=True):
+        """
+        :param frames: One entry per frame, e.g. a texture or a pair of
+            right/left facing textures.
+        :param durations: Seconds each frame is shown, one per frame, or
+            a single duration for all of them.
+        :param loop: Start over after the last frame instead of holding it.
+        """
+        if not isinstance(durations, (list, tuple)):
+            durations = [durations] * len(frames)
+        self.frames = list(frames)
+        self.loop = loop
+
+        # Time at which each frame ends
+        self.ends = list(itertools.accumulate(durations))
+        self.duration = self.ends[-1]
+
+    def frame_at(self, time):
+        """The frame showing ``time`` seconds into the clip."""
+        if len(self.frames) == 1 or self.duration <= 0:
+            return self.frames[0]
+        if self.loop:
+            time = math.fmod(time, self.duration)
+        index = bisect.bisect_right(self.ends, time)
+        return self.frames[min(index, len(self.frames) - 1)]
+
+
+def load_clips(spec):
+    """
+    Build the clips of a texture pair animation spec.
+
+    :param spec: Dict of clip name to (path format, first frame, last
+        frame, seconds per frame), see textures.load_animation().
+    :returns: Dict of clip name to Clip, the frames being texture pairs.
+    """
+    clips = {}
+    for name, (path_format, first, last, frame_duration) in spec.items():
+        key = (path_format, first, last, frame_duration)
+        clip = _clips.get(key)
+        if clip is None:
+            clip = _clips[key] = Clip(textures.load_animation(path_format, first, last), frame_duration)
+        clips[name] = clip
+    return clips
+
+
+class Animator:
+    """Plays the clip matching a sprite's current state."""
+
+    __slots__ = ("clips", "states", "state", "time")
+
+    def __init__(self, clips, states):
+        """
+        :param clips: Dict of state name to Clip.
+        :param states: List of (state name, condition) in priority order,
+            where condition takes the sprite and returns True when the
+            state applies. The last one should always apply.
+        """
+        self.clips = clips
+        self.states = states
+        self.state = None
+        self.time = 0.0
+
+    def update(self, sprite, delta_time):
+        """Advance by ``delta_time`` seconds and return the frame to show."""
+        for state, condition in self.states:
+            if condition(sprite):
+                break
+        if state != self.state:
+            self.state = state
+            self.time = 0.0
+        else:
+            self.time += delta_time
+        return self.clips[state].frame_at(self.time)
+
+
+class LayerAnimator:
+    """Animates the tiles of streamed level layers that are on screen."""
+
+    def __init__(self, level, streamer, layers):
+        """
+        :param level: The LevelData the tiles come from.
+        :param streamer: The LevelStreamer holding the tiles' sprites.
+        :param layers: Names of the layers to animate.
+        """
+        self.level = level
+        self.streamer = streamer
+        self.layers = [name for name in layers if name in streamer.layers]
+
+        # One clip per animation of the level, its frames being textures
+        self.clips = [Clip([level_cache.get_texture(level, texture) for texture, _, _ in frames],
+                           [duration / 1000 for _, _, duration in frames])
+                      for frames in level.header["animations"]]
+
+        # Animation of every record of each layer, -1 for static tiles
+        self.animations = {name: level.sprites(name)["animation"].tolist() for name in self.layers}
+
+        # Seconds since the level started, shared by every tile
+        self.time = 0.0
+
+    def update(self, left, right, delta_time):
+        """Advance the clock and show the current frame on the tiles overlapping [left, right]."""
+        self.time += delta_time
+        frames = [clip.frame_at(self.time) for clip in self.clips]
+
+        width = self.level.chunk_width
+        reach = self.streamer.reach
+        first = math.floor((left - reach) / width)
+        last = math.floor((right + reach) / width)
+        for chunk in range(first, last + 1):
+            layers = self.streamer.loaded.get(chunk)
+            if layers is None:
+                continue
+            for name in self.layers:
+                animations = self.animations[name]
+                for sprite in layers[name]:
+                    animation = animations[sprite.properties["record_index"]]
+                    if animation >= 0:
+                        texture = frames[animation]
+                        if sprite.texture is not texture:
+                            sprite.texture = texture
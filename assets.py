@@ -0,0 +1,242 @@
+"""
+Packed sprite assets.
+
+The character frames and tileset images are packed ahead of time into one
+or more atlas sheets, with a JSON manifest holding for every image its
+rectangle on a sheet, the hash of its pixels, its hit box points and the
+flipped variants the game uses. Sheets are stored as raw RGBA pixels, so
+loading the pack reads one file per sheet and decodes nothing; textures
+are then cut from the sheets with their hit box and hash taken from the
+manifest, so nothing is hashed or traced at runtime either.
+
+The manifest records a hash of the source images and the pack options;
+when any of them change the pack is rebuilt. Packs are built on first use;
+``python main.py --pack-assets`` builds the pack ahead of time.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+import arcade
+import PIL.Image
+
+# Where the pack is written, next to the compiled levels
+PACK_DIR = os.path.join("data", "cache")
+PACK_NAME = "assets"
+
+# Bump when the manifest layout changes so old packs are rebuilt
+PACK_VERSION = 1
+
+# Largest sheet; images that do not fit start a new one
+MAX_SHEET_SIZE = 1024
+
+# Transparent pixels left between two images on a sheet
+PADDING = 1
+
+# Flipped variants built from every image, see textures.load_texture_pair()
+FLIPS = ["left_right"]
+
+# The pack loaded by load_pack(), with the files it was loaded for
+_pack = None
+_pack_files = None
+_lock = threading.Lock()
+
+
+def manifest_path(pack_dir=PACK_DIR):
+    return os.path.join(pack_dir, f"{PACK_NAME}.json")
+
+
+def source_hash(files):
+    """Hash of the source images and the pack options."""
+    digest = hashlib.sha256()
+    digest.update(json.dumps([PACK_VERSION, MAX_SHEET_SIZE, PADDING, FLIPS, list(files)]).encode())
+    for file_name in files:
+        with open(file_name, "rb") as source:
+            digest.update(source.read())
+    return digest.hexdigest()
+
+
+def _write_file(path, data):
+    """
+    Write ``data`` to ``path`` through a temporary file of its own, so
+    builders in other processes never rename each other's half-written files.
+    """
+    handle, temporary = tempfile.mkstemp(dir=os.path.dirname(path), prefix=os.path.basename(path), suffix=".tmp")
+    try:
+        with os.fdopen(handle, "wb") as output:
+            output.write(data)
+        os.replace(temporary, path)
+    except BaseException:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        raise
+
+
+def _shelves(sizes, max_size):
+    """
+    Place rectangles on sheets, tallest first, in rows filled left to right.
+
+    :param sizes: (width, height) of every rectangle, padding included.
+    :returns: (sheet, x, y) of every rectangle, and the (width, height)
+        of every sheet.
+    """
+    places = [None] * len(sizes)
+    sheets = []
+    x = y = shelf_height = 0
+    for i in sorted(range(len(sizes)), key=lambda i: (-sizes[i][1], -sizes[i][0])):
+        width, height = sizes[i]
+        if width > max_size or height > max_size:
+            raise ValueError(f"A {width}x{height} image does not fit on a {max_size}px sheet")
+        if not sheets or x + width > max_size:
+            # Next shelf, or a new sheet once this one is full
+            x, y = 0, y + shelf_height
+            shelf_height = 0
+            if not sheets or y + height > max_size:
+                sheets.append([0, 0])
+                y = 0
+        places[i] = (len(sheets) - 1, x, y)
+        x += width
+        shelf_height = max(shelf_height, height)
+        sheet = sheets[-1]
+        sheet[0] = max(sheet[0], x)
+        sheet[1] = max(sheet[1], y + shelf_height)
+    return places, [tuple(sheet) for sheet in sheets]
+
+
+def pack_assets(files, pack_dir=PACK_DIR):
+    """
+    Pack images into atlas sheets and write them with their manifest.
+
+    :param files: Image file names, relative to the working directory.
+    :returns: Path of the manifest written.
+    """
+    files = list(files)
+    images = [PIL.Image.open(file_name).convert("RGBA") for file_name in files]
+    places, sizes = _shelves([(image.width + PADDING, image.height + PADDING) for image in images],
+                             MAX_SHEET_SIZE)
+
+    sheets = [PIL.Image.new("RGBA", size, (0, 0, 0, 0)) for size in sizes]
+    frames = {}
+    for file_name, image, (sheet, x, y) in zip(files, images, places):
+        sheets[sheet].paste(image, (x, y))
+        # The texture the game would load from the file, for its hash and hit box
+        texture = arcade.load_texture(file_name)
+        frames[file_name] = {
+            "sheet": sheet,
+            "rect": [x, y, image.width, image.height],
+            "hash": texture.image_data.hash,
+            "hit_box": [[float(px), float(py)] for px, py in texture.hit_box_points],
+            "flips": FLIPS,
+        }
+
+    os.makedirs(pack_dir, exist_ok=True)
+    sheet_infos = []
+    for index, sheet in enumerate(sheets):
+        sheet_name = f"{PACK_NAME}{index}.rgba"
+        _write_file(os.path.join(pack_dir, sheet_name), sheet.tobytes())
+        sheet_infos.append({"file": sheet_name, "size": list(sheet.size)})
+
+    manifest = {
+        "version": PACK_VERSION,
+        "source_hash": source_hash(files),
+        "sheets": sheet_infos,
+        "frames": frames,
+    }
+    output = manifest_path(pack_dir)
+    _write_file(output, json.dumps(manifest).encode())
+    return output
+
+
+class AssetPack:
+    """A loaded pack: its sheets in memory, ready to cut textures from."""
+
+    def __init__(self, manifest_name):
+        with open(manifest_name) as manifest_file:
+            self.manifest = json.load(manifest_file)
+        self.frames = self.manifest["frames"]
+
+        pack_dir = os.path.dirname(manifest_name)
+        self.sheets = []
+        for sheet in self.manifest["sheets"]:
+            with open(os.path.join(pack_dir, sheet["file"]), "rb") as sheet_file:
+                pixels = sheet_file.read()
+            self.sheets.append(PIL.Image.frombuffer("RGBA", tuple(sheet["size"]), pixels, "raw", "RGBA", 0, 1))
+
+    def __contains__(self, file_name):
+        return file_name in self.frames
+
+    def image(self, file_name):
+        """The pixels of a packed image."""
+        frame = self.frames[file_name]
+        x, y, width, height = frame["rect"]
+        return self.sheets[frame["sheet"]].crop((x, y, x + width, y + height))
+
+    def texture(self, file_name):
+        """Texture of a whole packed image, with the hit box and hash of the manifest."""
+        frame = self.frames[file_name]
+        texture = arcade.Texture(self.image(file_name), hit_box_points=frame["hit_box"], hash=frame["hash"])
+        texture.file_path = file_name
+        return texture
+
+    def texture_pair(self, file_name):
+        """Right and left facing textures of a packed image, like arcade.load_texture_pair()."""
+        texture = self.texture(file_name)
+        return texture, texture.flip_left_right()
+
+    def region_texture(self, file_name, x, y, width, height, hit_box_algorithm=None):
+        """Texture of part of a packed image, like arcade.load_texture() with a crop."""
+        frame = self.frames[file_name]
+        left, top = frame["rect"][:2]
+        image = self.sheets[frame["sheet"]].crop((left + x, top + y, left + x + width, top + y + height))
+        texture = arcade.Texture(image, hit_box_algorithm=hit_box_algorithm)
+        texture.file_path = file_name
+        texture.crop_values = (x, y, width, height)
+        return texture
+
+
+def build_pack(files, pack_dir=PACK_DIR):
+    """
+    Pack ``files`` unless the pack on disk is already up to date.
+
+    :returns: Path of the manifest.
+    """
+    files = list(files)
+    output = manifest_path(pack_dir)
+    manifest = None
+    if os.path.exists(output):
+        with open(output) as manifest_file:
+            manifest = json.load(manifest_file)
+    if manifest is None or manifest.get("source_hash") != source_hash(files):
+        pack_assets(files, pack_dir)
+    return output
+
+
+def load_pack(files, pack_dir=PACK_DIR):
+    """
+    Load the pack of ``files``, packing them first if the pack is missing
+    or stale. The pack is kept for the rest of the process, see current().
+    """
+    global _pack, _pack_files
+    files = list(files)
+    with _lock:
+        if _pack is not None and _pack_files == files:
+            return _pack
+
+        _pack = AssetPack(build_pack(files, pack_dir))
+        _pack_files = files
+        return _pack
+
+
+def current():
+    """The pack loaded by load_pack(), None if none was."""
+    return _pack
+
+
+def clear():
+    """Forget the loaded pack; images load from their files again."""
+    global _pack, _pack_files
+    with _lock:
+        _pack = _pack_files = None
@@ -0,0 +1,243 @@
+"""
+Run many headless episodes of the game in parallel.
+
+Episodes are spread over a pool of worker processes, one per core by
+default. The compiled levels are loaded once by this process and copied
+into shared memory, and every worker reads them from there instead of
+loading and parsing the maps itself. Each worker builds the game once and
+starts every further episode by restoring the level's snapshot. Results
+stream back through a queue as soon as each episode finishes, and so does
+the traceback of a worker that fails, which is raised again here.
+
+    python batch.py 1000                      # 1000 episodes on every core
+    python batch.py 1000 --workers 4 --policy random --output results.csv
+"""
+
+import argparse
+import csv
+import gc
+import multiprocessing
+import os
+import queue
+import random
+import time
+import traceback
+from multiprocessing import shared_memory
+
+# Workers never open a window
+os.environ.setdefault("ARCADE_HEADLESS", "1")
+
+import assets
+import level_cache
+from main import (INPUT_DOWN, INPUT_LEFT, INPUT_RIGHT, INPUT_UP, LEVEL_MAPS,
+                  GameSimulation, load_level_data, packed_images, preload_level)
+
+# Longest episode, in ticks, unless told otherwise
+DEFAULT_MAX_TICKS = 3600
+
+# Chance per tick that a bot changes what it is pressing
+KEY_CHANGE_CHANCE = 0.1
+
+# Seconds to wait for a result before checking that the workers are alive
+RESULT_TIMEOUT = 1.0
+
+# Fields of every result, in order
+RESULT_FIELDS = ["episode", "seed", "outcome", "ticks", "death_tick", "score", "distance"]
+
+
+def hold_right(rng, keys):
+    """Run right, jumping now and then."""
+    if rng.random() < KEY_CHANGE_CHANCE:
+        return INPUT_RIGHT | INPUT_UP
+    return INPUT_RIGHT
+
+
+def random_keys(rng, keys):
+    """Press and release random keys."""
+    if rng.random() < KEY_CHANGE_CHANCE:
+        return keys ^ rng.choice((INPUT_LEFT, INPUT_RIGHT, INPUT_UP, INPUT_DOWN))
+    return keys
+
+
+# Bots playing the episodes, called every tick with a seeded Random and the held keys
+POLICIES = {
+    "right": hold_right,
+    "random": random_keys,
+}
+
+
+def share_levels(maps):
+    """Copy the compiled levels into shared memory, returning {map name: SharedMemory}."""
+    shared = {}
+    for map_name in dict.fromkeys(maps):
+        level = load_level_data(map_name)
+        memory = shared_memory.SharedMemory(create=True, size=len(level.buffer))
+        memory.buf[:len(level.buffer)] = level.buffer
+        shared[map_name] = memory
+    return shared
+
+
+def attach_levels(names):
+    """Attach the shared memory blocks named in ``names``, returning {map name: SharedMemory}."""
+    return {map_name: shared_memory.SharedMemory(name=name) for map_name, name in names.items()}
+
+
+def shared_level_data(blocks):
+    """LevelData of every map, read from its shared memory block."""
+    return {map_name: level_cache.LevelData(map_name, buffer=memory.buf.toreadonly())
+            for map_name, memory in blocks.items()}
+
+
+def play_episode(simulation, episode, seed, policy, max_ticks):
+    """Play one episode from the start of the level and return its result."""
+    rng = random.Random(seed)
+    keys = 0
+    distance = simulation.player_sprite.center_x
+    outcome = "timeout"
+    for tick in range(max_ticks):
+        keys = policy(rng, keys)
+        simulation.step(keys)
+        if simulation.game_over:
+            outcome = "death"
+            break
+        distance = max(distance, simulation.player_sprite.center_x)
+        if simulation.level_complete:
+            outcome = "complete"
+            break
+
+    return {
+        "episode": episode,
+        "seed": seed,
+        "outcome": outcome,
+        "ticks": tick + 1,
+        "death_tick": tick + 1 if outcome == "death" else None,
+        "score": simulation.score,
+        "distance": distance,
+    }
+
+
+def play_episodes(levels, maps, tasks, results, policy, max_ticks, seed):
+    """Play the episodes taken from ``tasks`` on the given LevelData until it hands out None."""
+    simulation = GameSimulation(maps, lambda map_name: preload_level(levels[map_name]))
+    simulation.setup()
+
+    while True:
+        episode = tasks.get()
+        if episode is None:
+            break
+        simulation.restore(simulation.initial_state)
+        results.put(("result", play_episode(simulation, episode, seed + episode, policy, max_ticks)))
+
+
+def worker(shared_names, maps, tasks, results, policy_name, max_ticks, seed):
+    """Process entry point: play episodes, or send back why it could not."""
+    blocks = attach_levels(shared_names)
+    try:
+        play_episodes(shared_level_data(blocks), maps, tasks, results, POLICIES[policy_name], max_ticks, seed)
+    except Exception:
+        results.put(("error", f"{multiprocessing.current_process().name}:\n{traceback.format_exc()}"))
+    finally:
+        # Nothing may look into the shared memory any more once it is
+        # closed; the game and the level data die with play_episodes()
+        gc.collect()
+        for memory in blocks.values():
+            memory.close()
+
+
+def run_batch(episodes, workers=None, policy="right", max_ticks=DEFAULT_MAX_TICKS, seed=0, maps=LEVEL_MAPS):
+    """
+    Play ``episodes`` episodes of the first level over a pool of processes.
+
+    :returns: Iterator over the result dicts (RESULT_FIELDS), in the order
+        the episodes finish.
+    :raises RuntimeError: If a worker fails or dies.
+    """
+    if max_ticks < 1:
+        raise ValueError(f"max_ticks must be at least 1, not {max_ticks}")
+    workers = workers or os.cpu_count()
+    # Build the asset pack here once, so the workers only ever read it
+    assets.build_pack(packed_images())
+    shared = share_levels(maps)
+    shared_names = {map_name: memory.name for map_name, memory in shared.items()}
+
+    # Workers are started fresh so none of them inherits this process' OpenGL state
+    context = multiprocessing.get_context("spawn")
+    tasks = context.Queue()
+    results = context.Queue()
+    for episode in range(episodes):
+        tasks.put(episode)
+    for _ in range(workers):
+        tasks.put(None)
+
+    processes = [context.Process(target=worker, name=f"episodes-{index}", daemon=True,
+                                 args=(shared_names, maps, tasks, results, policy, max_ticks, seed))
+                 for index in range(workers)]
+    for process in processes:
+        process.start()
+
+    try:
+        received = 0
+        while received < episodes:
+            try:
+                kind, payload = results.get(timeout=RESULT_TIMEOUT)
+            except queue.Empty:
+                for process in processes:
+                    if not process.is_alive() and process.exitcode != 0:
+                        raise RuntimeError(f"Worker {process.name} died with exit code {process.exitcode}")
+                if not any(process.is_alive() for process in processes):
+                    raise RuntimeError(f"Workers exited after {received} of {episodes} episodes")
+                continue
+            if kind == "error":
+                raise RuntimeError(f"Worker failed in {payload}")
+            received += 1
+            yield payload
+        for process in processes:
+            process.join()
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        for memory in shared.values():
+            memory.close()
+            memory.unlink()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("episodes", type=int)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--policy", choices=sorted(POLICIES), default="right")
+    parser.add_argument("--max-ticks", type=int, default=DEFAULT_MAX_TICKS)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", metavar="FILE", help="write every result to a CSV file as it arrives")
+    args = parser.parse_args()
+    if args.max_ticks < 1:
+        parser.error("--max-ticks must be at least 1")
+
+    output = open(args.output, "w", newline="") if args.output else None
+    writer = csv.DictWriter(output, RESULT_FIELDS) if output else None
+    if writer:
+        writer.writeheader()
+
+    outcomes = {}
+    ticks = 0
+    start = time.perf_counter()
+    first_result = None
+    for result in run_batch(args.episodes, args.workers, args.policy, args.max_ticks, args.seed):
+        first_result = first_result or time.perf_counter()
+        outcomes[result["outcome"]] = outcomes.get(result["outcome"], 0) + 1
+        ticks += result["ticks"]
+        if writer:
+            writer.writerow(result)
+    elapsed = time.perf_counter() - start
+    if output:
+        output.close()
+
+    first = f"first result after {first_result - start:.2f}s" if first_result is not None else "no results"
+    print(f"{args.episodes} episodes on {args.workers} workers in {elapsed:.2f}s "
+          f"({args.episodes / elapsed:.1f} episodes/s, {ticks / elapsed:.0f} ticks/s, {first})")
+    print(", ".join(f"{count} {outcome}" for outcome, count in sorted(outcomes.items())))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,10 @@
+"""
+Benchmarks for Silent Valley.
+
+Run them from the repository root, e.g. ``python -m benchmarks.enemies``.
+"""
+
+import os
+
+# None of the benchmarks need a visible window
+os.environ.setdefault("ARCADE_HEADLESS", "1")
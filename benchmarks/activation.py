@@ -0,0 +1,111 @@
+"""
+Per-step cost of enemies and moving platforms versus how many there are,
+with and without activation regions.
+
+Actors are spread over a level many screens wide while the camera pans
+across it. Without activation every actor moves every step; with it only
+the actors within the margin of the camera do, and the ones the camera
+reaches are fast-forwarded as they wake up.
+
+Enemy steps include finding the enemies touching the player and those on
+screen, as GameSimulation does; syncing the sprites on screen costs the
+same either way and is left out. Platform steps move and bounce every
+platform that is awake, as MovingPlatforms.update() does.
+"""
+
+import argparse
+import random
+import time
+
+import arcade
+
+from activation import MovingPlatforms, activation_region, step_platform
+from benchmarks.enemies import LEVEL_SCREENS, SCREEN_HEIGHT, SCREEN_WIDTH, make_sprites
+from enemies import EnemySwarm
+from main import ACTIVATION_MARGIN, PLAYER_MOVEMENT_SPEED
+
+
+def camera_left(step):
+    """Left edge of the camera panning right at the player's speed."""
+    return step * PLAYER_MOVEMENT_SPEED
+
+
+def time_enemies(count, texture, steps, margin):
+    """Average ms of an enemy step, and the number of enemies awake at the end."""
+    swarm = EnemySwarm()
+    for sprite in make_sprites(count, texture):
+        swarm.add_sprite(sprite)
+
+    start = time.perf_counter()
+    for step in range(steps):
+        left = camera_left(step)
+        if margin is not None:
+            swarm.activate(*activation_region(left, left + SCREEN_WIDTH, margin))
+        swarm.update()
+        player = left + SCREEN_WIDTH / 2
+        swarm.rows_in_box(player - 20, player + 20, 100, 160)
+        swarm.rows_in_box(left, left + SCREEN_WIDTH, 0, SCREEN_HEIGHT)
+    elapsed = (time.perf_counter() - start) / steps * 1000
+    return elapsed, len(swarm.awake_rows())
+
+
+def make_platforms(count, texture):
+    rng = random.Random(count)
+    sprites = arcade.SpriteList(use_spatial_hash=True)
+    for _ in range(count):
+        platform = arcade.Sprite(texture, scale=2)
+        platform.center_x = rng.uniform(0, SCREEN_WIDTH * LEVEL_SCREENS)
+        platform.center_y = rng.uniform(100, 200)
+        platform.boundary_bottom = platform.center_y - rng.uniform(50, 100)
+        platform.boundary_top = platform.center_y + rng.uniform(50, 100)
+        platform.change_y = rng.choice((-2, 2))
+        sprites.append(platform)
+    return sprites
+
+
+def time_platforms(count, texture, steps, margin):
+    """Average ms of a platform step, and the number of platforms awake at the end."""
+    sprites = make_platforms(count, texture)
+    platforms = MovingPlatforms(sprites)
+
+    start = time.perf_counter()
+    for step in range(steps):
+        left = camera_left(step)
+        if margin is not None:
+            platforms.activate(*activation_region(left, left + SCREEN_WIDTH, margin))
+            platforms.update()
+        else:
+            for platform in sprites:
+                step_platform(platform)
+    elapsed = (time.perf_counter() - start) / steps * 1000
+    return elapsed, len(platforms.awake) if margin is not None else count
+
+
+def print_table(name, counts, measure, args, texture):
+    print(f"{name:>10} {'all awake ms':>13} {'activation ms':>14} {'awake':>6} {'speedup':>8}")
+    for count in counts:
+        awake_ms, _ = measure(count, texture, args.steps, None)
+        activation_ms, awake = measure(count, texture, args.steps, args.margin)
+        print(f"{count:>10} {awake_ms:>13.3f} {activation_ms:>14.3f} {awake:>6} "
+              f"{awake_ms / activation_ms:>7.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--enemies", type=int, nargs="+", default=[100, 1000, 10000, 100000])
+    parser.add_argument("--platforms", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--steps", type=int, default=300)
+    parser.add_argument("--margin", type=float, default=ACTIVATION_MARGIN)
+    args = parser.parse_args()
+
+    texture = arcade.load_texture("data/bat/bat_flying1.png")
+
+    print(f"Camera panning {args.steps * PLAYER_MOVEMENT_SPEED}px of a {LEVEL_SCREENS} screen level, "
+          f"margin {args.margin:g}px")
+    print_table("enemies", args.enemies, time_enemies, args, texture)
+    print()
+    print_table("platforms", args.platforms, time_platforms, args, texture)
+
+
+if __name__ == "__main__":
+    main()
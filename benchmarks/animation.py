@@ -0,0 +1,85 @@
+"""
+Per-frame tile animation cost versus level length.
+
+Uses the same synthesized long levels as benchmarks.streaming. "sprites"
+gives every animated tile of the level its own time-based animated sprite
+and updates all of them every frame, as Scene.update_animation() did.
+"on screen" streams the level around a scrolling camera and lets a
+LayerAnimator update only the tiles overlapping the screen.
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import arcade
+
+import level_cache
+from animation import LayerAnimator
+from benchmarks.streaming import SCROLL_SPEED, repeat_level
+from main import ANIMATED_LAYERS, SCREEN_WIDTH, STREAMED_LAYERS, load_level_data
+from streaming import LevelStreamer
+
+MAP_NAME = "data/map1.json"
+
+
+def animated_sprites(level):
+    """One arcade.AnimatedTimeBasedSprite per animated tile of the level."""
+    sprites = arcade.SpriteList()
+    for name in ANIMATED_LAYERS:
+        for record in level.sprites(name):
+            if record["animation"] < 0:
+                continue
+            sprite = arcade.AnimatedTimeBasedSprite(level_cache.get_texture(level, record["texture"]))
+            sprite.frames = [arcade.AnimationKeyframe(tile_id, duration, level_cache.get_texture(level, texture))
+                             for texture, tile_id, duration in level.header["animations"][record["animation"]]]
+            sprite.position = float(record["center_x"]), float(record["center_y"])
+            sprites.append(sprite)
+    return sprites
+
+
+def run_sprites(level, frames):
+    sprites = animated_sprites(level)
+    start = time.perf_counter()
+    for _ in range(frames):
+        sprites.update_animation(1 / 60)
+    return (time.perf_counter() - start) * 1000 / frames, len(sprites)
+
+
+def run_on_screen(level, frames):
+    scene = level_cache.build_scene(level, streamed=STREAMED_LAYERS)
+    streamer = LevelStreamer(level, scene, STREAMED_LAYERS)
+    animator = LayerAnimator(level, streamer, ANIMATED_LAYERS)
+    elapsed = 0
+    for frame in range(frames):
+        left = frame * SCROLL_SPEED % (level.pixel_width - SCREEN_WIDTH)
+        # Streaming is measured by benchmarks.streaming, only the animation is timed here
+        streamer.update(left, left + SCREEN_WIDTH)
+        start = time.perf_counter()
+        animator.update(left, left + SCREEN_WIDTH, 1 / 60)
+        elapsed += time.perf_counter() - start
+    animated = sum(1 for name in animator.layers for sprite in scene[name]
+                   if animator.animations[name][sprite.properties["record_index"]] >= 0)
+    return elapsed * 1000 / frames, animated
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--copies", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--frames", type=int, default=2000)
+    args = parser.parse_args()
+
+    level = load_level_data(MAP_NAME)
+
+    print(f"{'copies':>6} {'mode':>10} {'ms/frame':>9} {'animated tiles':>15}")
+    with tempfile.TemporaryDirectory() as directory:
+        for copies in args.copies:
+            long_level = repeat_level(level, copies, os.path.join(directory, f"x{copies}.level"))
+            for mode, run in (("sprites", run_sprites), ("on screen", run_on_screen)):
+                elapsed, animated = run(long_level, args.frames)
+                print(f"{copies:>6} {mode:>10} {elapsed:>9.3f} {animated:>15}")
+
+
+if __name__ == "__main__":
+    main()
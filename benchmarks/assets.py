@@ -0,0 +1,110 @@
+"""
+Sprite texture loading: every image from its own file versus the asset pack.
+
+Each way is timed in a fresh process (cold start, nothing decoded yet):
+loading the player and bat animations and every texture of the first
+level, counting the image files decoded and the hit boxes computed on the
+way. The game is then drawn for a few frames to count the textures added
+to the sprite atlas and the texture binds per frame.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+MAP_NAME = "data/map1.json"
+
+MODES = ["files", "pack"]
+
+
+def cold_run(mode, frames):
+    """Load the sprite textures one way and draw the game; returns the measurements."""
+    import arcade
+    import PIL.Image
+    from arcade.gl import Texture2D
+    from arcade.texture_atlas import TextureAtlas
+
+    import assets
+    import level_cache
+    from animation import load_clips
+    from benchmarks.suite import make_game_view
+    from main import BAT_CLIPS, PLAYER_CLIPS, SIMULATION_DELTA, load_level_data, packed_images
+
+    counts = dict.fromkeys(["decodes", "hit boxes", "atlas adds", "binds"], 0)
+
+    def counted(name, function):
+        def wrapper(*args, **kwargs):
+            counts[name] += 1
+            return function(*args, **kwargs)
+        return wrapper
+
+    PIL.Image.open = counted("decodes", PIL.Image.open)
+    for algorithm in {arcade.hitbox.algo_default, arcade.hitbox.algo_bounding_box}:
+        algorithm.calculate = counted("hit boxes", algorithm.calculate)
+
+    # The compiled level is loaded the same way either way, so it is left out
+    level = load_level_data(MAP_NAME)
+    files = packed_images()
+    counts["decodes"] = 0
+
+    start = time.perf_counter()
+    if mode == "pack":
+        assets.load_pack(files)
+    load_clips(PLAYER_CLIPS)
+    load_clips(BAT_CLIPS)
+    level_cache.preload_textures(level)
+    load_ms = (time.perf_counter() - start) * 1000
+    results = {"load ms": load_ms, "decodes": counts["decodes"], "hit boxes": counts["hit boxes"]}
+
+    TextureAtlas.add = counted("atlas adds", TextureAtlas.add)
+    Texture2D.use = counted("binds", Texture2D.use)
+    window, view = make_game_view(level)
+    view.on_draw()
+    window.ctx.finish()
+    results["atlas adds"] = counts["atlas adds"]
+
+    counts["binds"] = 0
+    for _ in range(frames):
+        view.on_update(SIMULATION_DELTA)
+        view.on_draw()
+    window.ctx.finish()
+    results["binds/frame"] = counts["binds"] / frames
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=60)
+    parser.add_argument("--repeat", type=int, default=5, help="cold runs of each way, the best is kept")
+    parser.add_argument("--cold", choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.cold:
+        print(json.dumps(cold_run(args.cold, args.frames)))
+        return
+
+    env = dict(os.environ)
+    if sys.platform.startswith("linux") and not os.environ.get("DISPLAY"):
+        env["ARCADE_HEADLESS"] = "1"
+
+    # Build the pack up front so the cold runs measure loading it, not packing
+    subprocess.run([sys.executable, "main.py", "--pack-assets"], env=env, check=True, capture_output=True)
+
+    print(f"{'textures':>9} {'load ms':>8} {'decodes':>8} {'hit boxes':>10} {'atlas adds':>11} {'binds/frame':>12}")
+    for mode in MODES:
+        runs = []
+        for _ in range(args.repeat):
+            output = subprocess.run([sys.executable, "-m", "benchmarks.assets", "--cold", mode,
+                                     "--frames", str(args.frames)],
+                                    env=env, check=True, capture_output=True, text=True).stdout
+            runs.append(json.loads(output.splitlines()[-1]))
+        best = min(runs, key=lambda run: run["load ms"])
+        print(f"{mode:>9} {best['load ms']:>8.1f} {best['decodes']:>8} {best['hit boxes']:>10} "
+              f"{best['atlas adds']:>11} {best['binds/frame']:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+"""
+Batch runner throughput versus worker count.
+
+Plays the same episodes with 1, 2, 4, ... workers up to the number of
+cores and reports episodes per second and the speedup over one worker.
+Worker start-up is included, so use enough episodes to amortize it.
+"""
+
+import argparse
+import os
+import time
+
+from batch import run_batch
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--episodes", type=int, default=400)
+    parser.add_argument("--workers", type=int, nargs="+",
+                        default=[count for count in (1, 2, 4, 8, 16, 32, 64) if count <= os.cpu_count()])
+    parser.add_argument("--policy", default="right")
+    args = parser.parse_args()
+
+    print(f"{'workers':>7} {'episodes/s':>11} {'speedup':>8} {'efficiency':>11}")
+    single = None
+    for workers in args.workers:
+        start = time.perf_counter()
+        for _ in run_batch(args.episodes, workers, args.policy):
+            pass
+        rate = args.episodes / (time.perf_counter() - start)
+        single = single or rate / workers
+        print(f"{workers:>7} {rate:>11.1f} {rate / single:>7.2f}x {rate / single / workers:>10.0%}")
+
+
+if __name__ == "__main__":
+    main()
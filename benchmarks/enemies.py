@@ -0,0 +1,85 @@
+"""
+Per-frame enemy update cost versus enemy count.
+
+Compares the old SpriteList.update() plus per-sprite boundary loop with
+EnemySwarm.update() followed by syncing the sprites in one screen.
+"""
+
+import argparse
+import random
+import time
+
+import arcade
+
+from enemies import EnemySwarm
+
+SCREEN_WIDTH = 900
+SCREEN_HEIGHT = 490
+
+# Enemies are spread over a level this many screens wide
+LEVEL_SCREENS = 50
+
+
+def make_sprites(count, texture):
+    rng = random.Random(count)
+    sprites = arcade.SpriteList()
+    for _ in range(count):
+        sprite = arcade.Sprite(texture, scale=3)
+        sprite.center_x = rng.uniform(0, SCREEN_WIDTH * LEVEL_SCREENS)
+        sprite.center_y = rng.uniform(0, SCREEN_HEIGHT)
+        sprite.boundary_left = sprite.center_x - rng.uniform(100, 600)
+        sprite.boundary_right = sprite.center_x + rng.uniform(100, 600)
+        sprite.change_x = rng.choice((-2, 2))
+        sprites.append(sprite)
+    return sprites
+
+
+def sprite_loop_frame(sprites):
+    sprites.update()
+    for enemy in sprites:
+        if enemy.boundary_right and enemy.right > enemy.boundary_right and enemy.change_x > 0:
+            enemy.change_x *= -1
+        if enemy.boundary_left and enemy.left < enemy.boundary_left and enemy.change_x < 0:
+            enemy.change_x *= -1
+
+
+def time_frames(frame, frames):
+    start = time.perf_counter()
+    for _ in range(frames):
+        frame()
+    return (time.perf_counter() - start) / frames * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--counts", type=int, nargs="+", default=[10, 100, 1000, 10000, 100000])
+    parser.add_argument("--frames", type=int, default=60)
+    parser.add_argument("--max-sprite-loop", type=int, default=10000,
+                        help="skip the old loop above this many enemies")
+    args = parser.parse_args()
+
+    texture = arcade.load_texture("data/bat/bat_flying1.png")
+
+    print(f"{'enemies':>8} {'sprite loop ms':>15} {'swarm ms':>10} {'speedup':>8}")
+    for count in args.counts:
+        sprites = make_sprites(count, texture)
+
+        swarm = EnemySwarm()
+        for sprite in sprites:
+            swarm.add_sprite(sprite)
+
+        def swarm_frame():
+            swarm.update()
+            swarm.sync_sprites(0, SCREEN_WIDTH, 0, SCREEN_HEIGHT)
+
+        swarm_ms = time_frames(swarm_frame, args.frames)
+
+        if count <= args.max_sprite_loop:
+            loop_ms = time_frames(lambda: sprite_loop_frame(sprites), args.frames)
+            print(f"{count:>8} {loop_ms:>15.3f} {swarm_ms:>10.3f} {loop_ms / swarm_ms:>7.1f}x")
+        else:
+            print(f"{count:>8} {'-':>15} {swarm_ms:>10.3f} {'-':>8}")
+
+
+if __name__ == "__main__":
+    main()
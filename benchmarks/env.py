@@ -0,0 +1,44 @@
+"""
+VectorEnv throughput: game steps per second versus the number of games.
+
+Every game runs right and jumps at random. Steps per second counts the
+steps of all games, observations included.
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from env import VectorEnv
+from main import INPUT_RIGHT, INPUT_UP
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--counts", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--steps", type=int, default=500)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'games':>5} {'steps/s':>8} {'observe us':>11} {'episodes':>9}")
+    for count in args.counts:
+        env = VectorEnv(count)
+        env.reset()
+        episodes = 0
+        start = time.perf_counter()
+        for _ in range(args.steps):
+            actions = INPUT_RIGHT | (rng.random(count) < 0.1) * INPUT_UP
+            _, _, dones, _ = env.step(actions)
+            episodes += int(dones.sum())
+        elapsed = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for _ in range(100):
+            env.observe()
+        observe = (time.perf_counter() - start) / 100
+        print(f"{count:>5} {count * args.steps / elapsed:>8.0f} {observe * 1e6:>11.1f} {episodes:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Level load time: parsing the Tiled map versus the compiled level cache.
+
+Each approach is timed once in a fresh process (cold start, nothing
+decoded yet) and then repeatedly in the same process, which is what a
+restart from GameOverView costs.
+"""
+
+import argparse
+import subprocess
+import sys
+import time
+
+import arcade
+
+import level_cache
+from main import COIN_SCALING, LAYER_NAME_COINS, TILE_SCALING, load_level_data
+
+MAP_NAME = "data/map1.json"
+
+
+def load_tilemap():
+    tile_map = arcade.load_tilemap(MAP_NAME, TILE_SCALING, {LAYER_NAME_COINS: {"scaling": COIN_SCALING}})
+    return arcade.Scene.from_tilemap(tile_map)
+
+
+def load_cached():
+    return level_cache.build_scene(load_level_data(MAP_NAME))
+
+
+LOADERS = {"tilemap": load_tilemap, "cache": load_cached}
+
+
+def time_load(loader):
+    start = time.perf_counter()
+    loader()
+    return (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--cold", choices=LOADERS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.cold:
+        print(time_load(LOADERS[args.cold]))
+        return
+
+    # Make sure the cache exists so the cold run measures loading, not compiling
+    load_level_data(MAP_NAME)
+
+    print(f"{'loader':>8} {'cold ms':>9} {'restart ms':>11}")
+    for name, loader in LOADERS.items():
+        cold = subprocess.run([sys.executable, "-m", "benchmarks.level_load", "--cold", name],
+                              capture_output=True, text=True, check=True)
+        loader()
+        warm = sum(time_load(loader) for _ in range(args.repeat)) / args.repeat
+        print(f"{name:>8} {float(cold.stdout.split()[-1]):>9.2f} {warm:>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
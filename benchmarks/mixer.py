@@ -0,0 +1,80 @@
+"""
+Cost of playing sound effects while picking up coin clusters.
+
+Every few frames the player picks up a cluster of coins at once, and jumps
+now and then. Compares arcade.play_sound() for every event, as GameView
+used to do, with the Mixer and its fixed voice pool. Frames are paced at
+60 per second so sounds finish as they would in game.
+"""
+
+import argparse
+import time
+
+import arcade
+import pyglet
+from pyglet import media
+
+from main import EVENT_COIN, EVENT_JUMP, SOUND_EFFECTS, SIMULATION_DELTA
+from mixer import Mixer
+
+
+def events(frame, cluster, cluster_every):
+    """Events of a frame: a coin cluster every few frames, a jump every 20."""
+    frame_events = []
+    if frame % cluster_every == 0:
+        frame_events += [EVENT_COIN] * cluster
+    if frame % 20 == 0:
+        frame_events.append(EVENT_JUMP)
+    return frame_events
+
+
+def run(play, flush, frames, cluster, cluster_every, playing):
+    """Average ms spent on sounds per frame, and the most players alive at once."""
+    elapsed = 0.0
+    peak = 0
+    next_frame = time.perf_counter()
+    for frame in range(frames):
+        start = time.perf_counter()
+        for event in events(frame, cluster, cluster_every):
+            play(event)
+        flush()
+        elapsed += time.perf_counter() - start
+        peak = max(peak, playing())
+
+        # Let finished players report their end of stream
+        pyglet.clock.tick()
+        pyglet.app.platform_event_loop.dispatch_posted_events()
+        next_frame += SIMULATION_DELTA
+        time.sleep(max(next_frame - time.perf_counter(), 0))
+    return elapsed / frames * 1000, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--frames", type=int, default=240)
+    parser.add_argument("--cluster", type=int, nargs="+", default=[1, 10, 50],
+                        help="coins picked up at once")
+    parser.add_argument("--cluster-every", type=int, default=10, help="frames between two clusters")
+    args = parser.parse_args()
+
+    sounds = {name: arcade.load_sound(file_name) for name, file_name in SOUND_EFFECTS.items()}
+
+    print(f"Audio driver: {type(media.get_audio_driver()).__name__}")
+    print(f"{'cluster':>8} {'play_sound ms':>14} {'players':>8} {'peak':>5} {'mixer ms':>9} {'voices':>7} {'peak':>5}")
+    for cluster in args.cluster:
+        created = sum(len(events(frame, cluster, args.cluster_every)) for frame in range(args.frames))
+        sound_ms, sound_peak = run(lambda event: arcade.play_sound(sounds[event]), lambda: None,
+                                   args.frames, cluster, args.cluster_every,
+                                   lambda: sum(player.playing for player in media.Source._players))
+
+        mixer = Mixer(SOUND_EFFECTS)
+        mixer_ms, mixer_peak = run(mixer.play, mixer.update, args.frames, cluster, args.cluster_every,
+                                   lambda: sum(voice.playing for voice in mixer.voices))
+        mixer.stop()
+
+        print(f"{cluster:>8} {sound_ms:>14.3f} {created:>8} {sound_peak:>5} "
+              f"{mixer_ms:>9.3f} {len(mixer.voices):>7} {mixer_peak:>5}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""
+Cost of getting background music started.
+
+Compares decoding a whole track up front, as InstructionView used to do,
+with opening it for streaming. Reports wall time and how much resident
+memory each approach added.
+"""
+
+import argparse
+import resource
+import time
+
+import arcade
+
+from music import open_track
+
+
+def resident_kb():
+    """Peak resident set size of this process in KiB (Linux)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def measure(label, load, file_name):
+    before = resident_kb()
+    start = time.perf_counter()
+    result = load(file_name)
+    elapsed = (time.perf_counter() - start) * 1000
+    print(f"{label:>10}: {elapsed:8.1f} ms, +{resident_kb() - before:7d} KiB peak RSS")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("track", nargs="?", default="data/music/track1.mp3")
+    args = parser.parse_args()
+
+    # Streaming first: the peak RSS only ever grows, so the full decode
+    # would hide the streaming cost if it ran first
+    measure("streaming", open_track, args.track)
+    measure("decoded", arcade.load_sound, args.track)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Per-frame particle cost versus the number of live particles.
+
+Embers are spawned over the screen at the rate that keeps the given number
+alive, rising and fading out like the fire in game. Compares a pool of
+arcade.Sprite objects, one per particle, moved in Python and drawn as a
+SpriteList, with the ParticlePool drawing them all in one instanced call
+with their motion worked out on the GPU. The update time covers spawning
+and moving the particles, the draw time uploading and drawing them and
+waiting for the GPU to finish, which with a software renderer (llvmpipe,
+as reported on the first line) rasterizes on the CPU.
+"""
+
+import argparse
+import math
+import random
+import time
+
+import arcade
+import numpy as np
+from PIL import Image
+
+from main import PARTICLE_KINDS, SCREEN_HEIGHT, SCREEN_WIDTH
+from particles import ParticleEffects
+
+# Ticks every particle lives
+LIFE = 60
+
+# Spawning area and motion, like the embers over the fire
+SPEED = (0.5, 1.5)
+ANGLE = (70, 110)
+SCALE = (0.25, 0.45)
+
+
+def make_sprites(count):
+    """Pool of ``count`` sprites, recycled as the particles die."""
+    path, frames, frame_ticks, *_ = PARTICLE_KINDS["ember"]
+    width, height = Image.open(path).size
+    textures = [arcade.load_texture(path, x=i * width // frames, y=0, width=width // frames, height=height)
+                for i in range(frames)]
+    sprites = arcade.SpriteList(capacity=count)
+    ages = []
+    for i in range(count):
+        sprite = arcade.Sprite(textures[0])
+        sprites.append(sprite)
+        # Spread the ages so as many die every tick
+        ages.append(-(i * LIFE // count))
+    rng = random.Random(count)
+
+    def respawn(sprite):
+        angle = math.radians(rng.uniform(*ANGLE))
+        speed = rng.uniform(*SPEED)
+        sprite.position = rng.uniform(0, SCREEN_WIDTH), rng.uniform(0, SCREEN_HEIGHT / 2)
+        sprite.change_x = math.cos(angle) * speed
+        sprite.change_y = math.sin(angle) * speed
+        sprite.scale = rng.uniform(*SCALE)
+
+    def tick(time_step):
+        for i, sprite in enumerate(sprites):
+            age = ages[i] + 1
+            if age <= 0 or age >= LIFE:
+                respawn(sprite)
+                age = 0
+            ages[i] = age
+            sprite.center_x += sprite.change_x
+            sprite.center_y += sprite.change_y
+            sprite.texture = textures[(age // frame_ticks) % frames]
+            sprite.alpha = int(255 * (1 - age / LIFE))
+
+    return tick, sprites.draw
+
+
+def make_pool(count):
+    """A ParticlePool spawning ``count / LIFE`` embers a tick."""
+    kind = list(PARTICLE_KINDS["ember"])
+    kind[3] = count
+    effects = ParticleEffects({"ember": kind}, seed=count)
+    pool = effects["ember"]
+    per_tick = max(count // LIFE, 1)
+    rng = np.random.default_rng(count)
+    x = rng.uniform(0, SCREEN_WIDTH, per_tick)
+    y = rng.uniform(0, SCREEN_HEIGHT / 2, per_tick)
+
+    def tick(time_step):
+        pool.spawn(per_tick, x, y, speed=SPEED, angle=ANGLE, life=(LIFE, LIFE), scale=SCALE,
+                   spread=(8, 8))
+        effects.update()
+
+    return tick, effects.draw
+
+
+def run(window, make, count, frames):
+    """Average (update ms, draw ms) of a frame, once ``count`` particles are alive."""
+    tick, draw = make(count)
+    camera = arcade.SimpleCamera(viewport=(0, 0, SCREEN_WIDTH, SCREEN_HEIGHT))
+    for time_step in range(LIFE):
+        tick(time_step)
+
+    update = 0
+    drawing = 0
+    for frame in range(frames):
+        window.clear()
+        camera.use()
+        window.ctx.finish()
+        start = time.perf_counter()
+        tick(frame)
+        update += time.perf_counter() - start
+        start = time.perf_counter()
+        draw()
+        window.ctx.finish()
+        drawing += time.perf_counter() - start
+    return update * 1000 / frames, drawing * 1000 / frames
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--particles", type=int, nargs="+", default=[1000, 10000, 50000, 100000])
+    parser.add_argument("--frames", type=int, default=60)
+    parser.add_argument("--sprites-max", type=int, default=10000,
+                        help="Skip the sprites above this many particles, they get too slow")
+    args = parser.parse_args()
+
+    window = arcade.Window(SCREEN_WIDTH, SCREEN_HEIGHT, visible=False)
+    print(f"Renderer: {window.ctx.info.RENDERER}")
+
+    print(f"{'particles':>10} {'mode':>8} {'update ms':>10} {'draw ms':>8}")
+    for count in args.particles:
+        modes = (("sprites", make_sprites), ("pool", make_pool))
+        for mode, make in modes:
+            if mode == "sprites" and count > args.sprites_max:
+                continue
+            update, drawing = run(window, make, count, args.frames)
+            print(f"{count:>10} {mode:>8} {update:>10.3f} {drawing:>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
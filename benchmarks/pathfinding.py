@@ -0,0 +1,126 @@
+"""
+Chasing enemies' pathfinding cost per step versus their number.
+
+Chasers are scattered over the free cells of map1 while the player walks
+from one end of the level to the other. Every step each chaser is given a
+velocity towards the player, with the path searched again whenever the
+player moves into another cell. Compares one A* search per chaser against
+the one FlowField shared by all of them.
+"""
+
+import argparse
+import heapq
+import math
+import time
+
+import numpy as np
+
+from main import LAYER_NAME_PLATFORMS, PLAYER_MOVEMENT_SPEED, load_level_data
+from pathfinding import NEIGHBOURS, FlowField
+from tile_index import TileIndex
+
+MAP_NAME = "data/map1.json"
+
+# Height the player walks along
+WALK_Y = 300
+
+# Distance the chasers fly per step
+CHASE_SPEED = 3
+
+
+def a_star(field, start, goal):
+    """Next cell on a shortest path from ``start`` to ``goal``, or None."""
+    height, width = field.solid.shape
+    solid = field.solid
+    costs = {start: 0.0}
+    came_from = {}
+    queue = [(0.0, start)]
+    while queue:
+        _, cell = heapq.heappop(queue)
+        if cell == goal:
+            while came_from.get(cell, start) != start:
+                cell = came_from[cell]
+            return cell if cell != start else None
+        row, column = cell
+        for d_row, d_column in NEIGHBOURS:
+            r, c = row + d_row, column + d_column
+            if not (0 <= r < height and 0 <= c < width) or solid[r, c]:
+                continue
+            if d_row and d_column and (solid[row, c] or solid[r, column]):
+                continue
+            cost = costs[cell] + math.hypot(d_row, d_column)
+            if cost < costs.get((r, c), math.inf):
+                costs[(r, c)] = cost
+                came_from[(r, c)] = cell
+                heapq.heappush(queue, (cost + math.hypot(goal[0] - r, goal[1] - c), (r, c)))
+    return None
+
+
+def steer(x, y, goal_x, goal_y):
+    """Velocities taking positions towards their goals, like FlowField.steer()."""
+    d_x, d_y = goal_x - x, goal_y - y
+    length = np.maximum(np.hypot(d_x, d_y), 1e-9)
+    scale = np.minimum(CHASE_SPEED, length) / length
+    return d_x * scale, d_y * scale
+
+
+def time_a_star(field, x, y, walk):
+    """Average ms of a step with one A* search per chaser."""
+    waypoints = [None] * len(x)
+    target = None
+    start = time.perf_counter()
+    for player_x in walk:
+        goal = field.cell(player_x, WALK_Y)
+        if goal != target:
+            target = goal
+            waypoints = [a_star(field, field.cell(cx, cy), goal) for cx, cy in zip(x.tolist(), y.tolist())]
+        goal_x = np.array([player_x if w is None else (w[1] + 0.5) * field.cell_width for w in waypoints])
+        goal_y = np.array([WALK_Y if w is None else (w[0] + 0.5) * field.cell_height for w in waypoints])
+        steer(x, y, goal_x, goal_y)
+    return (time.perf_counter() - start) / len(walk) * 1000
+
+
+def time_flow_field(field, x, y, walk):
+    """Average ms of a step with the shared flow field."""
+    start = time.perf_counter()
+    for player_x in walk:
+        field.update(player_x, WALK_Y)
+        field.steer(x, y, player_x, WALK_Y, CHASE_SPEED)
+    return (time.perf_counter() - start) / len(walk) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chasers", type=int, nargs="+", default=[1, 10, 100, 1000, 10000])
+    parser.add_argument("--a-star-max", type=int, default=100,
+                        help="Skip A* above this many chasers, it gets too slow")
+    args = parser.parse_args()
+
+    level = load_level_data(MAP_NAME)
+    index = TileIndex(level, LAYER_NAME_PLATFORMS)
+    walk = np.arange(0, level.pixel_width, PLAYER_MOVEMENT_SPEED, dtype=float)
+
+    start = time.perf_counter()
+    FlowField.from_index(index)
+    print(f"Flow field built in {(time.perf_counter() - start) * 1000:.2f} ms, "
+          f"{len(walk)} steps across {MAP_NAME}")
+
+    print(f"{'chasers':>8} {'A* ms':>9} {'flow field ms':>14} {'speedup':>8}")
+    for count in args.chasers:
+        field = FlowField.from_index(index)
+        free_rows, free_columns = np.nonzero(~field.solid)
+        rng = np.random.default_rng(count)
+        cells = rng.integers(len(free_rows), size=count)
+        x = (free_columns[cells] + rng.random(count)) * field.cell_width
+        y = (free_rows[cells] + rng.random(count)) * field.cell_height
+
+        field_ms = time_flow_field(field, x, y, walk)
+        if count <= args.a_star_max:
+            a_star_ms = time_a_star(field, x, y, walk)
+            print(f"{count:>8} {a_star_ms:>9.3f} {field_ms:>14.3f} {a_star_ms / field_ms:>7.1f}x")
+        else:
+            print(f"{count:>8} {'-':>9} {field_ms:>14.3f} {'-':>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Platformer physics cost per step versus the number of bodies.
+
+Player-sized bodies are dropped across map1 and walk left and right,
+jumping now and then when on the ground. Every step asks each body
+whether it can jump, moves it, and asks again, as GameSimulation does for
+the player. Compares one arcade.PhysicsEnginePlatformer per body against
+the Platforms sprite list, one PlatformerPhysics per body against the
+tile grid, and all bodies moved at once by Bodies.
+"""
+
+import argparse
+import random
+import time
+
+import arcade
+import numpy as np
+
+import level_cache
+from main import (GRAVITY, LAYER_NAME_PLATFORMS, PLAYER_JUMP_SPEED, PLAYER_MOVEMENT_SPEED,
+                  PLAYER_STEP_HEIGHT, PlayerCharacter, load_level_data)
+from physics import Bodies, PlatformerPhysics, TileWalls
+from tile_index import TileIndex
+
+MAP_NAME = "data/map1.json"
+
+# Height bodies are dropped from
+DROP_Y = 450
+
+# Chance for a body on the ground to jump on a step
+JUMP_CHANCE = 0.05
+
+
+def make_players(starts, directions):
+    players = []
+    for (center_x, center_y), direction in zip(starts, directions):
+        player = PlayerCharacter()
+        player.center_x = center_x
+        player.center_y = center_y
+        player.change_x = direction * PLAYER_MOVEMENT_SPEED
+        players.append(player)
+    return players
+
+
+def time_engines(engines, jumps):
+    """Average ms of a step of one engine per body."""
+    start = time.perf_counter()
+    for step_jumps in jumps:
+        for engine, jump in zip(engines, step_jumps.tolist()):
+            if engine.can_jump(y_distance=10) and jump:
+                engine.player_sprite.change_y = PLAYER_JUMP_SPEED
+            engine.update()
+    return (time.perf_counter() - start) / len(jumps) * 1000
+
+
+def time_bodies(bodies, jumps):
+    """Average ms of a step of all bodies at once."""
+    start = time.perf_counter()
+    for step_jumps in jumps:
+        bodies.change_y[bodies.grounded(10) & step_jumps] = PLAYER_JUMP_SPEED
+        bodies.update()
+    return (time.perf_counter() - start) / len(jumps) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bodies", type=int, nargs="+", default=[1, 10, 100, 1000])
+    parser.add_argument("--steps", type=int, default=60)
+    args = parser.parse_args()
+
+    level = load_level_data(MAP_NAME)
+    scene = level_cache.build_scene(level, {LAYER_NAME_PLATFORMS: {"use_spatial_hash": True}})
+    walls = TileWalls(TileIndex(level, LAYER_NAME_PLATFORMS))
+
+    probe = PlayerCharacter()
+    width, height = probe.right - probe.left, probe.top - probe.bottom
+
+    print(f"{'bodies':>7} {'arcade ms':>10} {'tile grid ms':>13} {'speedup':>8} {'batched ms':>11} {'speedup':>8}")
+    for count in args.bodies:
+        rng = random.Random(count)
+        starts = [(rng.uniform(0, level.pixel_width), DROP_Y) for _ in range(count)]
+        directions = [rng.choice((-1, 1)) for _ in range(count)]
+        jumps = np.random.default_rng(count).random((args.steps, count)) < JUMP_CHANCE
+
+        arcade_engines = [arcade.PhysicsEnginePlatformer(player, gravity_constant=GRAVITY,
+                                                         walls=[scene[LAYER_NAME_PLATFORMS]])
+                          for player in make_players(starts, directions)]
+        arcade_ms = time_engines(arcade_engines, jumps)
+
+        tile_engines = [PlatformerPhysics(player, walls, gravity_constant=GRAVITY, step_height=PLAYER_STEP_HEIGHT)
+                        for player in make_players(starts, directions)]
+        tile_ms = time_engines(tile_engines, jumps)
+
+        # Centered on the players' hit boxes
+        bodies = Bodies(walls, [x + (probe.left + probe.right) / 2 - probe.center_x for x, _ in starts],
+                        DROP_Y + (probe.bottom + probe.top) / 2 - probe.center_y, width, height,
+                        gravity_constant=GRAVITY)
+        bodies.change_x[:] = np.array(directions) * PLAYER_MOVEMENT_SPEED
+        bodies_ms = time_bodies(bodies, jumps)
+
+        print(f"{count:>7} {arcade_ms:>10.3f} {tile_ms:>13.3f} {arcade_ms / tile_ms:>7.1f}x "
+              f"{bodies_ms:>11.3f} {arcade_ms / bodies_ms:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Cost of the frame profiler: simulation ticks with it off and on.
+
+Steps the same ticks with the profiler disabled, as the game normally
+runs, and with every phase recorded. Also reports the bare cost of
+entering and leaving a phase either way.
+"""
+
+import argparse
+import time
+
+from main import INPUT_RIGHT, GameSimulation
+from profiling import profiler
+
+
+def tick_time(ticks):
+    simulation = GameSimulation()
+    simulation.setup()
+    start = time.perf_counter()
+    for _ in range(ticks):
+        profiler.next_frame()
+        with profiler.phase("step"):
+            simulation.step(INPUT_RIGHT)
+        if simulation.game_over or simulation.level_complete:
+            simulation.restart()
+    return (time.perf_counter() - start) / ticks
+
+
+def phase_time(count):
+    start = time.perf_counter()
+    for _ in range(count):
+        with profiler.phase("benchmark"):
+            pass
+    return (time.perf_counter() - start) / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--ticks", type=int, default=3000)
+    parser.add_argument("--phases", type=int, default=200000)
+    args = parser.parse_args()
+
+    print(f"{'profiler':>8} {'tick us':>8} {'phase us':>9}")
+    for enabled in (False, True):
+        profiler.enable(enabled)
+        tick = tick_time(args.ticks)
+        phase = phase_time(args.phases)
+        print(f"{'on' if enabled else 'off':>8} {tick * 1e6:>8.1f} {phase * 1e6:>9.3f}")
+    profiler.enable(False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Per-frame draw cost versus level length: Scene.draw() versus baked chunks.
+
+Uses the same synthesized long levels as benchmarks.streaming. Each frame
+scrolls the camera and draws the level layers, either every sprite through
+Scene.draw() or the static layers from baked chunk textures with only the
+remaining sprites streamed around the camera. The CPU time is the time
+spent issuing the draw; the frame time also waits for the GPU to finish.
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import arcade
+
+import level_cache
+from benchmarks.streaming import SCROLL_SPEED, repeat_level
+from main import (BAKED_LAYERS, DECORATION_LAYERS, LAYER_NAME_PLATFORMS,
+                  SCREEN_HEIGHT, SCREEN_WIDTH, STREAMED_LAYERS,
+                  load_level_data)
+from renderer import StaticLayerRenderer
+from streaming import LevelStreamer
+
+MAP_NAME = "data/map1.json"
+
+
+def make_full(level):
+    scene = level_cache.build_scene(level)
+
+    def draw(left):
+        scene.draw()
+
+    def submitted():
+        return sum(len(scene[name]) for name in draw_order(level))
+
+    return draw, submitted
+
+
+def make_baked(level):
+    options = {LAYER_NAME_PLATFORMS: {"use_spatial_hash": True}}
+    scene = level_cache.build_scene(level, options, STREAMED_LAYERS)
+    skip = {name: (level.sprites(name)["animation"] < 0).__getitem__ for name in DECORATION_LAYERS}
+    streamer = LevelStreamer(level, scene, STREAMED_LAYERS, skip=skip)
+    renderer = StaticLayerRenderer(level, BAKED_LAYERS)
+    names = draw_order(level)
+
+    def draw(left):
+        streamer.update(left, left + SCREEN_WIDTH)
+        renderer.draw(scene, names, left, left + SCREEN_WIDTH)
+
+    def submitted():
+        sprites = sum(len(scene[name]) for name in names
+                      if name not in renderer.static or name in renderer.animated_layers)
+        first, last = renderer.wanted
+        quads = sum(renderer.baked.get((run, chunk)) is not None
+                    for run in range(len(renderer.runs)) for chunk in range(first, last + 1))
+        return sprites + quads
+
+    return draw, submitted
+
+
+def draw_order(level):
+    return [layer["name"] for layer in level.layers if layer["sprites"] is not None]
+
+
+def run(window, level, make, frames):
+    """Scroll across the level and return (CPU ms, frame ms, sprites and quads submitted)."""
+    draw, submitted = make(level)
+    camera = arcade.SimpleCamera(viewport=(0, 0, SCREEN_WIDTH, SCREEN_HEIGHT))
+
+    cpu = 0
+    start = time.perf_counter()
+    for frame in range(frames):
+        left = frame * SCROLL_SPEED % (level.pixel_width - SCREEN_WIDTH)
+        camera.move_to((left, 0))
+        window.clear()
+        camera.use()
+        draw_start = time.perf_counter()
+        draw(left)
+        cpu += time.perf_counter() - draw_start
+        window.ctx.finish()
+    elapsed = time.perf_counter() - start
+    return cpu * 1000 / frames, elapsed * 1000 / frames, submitted()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--copies", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--frames", type=int, default=300)
+    args = parser.parse_args()
+
+    window = arcade.Window(SCREEN_WIDTH, SCREEN_HEIGHT, visible=False)
+    level = load_level_data(MAP_NAME)
+
+    print(f"{'copies':>6} {'mode':>6} {'cpu ms':>7} {'frame ms':>9} {'submitted':>10}")
+    with tempfile.TemporaryDirectory() as directory:
+        for copies in args.copies:
+            long_level = repeat_level(level, copies, os.path.join(directory, f"x{copies}.level"))
+            for mode, make in (("full", make_full), ("baked", make_baked)):
+                cpu, elapsed, submitted = run(window, long_level, make, args.frames)
+                print(f"{copies:>6} {mode:>6} {cpu:>7.3f} {elapsed:>9.3f} {submitted:>10}")
+
+
+if __name__ == "__main__":
+    main()
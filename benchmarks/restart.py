@@ -0,0 +1,40 @@
+"""
+Restart latency: rebuilding the level versus restoring its initial snapshot.
+"""
+
+import argparse
+import time
+
+from main import INPUT_RIGHT, GameSimulation
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--ticks", type=int, default=300,
+                        help="ticks to play before each restart")
+    args = parser.parse_args()
+
+    simulation = GameSimulation()
+    simulation.setup()
+
+    rebuild = restore = 0
+    for _ in range(args.repeat):
+        for _ in range(args.ticks):
+            simulation.step(INPUT_RIGHT)
+        start = time.perf_counter()
+        simulation.setup()
+        rebuild += time.perf_counter() - start
+
+        for _ in range(args.ticks):
+            simulation.step(INPUT_RIGHT)
+        start = time.perf_counter()
+        simulation.restart()
+        restore += time.perf_counter() - start
+
+    print(f"setup():   {rebuild / args.repeat * 1000:8.3f} ms")
+    print(f"restart(): {restore / args.repeat * 1000:8.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Per-frame cost and live sprite count versus level length.
+
+A long level is synthesized by laying map1 end to end several times. The
+camera then scrolls across it, and each frame does what the game does with
+the static layers: move the streaming window and collide a sprite with the
+platforms. With every sprite materialized the frame cost
+grows with the length of the level; with streaming it stays flat.
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import arcade
+import numpy as np
+
+import level_cache
+from main import (LAYER_NAME_PLATFORMS, SCREEN_WIDTH, STREAMED_LAYERS,
+                  load_level_data)
+from streaming import LevelStreamer
+
+MAP_NAME = "data/map1.json"
+
+# Camera movement per frame, in pixels
+SCROLL_SPEED = 10
+
+
+def repeat_level(level, copies, output):
+    """Write a level made of ``copies`` copies of ``level`` side by side."""
+    width = level.width * copies
+    chunk_count = level_cache._chunk_count(width)
+    header = dict(level.header, width=width, layers=[], arrays={})
+    arrays = {"spawns": np.array(level.enemy_spawns)}
+
+    for layer in level.layers:
+        info = dict(layer)
+        if layer["gids"] is not None:
+            arrays[layer["gids"]] = np.tile(level.gids(layer["name"]), (1, copies))
+        if layer["sprites"] is not None:
+            records = np.tile(level.sprites(layer["name"]), copies)
+            copy = np.repeat(np.arange(copies), len(records) // copies)
+            records["center_x"] += copy * level.pixel_width
+            records, offsets = level_cache.chunk_records(records, level.chunk_width, chunk_count)
+            arrays[layer["sprites"]] = records
+            arrays[layer["chunks"]] = offsets
+        header["layers"].append(info)
+
+    level_cache.write_level(output, header, arrays)
+    return level_cache.LevelData(output)
+
+
+def run(level, streamed, frames):
+    """Scroll across the level and return (ms per frame, live sprites)."""
+    scene = level_cache.build_scene(
+        level, {LAYER_NAME_PLATFORMS: {"use_spatial_hash": True}},
+        STREAMED_LAYERS if streamed else ()
+    )
+    streamer = LevelStreamer(level, scene, STREAMED_LAYERS if streamed else ())
+    probe = arcade.SpriteSolidColor(64, 64, color=arcade.color.WHITE)
+    probe.center_y = 256
+
+    start = time.perf_counter()
+    for frame in range(frames):
+        left = frame * SCROLL_SPEED % (level.pixel_width - SCREEN_WIDTH)
+        streamer.update(left, left + SCREEN_WIDTH)
+        probe.center_x = left + SCREEN_WIDTH / 2
+        arcade.check_for_collision_with_list(probe, scene[LAYER_NAME_PLATFORMS])
+    elapsed = (time.perf_counter() - start) * 1000 / frames
+
+    live = sum(len(scene[layer["name"]]) for layer in level.layers if layer["sprites"] is not None)
+    return elapsed, live
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--copies", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--frames", type=int, default=2000)
+    args = parser.parse_args()
+
+    level = load_level_data(MAP_NAME)
+
+    print(f"{'copies':>6} {'mode':>9} {'ms/frame':>9} {'live sprites':>13}")
+    with tempfile.TemporaryDirectory() as directory:
+        for copies in args.copies:
+            long_level = repeat_level(level, copies, os.path.join(directory, f"x{copies}.level"))
+            for streamed in (False, True):
+                elapsed, live = run(long_level, streamed, args.frames)
+                mode = "streamed" if streamed else "full"
+                print(f"{copies:>6} {mode:>9} {elapsed:>9.3f} {live:>13}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,296 @@
+"""
+Benchmark suite of the game's hot paths, checked against per-machine baselines.
+
+Every case runs in a fresh interpreter, so it starts cold and its peak
+memory is its own:
+
+- cold start: launching the game up to its first frame, and up to the
+  first frame of the level when space is pressed right away, with the
+  longest frame on the way
+- setup: GameView.setup() latency
+- frames: steady-state GameView.on_update() and on_draw() cost with the
+  level's enemies and coins multiplied by each scale
+
+Each case runs a few times and the median of every metric is compared
+with the baseline saved for this machine; metrics that got worse by more
+than the threshold are flagged and make the suite exit with status 1.
+Without a display (e.g. a GPU-less Linux box) OpenGL runs headless.
+The game is only imported inside the cases, so the cold start pays for it.
+
+    python -m benchmarks.suite                # compare with this machine's baseline
+    python -m benchmarks.suite --save         # store the results as the baseline
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import re
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# Where the per-machine baselines are stored
+BASELINE_DIR = os.path.join(os.path.dirname(__file__), "baselines")
+
+# Relative slowdown above which a metric counts as a regression
+DEFAULT_THRESHOLD = 0.2
+
+# Multipliers of the level's enemy and coin counts for the frame benchmarks
+DEFAULT_SCALES = [1, 10, 50]
+
+MAP_NAME = "data/map1.json"
+
+
+def peak_memory_mb():
+    """Peak resident set size of this process in MiB (Linux reports KiB)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def scale_level(level, scale, directory):
+    """Write a copy of ``level`` with ``scale`` times its enemies and coins."""
+    import numpy as np
+
+    import level_cache
+    from benchmarks.tile_index import fill_layer
+    from main import LAYER_NAME_COINS
+
+    # Copies of the enemies spread evenly over the level, patrols shifted with them
+    rng = random.Random(scale)
+    spawns = level.enemy_spawns
+    copies = []
+    for copy in range(scale):
+        shifted = np.array(spawns)
+        offset = copy * level.pixel_width / scale + rng.uniform(-100, 100)
+        wrapped = (shifted["center_x"] + offset) % level.pixel_width
+        for field in ("boundary_left", "boundary_right"):
+            shifted[field] += wrapped - shifted["center_x"]
+        shifted["center_x"] = wrapped
+        copies.append(shifted)
+    arrays = {name: np.array(level.array(name)) for name in level.header["arrays"]}
+    arrays["spawns"] = np.concatenate(copies)
+    output = os.path.join(directory, f"enemies-x{scale}.level")
+    level_cache.write_level(output, dict(level.header, arrays={}), arrays)
+
+    # As many coins as fit, up to the scaled count
+    coins = len(level.sprites(LAYER_NAME_COINS)) * scale
+    density = min(coins / level.gids(LAYER_NAME_COINS).size, 1.0)
+    return fill_layer(level_cache.LevelData(output), LAYER_NAME_COINS, density,
+                      os.path.join(directory, f"x{scale}.level"))
+
+
+def make_game_view(level=None):
+    """A window with a GameView set up on ``level`` (the first map by default)."""
+    import arcade
+    from main import SCREEN_HEIGHT, SCREEN_WIDTH, GameView
+
+    window = arcade.Window(SCREEN_WIDTH, SCREEN_HEIGHT, visible=False)
+    view = GameView()
+    view.simulation.levels.current = level
+    view.setup()
+    window.show_view(view)
+    return window, view
+
+
+def case_label(args):
+    return f"frames x{args.scale}" if args.case == "frames" else args.case.replace("_", " ")
+
+
+def case_cold_start(args):
+    import arcade
+    from main import MUSIC_TRACKS, SCREEN_HEIGHT, SCREEN_TITLE, SCREEN_WIDTH, SIMULATION_DELTA, GameView, start
+    from music import MusicPlayer
+
+    def frame():
+        """Run a frame paced like arcade.run() and return when it was drawn, in ms since launch."""
+        nonlocal next_frame, longest
+        time.sleep(max(next_frame - time.perf_counter(), 0))
+        start_frame = time.perf_counter()
+        next_frame = start_frame + SIMULATION_DELTA
+        window.current_view.on_update(SIMULATION_DELTA)
+        window.current_view.on_draw()
+        window.ctx.finish()
+        window.flip()
+        longest = max(longest, time.perf_counter() - start_frame)
+        return (time.time() - args.started) * 1000
+
+    next_frame = 0.0
+    longest = 0.0
+    window = arcade.Window(SCREEN_WIDTH, SCREEN_HEIGHT, SCREEN_TITLE)
+    music = MusicPlayer(MUSIC_TRACKS)
+    start(window, music)
+    metrics = {"first frame ms": frame()}
+
+    # The player presses space on the first frame of the menu
+    window.current_view.on_key_press(arcade.key.SPACE, 0)
+    playing = frame()
+    while not isinstance(window.current_view, GameView):
+        playing = frame()
+    metrics["playing ms"] = playing
+    metrics["longest frame ms"] = longest * 1000
+    music.stop()
+    return metrics
+
+
+def case_setup(args):
+    window, view = make_game_view()
+    times = []
+    for _ in range(args.repeat_setup):
+        start = time.perf_counter()
+        view.setup()
+        times.append(time.perf_counter() - start)
+    return {"setup ms": statistics.median(times) * 1000}
+
+
+def case_frames(args):
+    from main import INPUT_RIGHT, SIMULATION_DELTA, load_level_data
+
+    with tempfile.TemporaryDirectory() as directory:
+        level = scale_level(load_level_data(MAP_NAME), args.scale, directory)
+        window, view = make_game_view(level)
+
+        update = []
+        draw = []
+        view.keys = INPUT_RIGHT
+        for _ in range(args.frames):
+            start = time.perf_counter()
+            view.on_update(SIMULATION_DELTA)
+            update.append(time.perf_counter() - start)
+
+            if view.dying is not None or window.current_view is not view:
+                # The player died; frames with the death effect or the game
+                # over screen are not counted
+                update.pop()
+                view.restart()
+                view.keys = INPUT_RIGHT
+                window.show_view(view)
+                continue
+
+            start = time.perf_counter()
+            view.on_draw()
+            window.ctx.finish()
+            draw.append(time.perf_counter() - start)
+
+    return {f"update x{args.scale} ms": statistics.median(update) * 1000,
+            f"draw x{args.scale} ms": statistics.median(draw) * 1000}
+
+
+CASES = {
+    "cold_start": case_cold_start,
+    "setup": case_setup,
+    "frames": case_frames,
+}
+
+
+def run_case(case, extra, args):
+    """Run one case in a fresh interpreter and return its metrics."""
+    env = dict(os.environ)
+    if args.headless:
+        env["ARCADE_HEADLESS"] = "1"
+    command = [sys.executable, "-m", "benchmarks.suite", "--case", case, "--started", repr(time.time()),
+               "--frames", str(args.frames), "--repeat-setup", str(args.repeat_setup)] + extra
+    output = subprocess.run(command, env=env, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def machine_name():
+    return re.sub(r"[^A-Za-z0-9_.-]+", "-", platform.node()) or "unknown"
+
+
+def machine_info():
+    return {
+        "node": platform.node(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpus": os.cpu_count(),
+        "system": platform.platform(),
+        "python": platform.python_version(),
+    }
+
+
+def compare(results, baseline, threshold):
+    """Print every metric next to its baseline and return the names of the regressed ones."""
+    regressions = []
+    print(f"{'metric':<24} {'now':>10} {'baseline':>10} {'change':>8}")
+    for name, value in results.items():
+        before = baseline.get(name)
+        if before is None:
+            print(f"{name:<24} {value:>10.3f} {'-':>10} {'-':>8}")
+            continue
+        change = value / before - 1 if before else 0.0
+        flag = ""
+        if change > threshold:
+            flag = "  REGRESSED"
+            regressions.append(name)
+        elif change < -threshold:
+            flag = "  improved"
+        print(f"{name:<24} {value:>10.3f} {before:>10.3f} {change:>+8.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", nargs="+", choices=sorted(CASES), help="run only these cases")
+    parser.add_argument("--scales", type=int, nargs="+", default=DEFAULT_SCALES)
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--repeat", type=int, default=3, help="runs of every case, the median is kept")
+    parser.add_argument("--repeat-setup", type=int, default=10)
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument("--machine", default=machine_name(), help="name the baseline is stored under")
+    parser.add_argument("--save", action="store_true", help="store the results as this machine's baseline")
+    parser.add_argument("--headless", action="store_true",
+                        default=sys.platform.startswith("linux") and not os.environ.get("DISPLAY"),
+                        help="render offscreen without a display (default when DISPLAY is unset)")
+
+    # Used by the suite to run a single case in a child process
+    parser.add_argument("--case", choices=sorted(CASES), help=argparse.SUPPRESS)
+    parser.add_argument("--scale", type=int, default=1, help=argparse.SUPPRESS)
+    parser.add_argument("--started", type=float, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        metrics = CASES[args.case](args)
+        metrics[f"{case_label(args)} peak MB"] = peak_memory_mb()
+        print(json.dumps(metrics), flush=True)
+        return
+
+    runs = []
+    for case in args.only or list(CASES):
+        for extra in [["--scale", str(scale)] for scale in args.scales] if case == "frames" else [[]]:
+            runs.append((case, extra))
+
+    samples = {}
+    for case, extra in runs:
+        for _ in range(args.repeat):
+            for name, value in run_case(case, extra, args).items():
+                samples.setdefault(name, []).append(value)
+    results = {name: statistics.median(values) for name, values in samples.items()}
+
+    baseline_file = os.path.join(BASELINE_DIR, f"{args.machine}.json")
+    baseline = {}
+    if os.path.exists(baseline_file):
+        with open(baseline_file) as json_file:
+            baseline = json.load(json_file)["results"]
+    else:
+        print(f"No baseline for {args.machine} yet, run with --save to store one")
+
+    regressions = compare(results, baseline, args.threshold)
+
+    if args.save:
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        with open(baseline_file, "w") as json_file:
+            json.dump({"machine": machine_info(), "saved": datetime.datetime.now().isoformat(timespec="seconds"),
+                       "results": dict(baseline, **results)}, json_file, indent=2, sort_keys=True)
+        print(f"Saved the baseline to {baseline_file}")
+    elif regressions:
+        print(f"{len(regressions)} metrics regressed by more than {args.threshold:.0%}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
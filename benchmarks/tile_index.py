@@ -0,0 +1,112 @@
+"""
+Player-vs-coins query cost versus coin density.
+
+Takes map1's Coins layer as it is, then filled with copies of its first
+coin at increasing densities, and moves a player-sized sprite across the
+level, comparing arcade.check_for_collision_with_list() on a spatially
+hashed sprite list with a TileIndex lookup. Both must find the same coins.
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+import arcade
+import numpy as np
+
+import level_cache
+from main import LAYER_NAME_COINS, PlayerCharacter, load_level_data
+from tile_index import TileIndex
+
+MAP_NAME = "data/map1.json"
+
+
+def fill_layer(level, name, density, output, seed=0):
+    """Write a copy of ``level`` with a fraction ``density`` of the layer's cells holding its first tile."""
+    template = level.sprites(name)[0]
+    grid = level.gids(name)
+    cell_width = level.tile_width * template["scale_x"]
+    cell_height = level.tile_height * template["scale_y"]
+    offset_x = template["center_x"] % cell_width
+    offset_y = template["center_y"] % cell_height
+
+    rng = random.Random(seed)
+    cells = [(row, column) for row in range(grid.shape[0]) for column in range(grid.shape[1])]
+    cells = rng.sample(cells, round(len(cells) * density))
+
+    records = np.zeros(len(cells), dtype=level_cache.SPRITE_DTYPE)
+    records[:] = template
+    gids = np.zeros_like(grid)
+    for record, (row, column) in zip(records, cells):
+        record["center_x"] = column * cell_width + offset_x
+        record["center_y"] = row * cell_height + offset_y
+        # Tiled rows count from the top
+        gids[grid.shape[0] - 1 - row, column] = grid[grid != 0][0]
+
+    records, offsets = level_cache.chunk_records(records, level.chunk_width, level.chunk_count)
+    arrays = {info_name: np.array(level.array(info_name)) for info_name in level.header["arrays"]}
+    layer = level._layer(name)
+    arrays[layer["gids"]] = gids
+    arrays[layer["sprites"]] = records
+    arrays[layer["chunks"]] = offsets
+    header = dict(level.header, arrays={})
+    level_cache.write_level(output, header, arrays)
+    return level_cache.LevelData(output)
+
+
+def probe_positions(level, count, seed=0):
+    rng = random.Random(seed)
+    return [(rng.uniform(0, level.pixel_width), rng.uniform(0, level.height * level.tile_height * level.scaling))
+            for _ in range(count)]
+
+
+def measure(level, player, positions):
+    """(sprite list us, tile index us, hits) of the player at every position against the level's coins."""
+    coins = arcade.SpriteList(use_spatial_hash=True)
+    for record in level.sprites(LAYER_NAME_COINS):
+        coins.append(level_cache.make_sprite(level, record))
+    index = TileIndex(level, LAYER_NAME_COINS)
+
+    expected = []
+    start = time.perf_counter()
+    for player.center_x, player.center_y in positions:
+        expected.append(len(arcade.check_for_collision_with_list(player, coins)))
+    sprite_list = (time.perf_counter() - start) / len(positions) * 1e6
+
+    found = []
+    start = time.perf_counter()
+    for player.center_x, player.center_y in positions:
+        found.append(len(index.collisions(player)))
+    tile_index = (time.perf_counter() - start) / len(positions) * 1e6
+
+    if found != expected:
+        raise AssertionError(f"TileIndex disagrees with the sprite list on {len(index)} coins")
+    return sprite_list, tile_index, sum(found)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--density", type=float, nargs="+", default=[0.01, 0.05, 0.2, 0.5, 1.0])
+    parser.add_argument("--queries", type=int, default=5000)
+    args = parser.parse_args()
+
+    level = load_level_data(MAP_NAME)
+    player = PlayerCharacter()
+    positions = probe_positions(level, args.queries)
+
+    print(f"{'density':>7} {'coins':>6} {'sprite list us':>15} {'tile index us':>14} {'hits':>6}")
+    # The map as it is first, then filled
+    coins = len(level.sprites(LAYER_NAME_COINS))
+    sprite_list, tile_index, hits = measure(level, player, positions)
+    print(f"{'map1':>7} {coins:>6} {sprite_list:>15.2f} {tile_index:>14.2f} {hits:>6}")
+    with tempfile.TemporaryDirectory() as directory:
+        for density in args.density:
+            filled = fill_layer(level, LAYER_NAME_COINS, density, os.path.join(directory, "coins.level"))
+            coins = len(filled.sprites(LAYER_NAME_COINS))
+            sprite_list, tile_index, hits = measure(filled, player, positions)
+            print(f"{density:>7} {coins:>6} {sprite_list:>15.2f} {tile_index:>14.2f} {hits:>6}")
+
+if __name__ == "__main__":
+    main()
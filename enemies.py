@@ -0,0 +1,329 @@
+"""
+Struct-of-arrays enemy engine.
+
+Every patrolling enemy lives in a row of a set of NumPy arrays, so moving
+and turning all of them around is a handful of vectorized operations no
+matter how many there are. Sprites are only kept in sync for the enemies
+that are on screen.
+
+Once activate() has been called, only the enemies whose patrol reaches
+into the active region move; the others sleep and are fast-forwarded when
+they wake up, see activation.py.
+
+Chasing enemies have no patrol: chase() points them along a flow field
+towards the player every step (see pathfinding.py). They may end up
+anywhere, so they never sleep.
+"""
+
+import math
+
+import numpy as np
+
+from activation import SpanIndex
+
+# Starting number of rows, doubled whenever we run out
+DEFAULT_CAPACITY = 64
+
+
+class EnemySwarm:
+    """Positions, velocities and patrol bounds of all enemies."""
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.count = 0
+
+        # Sprite drawn for each row (may be None for headless-only rows)
+        self.sprites = []
+
+        self.center_x = np.zeros(capacity)
+        self.center_y = np.zeros(capacity)
+        self.change_x = np.zeros(capacity)
+        self.change_y = np.zeros(capacity)
+
+        # 0 means "no boundary", exactly like Sprite.boundary_left/right
+        self.boundary_left = np.zeros(capacity)
+        self.boundary_right = np.zeros(capacity)
+
+        # Distance chasing enemies fly per step, 0 for the patrolling ones
+        self.chase_speed = np.zeros(capacity)
+        self.chasers = np.zeros(0, dtype=np.intp)
+
+        # Hit box extents relative to the center
+        self.hit_left = np.zeros(capacity)
+        self.hit_right = np.zeros(capacity)
+        self.hit_bottom = np.zeros(capacity)
+        self.hit_top = np.zeros(capacity)
+
+        # Rows whose sprite was synced on the last call to sync_sprites()
+        self.synced = np.zeros(0, dtype=np.intp)
+
+        # Horizontal span every row's hit box can ever reach
+        self.span_left = np.zeros(capacity)
+        self.span_right = np.zeros(capacity)
+
+        # Rows moved by update(), all of them until activate() is called,
+        # and the step at which every sleeping row fell asleep
+        self.active = None
+        self.awake = np.zeros(capacity, dtype=bool)
+        self.slept_at = np.zeros(capacity, dtype=np.int64)
+        self.tick = 0
+
+        # Index of the spans, rebuilt when rows were added, and the range
+        # handed to the last activate()
+        self.index = None
+        self.region = None
+
+    def __len__(self):
+        return self.count
+
+    def _grow(self):
+        capacity = len(self.center_x) * 2
+        for name in ("center_x", "center_y", "change_x", "change_y",
+                     "boundary_left", "boundary_right", "chase_speed",
+                     "hit_left", "hit_right", "hit_bottom", "hit_top",
+                     "span_left", "span_right", "awake", "slept_at"):
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:self.count] = old[:self.count]
+            setattr(self, name, new)
+
+    def add(self, center_x, center_y, change_x=0, change_y=0,
+            boundary_left=None, boundary_right=None,
+            hit_box=((-1, -1), (1, -1), (1, 1), (-1, 1)), sprite=None, chase_speed=0):
+        """
+        Add an enemy and return its row.
+
+        :param hit_box: Hit box points relative to the center, already scaled.
+        :param sprite: Sprite to keep in sync with this row, if any.
+        :param chase_speed: Distance flown per step chasing the player, 0
+            for an enemy patrolling between its boundaries.
+        """
+        if self.count == len(self.center_x):
+            self._grow()
+
+        i = self.count
+        self.center_x[i] = center_x
+        self.center_y[i] = center_y
+        self.change_x[i] = change_x
+        self.change_y[i] = change_y
+        self.boundary_left[i] = boundary_left or 0
+        self.boundary_right[i] = boundary_right or 0
+        self.chase_speed[i] = chase_speed
+
+        xs = [point[0] for point in hit_box]
+        ys = [point[1] for point in hit_box]
+        self.hit_left[i] = min(xs)
+        self.hit_right[i] = max(xs)
+        self.hit_bottom[i] = min(ys)
+        self.hit_top[i] = max(ys)
+
+        # A chaser, or a patrol without a bound on one side, may wander off anywhere
+        if chase_speed:
+            self.span_left[i] = -math.inf
+            self.span_right[i] = math.inf
+            self.chasers = np.append(self.chasers, i)
+        elif change_x == 0:
+            self.span_left[i] = center_x + self.hit_left[i]
+            self.span_right[i] = center_x + self.hit_right[i]
+        elif boundary_left and boundary_right:
+            self.span_left[i] = min(boundary_left, center_x + self.hit_left[i]) - abs(change_x)
+            self.span_right[i] = max(boundary_right, center_x + self.hit_right[i]) + abs(change_x)
+        else:
+            self.span_left[i] = -math.inf
+            self.span_right[i] = math.inf
+
+        # New rows sleep until the next activate() if some rows already do
+        self.awake[i] = self.active is None
+        self.slept_at[i] = self.tick
+        self.index = None
+        self.region = None
+
+        self.sprites.append(sprite)
+        self.count += 1
+        return i
+
+    def add_sprite(self, sprite):
+        """Add an enemy taking its state from an already placed sprite."""
+        hit_box = [(x - sprite.center_x, y - sprite.center_y)
+                   for x, y in sprite.hit_box.get_adjusted_points()]
+        return self.add(sprite.center_x, sprite.center_y,
+                        sprite.change_x, sprite.change_y,
+                        sprite.boundary_left, sprite.boundary_right,
+                        hit_box, sprite, getattr(sprite, "chase_speed", 0))
+
+    def get_state(self):
+        """Copy of everything that changes while playing, sleeping rows brought up to date."""
+        n = self.count
+        state = (self.center_x[:n].copy(), self.center_y[:n].copy(),
+                 self.change_x[:n].copy(), self.change_y[:n].copy())
+        if self.active is not None:
+            rows = np.flatnonzero(~self.awake[:n])
+            center_x, center_y, change_x, change_y = state
+            center_x[rows], center_y[rows], change_x[rows] = self._advanced(rows)
+        return state
+
+    def set_state(self, state):
+        """Restore a state from get_state() and resync every sprite."""
+        center_x, center_y, change_x, change_y = state
+        n = len(center_x)
+        self.center_x[:n] = center_x
+        self.center_y[:n] = center_y
+        self.change_x[:n] = change_x
+        self.change_y[:n] = change_y
+        self.slept_at[:n] = self.tick
+        self.synced = np.zeros(0, dtype=np.intp)
+        self.sync_rows(range(n))
+
+    def activate(self, left, right):
+        """
+        Move only the enemies whose patrol overlaps [left, right] from now on.
+
+        Enemies waking up are fast-forwarded by the steps they slept through.
+        """
+        if (left, right) == self.region:
+            return
+        self.region = left, right
+
+        n = self.count
+        if self.active is None:
+            self.active = np.arange(n)
+        if self.index is None:
+            self.index = SpanIndex(self.span_left[:n], self.span_right[:n])
+
+        rows = self.index.query(left, right)
+        waking = rows[~self.awake[rows]]
+        if len(waking):
+            self.center_x[waking], self.center_y[waking], self.change_x[waking] = self._advanced(waking)
+
+        self.awake[self.active] = False
+        self.awake[rows] = True
+        dozing = self.active[~self.awake[self.active]]
+        self.slept_at[dozing] = self.tick
+        self.active = rows
+
+    def _advanced(self, rows):
+        """center_x, center_y and change_x of sleeping rows as of now."""
+        steps = (self.tick - self.slept_at[rows]).astype(float)
+        x = self.center_x[rows]
+        dx = self.change_x[rows]
+        y = self.center_y[rows] + self.change_y[rows] * steps
+
+        left_bound = self.boundary_left[rows]
+        right_bound = self.boundary_right[rows]
+        hit_left = self.hit_left[rows]
+        hit_right = self.hit_right[rows]
+
+        # Where each patrol last turned at the end it turned at first, to spot laps
+        turns = np.zeros(len(rows), dtype=np.int64)
+        lap_x = np.full(len(rows), np.nan)
+        lap_steps = np.zeros(len(rows))
+
+        going = steps > 0
+        while going.any():
+            # Steps surely taken before the bound ahead, one less than the
+            # estimate so rounding never skips a turn
+            with np.errstate(divide="ignore", invalid="ignore"):
+                free = np.where(dx > 0, (right_bound - hit_right - x) / dx, (x + hit_left - left_bound) / -dx)
+            bound_ahead = np.where(dx > 0, right_bound, left_bound)
+            free = np.where((dx == 0) | (bound_ahead == 0), np.inf, np.maximum(np.floor(free) - 1, 0))
+            free = np.minimum(free, steps)
+            x += free * dx
+            steps -= free
+
+            # Near a bound, take single steps exactly like update()
+            near = steps > 0
+            x[near] += dx[near]
+            steps[near] -= 1
+            turn = near & (right_bound != 0) & (x + hit_right > right_bound) & (dx > 0)
+            turn |= near & (left_bound != 0) & (x + hit_left < left_bound) & (dx < 0)
+            dx[turn] *= -1
+
+            # Back where the last turn at the same end left off: skip whole laps
+            turns += turn
+            odd = turn & (turns % 2 == 1)
+            lap = odd & (x == lap_x)
+            steps[lap] %= lap_steps[lap] - steps[lap]
+            lap_x[odd] = x[odd]
+            lap_steps[odd] = steps[odd]
+
+            going = steps > 0
+        return x, y, dx
+
+    def chase(self, field, target_x, target_y):
+        """Point the chasing enemies along a FlowField leading to a position."""
+        rows = self.chasers
+        if len(rows):
+            self.change_x[rows], self.change_y[rows] = field.steer(
+                self.center_x[rows], self.center_y[rows], target_x, target_y, self.chase_speed[rows])
+
+    def update(self):
+        """Move the awake enemies one step and turn around those past their bounds."""
+        self.tick += 1
+        if self.active is None:
+            n = self.count
+            x = self.center_x[:n]
+            dx = self.change_x[:n]
+
+            x += dx
+            self.center_y[:n] += self.change_y[:n]
+
+            left_bound = self.boundary_left[:n]
+            right_bound = self.boundary_right[:n]
+
+            turn = ((right_bound != 0) & (x + self.hit_right[:n] > right_bound) & (dx > 0))
+            turn |= ((left_bound != 0) & (x + self.hit_left[:n] < left_bound) & (dx < 0))
+            dx[turn] *= -1
+            return
+
+        rows = self.active
+        x = self.center_x[rows] + self.change_x[rows]
+        dx = self.change_x[rows]
+        self.center_x[rows] = x
+        self.center_y[rows] += self.change_y[rows]
+
+        left_bound = self.boundary_left[rows]
+        right_bound = self.boundary_right[rows]
+
+        turn = ((right_bound != 0) & (x + self.hit_right[rows] > right_bound) & (dx > 0))
+        turn |= ((left_bound != 0) & (x + self.hit_left[rows] < left_bound) & (dx < 0))
+        self.change_x[rows[turn]] *= -1
+
+    def awake_rows(self):
+        """Rows moved by update()."""
+        return np.arange(self.count) if self.active is None else self.active
+
+    def rows_in_box(self, left, right, bottom, top):
+        """Awake rows whose hit box overlaps the box."""
+        rows = self.awake_rows()
+        x = self.center_x[rows]
+        y = self.center_y[rows]
+        return rows[(x + self.hit_right[rows] >= left) & (x + self.hit_left[rows] <= right)
+                    & (y + self.hit_top[rows] >= bottom) & (y + self.hit_bottom[rows] <= top)]
+
+    def sync_sprites(self, left, right, bottom, top):
+        """
+        Copy state into the sprites of enemies overlapping the viewport.
+
+        Enemies that were on screen last time are synced once more so their
+        sprites do not freeze half-visible at the edge.
+
+        The viewport has to lie within the region handed to activate().
+
+        :returns: List of the sprites that are on screen now.
+        """
+        visible = self.rows_in_box(left, right, bottom, top)
+        rows = np.union1d(visible, self.synced)
+        self.synced = visible
+
+        self.sync_rows(rows.tolist())
+        return [self.sprites[i] for i in visible.tolist()
+                if self.sprites[i] is not None]
+
+    def sync_rows(self, rows):
+        """Copy state into the sprites of the given rows."""
+        for i in rows:
+            sprite = self.sprites[i]
+            if sprite is not None:
+                sprite.center_x = float(self.center_x[i])
+                sprite.center_y = float(self.center_y[i])
+                sprite.change_x = float(self.change_x[i])
+                sprite.change_y = float(self.change_y[i])
@@ -0,0 +1,179 @@
+"""
+Vectorized gym-style environment for training agents.
+
+VectorEnv steps several headless games in lockstep. Actions are the input
+bits the game takes (INPUT_* from main.py, 0 to 15), one per game, and
+every step returns batched NumPy arrays:
+
+- observations: a dict of
+  - "tiles": uint8 (games, 3, OBSERVATION_ROWS, OBSERVATION_COLUMNS), the
+    Platforms, Death and Coins cells around the player, row 0 at the
+    bottom, 1 where a tile (or a coin not collected yet) is
+  - "velocity": float32 (games, 2), the player's change_x and change_y
+  - "enemies": float32 (games, NEAREST_ENEMIES, 3), position of the
+    nearest awake enemies, those around the camera, relative to the player
+    and 1 in the last column for each enemy that exists
+- rewards: float32 (games,), the score gained by the step
+- dones: bool (games,), set when the player died or finished the level
+
+A game that is done starts over from the beginning of the first level
+right away, so the observation returned with done set is already the
+first of the next episode, as in gym's vector environments.
+"""
+
+import os
+
+# Works without a display
+os.environ.setdefault("ARCADE_HEADLESS", "1")
+
+import numpy as np
+
+from main import (LAYER_NAME_COINS, LAYER_NAME_DEATH, LAYER_NAME_PLATFORMS,
+                  LEVEL_MAPS, GameSimulation, prepare_level)
+from tile_index import EMPTY, TileIndex
+
+# Size of the tile window around the player, in cells
+OBSERVATION_ROWS = 11
+OBSERVATION_COLUMNS = 17
+
+# Number of enemies reported, nearest first
+NEAREST_ENEMIES = 4
+
+# Layers of the tile observation, in channel order
+OBSERVED_LAYERS = [LAYER_NAME_PLATFORMS, LAYER_NAME_DEATH, LAYER_NAME_COINS]
+
+
+class VectorEnv:
+    """Several games stepped in lockstep, with batched NumPy observations."""
+
+    def __init__(self, count, maps=LEVEL_MAPS):
+        """
+        :param count: Number of games.
+        :param maps: Map names, episodes are played on the first one.
+        """
+        self.count = count
+
+        # Every game plays the same compiled level, so it is only loaded once
+        levels = {}
+
+        def prepare(map_name):
+            if map_name not in levels:
+                levels[map_name] = prepare_level(map_name)
+            return levels[map_name]
+
+        self.simulations = [GameSimulation(maps, prepare) for _ in range(count)]
+        for simulation in self.simulations:
+            simulation.setup()
+
+        # The static layers' grids are shared, the coins are each game's own
+        level = self.simulations[0].level_data
+        self.platforms = TileIndex(level, LAYER_NAME_PLATFORMS)
+        self.cell_width = self.platforms.cell_width
+        self.cell_height = self.platforms.cell_height
+        static = {LAYER_NAME_PLATFORMS: self.platforms.grid,
+                  LAYER_NAME_DEATH: self.simulations[0].death_index.grid}
+
+        # Every layer's cells, one byte each, with a margin of empty cells all
+        # around so windows at the edges of the map need no clipping
+        self.row_margin = OBSERVATION_ROWS // 2
+        self.column_margin = OBSERVATION_COLUMNS // 2
+        height, width = self.platforms.grid.shape
+        self.padded = np.zeros((count, len(OBSERVED_LAYERS),
+                                height + 2 * self.row_margin, width + 2 * self.column_margin), dtype=np.uint8)
+        for channel, name in enumerate(OBSERVED_LAYERS):
+            if name in static:
+                self.padded[:, channel, self.row_margin:-self.row_margin,
+                            self.column_margin:-self.column_margin] = static[name] != EMPTY
+        self._rows = np.arange(OBSERVATION_ROWS)
+        self._columns = np.arange(OBSERVATION_COLUMNS)
+
+        self.scores = np.zeros(count, dtype=np.int64)
+
+        # Steps taken by the current episode of every game
+        self.ticks = np.zeros(count, dtype=np.int64)
+
+    def reset(self):
+        """Start every game over and return the first observations."""
+        for index in range(self.count):
+            self._reset(index)
+        return self.observe()
+
+    def _reset(self, index):
+        simulation = self.simulations[index]
+        simulation.restore(simulation.initial_state)
+        self.scores[index] = simulation.score
+        self.ticks[index] = 0
+
+    def step(self, actions):
+        """
+        Advance every game by one step.
+
+        :param actions: Input bits for every game, shape (count,).
+        :returns: (observations, rewards, dones, infos). infos holds the
+            "score" and "ticks" of the episodes that just ended, and
+            whether each one "completed" the level.
+        """
+        rewards = np.zeros(self.count, dtype=np.float32)
+        dones = np.zeros(self.count, dtype=bool)
+        completed = np.zeros(self.count, dtype=bool)
+        final_scores = np.zeros(self.count, dtype=np.int64)
+        final_ticks = np.zeros(self.count, dtype=np.int64)
+
+        for index, keys in enumerate(np.asarray(actions).tolist()):
+            simulation = self.simulations[index]
+            simulation.step(keys)
+            self.ticks[index] += 1
+            rewards[index] = simulation.score - self.scores[index]
+            self.scores[index] = simulation.score
+
+            if simulation.game_over or simulation.level_complete:
+                dones[index] = True
+                completed[index] = simulation.level_complete
+                final_scores[index] = simulation.score
+                final_ticks[index] = self.ticks[index]
+                self._reset(index)
+
+        infos = {"score": final_scores, "ticks": final_ticks, "completed": completed}
+        return self.observe(), rewards, dones, infos
+
+    def observe(self):
+        """Observations of every game in their current state."""
+        coins = OBSERVED_LAYERS.index(LAYER_NAME_COINS)
+        bottom, left = self.row_margin, self.column_margin
+        players = [simulation.player_sprite for simulation in self.simulations]
+        x = np.array([player.center_x for player in players])
+        y = np.array([player.center_y for player in players])
+
+        # Cell of the bottom left corner of every window, in the padded grids
+        first_rows = np.floor(y / self.cell_height).astype(np.int64) - OBSERVATION_ROWS // 2 + bottom
+        first_columns = np.floor(x / self.cell_width).astype(np.int64) - OBSERVATION_COLUMNS // 2 + left
+        height, width = self.padded.shape[2:]
+        first_rows = np.clip(first_rows, 0, height - OBSERVATION_ROWS)
+        first_columns = np.clip(first_columns, 0, width - OBSERVATION_COLUMNS)
+
+        for index, simulation in enumerate(self.simulations):
+            grid = simulation.coin_index.grid
+            self.padded[index, coins, bottom:-bottom, left:-left] = grid != EMPTY
+
+        rows = (first_rows[:, np.newaxis] + self._rows)[:, np.newaxis, :, np.newaxis]
+        columns = (first_columns[:, np.newaxis] + self._columns)[:, np.newaxis, np.newaxis, :]
+        games = np.arange(self.count)[:, np.newaxis, np.newaxis, np.newaxis]
+        channels = np.arange(len(OBSERVED_LAYERS))[np.newaxis, :, np.newaxis, np.newaxis]
+        tiles = self.padded[games, channels, rows, columns]
+
+        velocity = np.array([(player.change_x, player.change_y) for player in players], dtype=np.float32)
+
+        enemies = np.zeros((self.count, NEAREST_ENEMIES, 3), dtype=np.float32)
+        for index, simulation in enumerate(self.simulations):
+            # Only the awake enemies are up to date, and the sleeping ones
+            # are too far from the player to matter
+            swarm = simulation.enemies
+            rows = swarm.awake_rows()
+            dx = swarm.center_x[rows] - x[index]
+            dy = swarm.center_y[rows] - y[index]
+            nearest = np.argsort(dx * dx + dy * dy)[:NEAREST_ENEMIES]
+            enemies[index, :len(nearest), 0] = dx[nearest]
+            enemies[index, :len(nearest), 1] = dy[nearest]
+            enemies[index, :len(nearest), 2] = 1
+
+        return {"tiles": tiles, "velocity": velocity, "enemies": enemies}
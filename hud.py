@@ -0,0 +1,92 @@
+"""
+Retained-mode HUD and menu text.
+
+Text objects are created once, live in a single pyglet batch and are only
+laid out again when their string actually changes. Drawing a layer is one
+batch draw, and a frame where nothing changed allocates nothing.
+"""
+
+import time
+
+import arcade
+import pyglet
+
+
+class TextLayer:
+    """A set of named text objects drawn together in one batch."""
+
+    def __init__(self):
+        self.batch = pyglet.graphics.Batch()
+        self.texts = {}
+
+    def add(self, name, text, x, y, color, font_size, font_name):
+        """Create a text object in this layer and return it."""
+        self.texts[name] = arcade.Text(
+            text,
+            x,
+            y,
+            color,
+            font_size,
+            font_name=font_name,
+            batch=self.batch,
+        )
+        return self.texts[name]
+
+    def set_text(self, name, text):
+        """Change a text, laying it out again only if the string differs."""
+        label = self.texts[name]
+        text = str(text)
+        if label.text != text:
+            label.text = text
+
+    def draw(self):
+        """Draw every text in the layer with a single batch draw."""
+        with arcade.get_window().ctx.pyglet_rendering():
+            self.batch.draw()
+
+
+class ScoreDisplay(TextLayer):
+    """The in-game HUD, showing the score."""
+
+    def __init__(self, x=10, y=10, font_size=13):
+        super().__init__()
+        self.score = None
+        self.add("score", "", x, y, arcade.color.BLACK, font_size, "Kenney Future")
+        self.set_score(0)
+
+    def set_score(self, score):
+        # Comparing the int first avoids building the string every frame
+        if score == self.score:
+            return
+        self.score = score
+        self.set_text("score", f"Score: {score}")
+
+
+class ProfilerOverlay(TextLayer):
+    """The p50/p99 time of every profiled phase, refreshed a few times a second."""
+
+    def __init__(self, profiler, x=10, top=470, font_size=10, line_height=14, refresh_interval=0.5):
+        super().__init__()
+        self.profiler = profiler
+        self.x = x
+        self.top = top
+        self.font_size = font_size
+        self.line_height = line_height
+        self.refresh_interval = refresh_interval
+        self.refreshed = 0.0
+        self.add("header", "phase  p50 / p99 ms", x, top, arcade.color.BLACK, font_size, "Kenney Mini")
+
+    def refresh(self):
+        """Lay the numbers out again from the profiler's buffer."""
+        for name, (p50, p99) in self.profiler.percentiles().items():
+            if name not in self.texts:
+                y = self.top - self.line_height * len(self.texts)
+                self.add(name, "", self.x, y, arcade.color.BLACK, self.font_size, "Kenney Mini")
+            self.set_text(name, f"{name}  {p50 * 1000:.2f} / {p99 * 1000:.2f}")
+
+    def draw(self):
+        now = time.perf_counter()
+        if now - self.refreshed >= self.refresh_interval:
+            self.refreshed = now
+            self.refresh()
+        super().draw()
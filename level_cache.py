@@ -0,0 +1,549 @@
+"""
+Compiled binary level cache.
+
+A Tiled map is compiled once into a single binary file holding, per layer,
+the tile GIDs and a record for every sprite: precomputed world position,
+scale, hit box and texture. Enemy spawns are stored as records too. The
+file is memory-mapped at runtime, so loading a level does not parse JSON
+or TSX files or compute any hit boxes.
+
+Sprite records are grouped into chunks of CHUNK_COLUMNS tile columns, with
+an offset table per layer, so a streamer can materialize just the chunks
+around the camera (see streaming.py).
+
+The file starts with a small JSON header (tables and array offsets)
+followed by the raw NumPy arrays. The header records a hash of the map,
+its tilesets, their images and the compile options; when any of them
+change the cache is rebuilt.
+
+Levels are compiled on first use; ``python main.py --compile-levels``
+compiles them ahead of time.
+"""
+
+import hashlib
+import json
+import math
+import mmap
+import os
+import struct
+import tempfile
+import xml.etree.ElementTree as ElementTree
+
+import arcade
+import numpy as np
+import pytiled_parser
+from arcade.hitbox import RotatableHitBox, algo_bounding_box
+
+import assets
+
+# Where compiled levels are written
+CACHE_DIR = os.path.join("data", "cache")
+
+# Bump when the file layout changes so old caches are rebuilt
+CACHE_VERSION = 2
+
+MAGIC = b"SVLEVEL\0"
+
+# Width of a streaming chunk, in tiles
+CHUNK_COLUMNS = 16
+
+# Arrays start on this boundary so they can be viewed without copying
+ALIGNMENT = 16
+
+# One record per sprite in a layer. Missing boundaries are NaN.
+SPRITE_DTYPE = np.dtype([
+    ("texture", "<i4"),
+    ("animation", "<i4"),
+    ("hit_box", "<i4"),
+    ("center_x", "<f8"),
+    ("center_y", "<f8"),
+    ("scale_x", "<f8"),
+    ("scale_y", "<f8"),
+    ("angle", "<f8"),
+    ("change_x", "<f8"),
+    ("change_y", "<f8"),
+    ("boundary_left", "<f8"),
+    ("boundary_right", "<f8"),
+    ("boundary_bottom", "<f8"),
+    ("boundary_top", "<f8"),
+])
+
+# One record per enemy in the Enemies object layer. Missing values are NaN.
+SPAWN_DTYPE = np.dtype([
+    ("type", "<U16"),
+    ("center_x", "<f8"),
+    ("center_y", "<f8"),
+    ("change_x", "<f8"),
+    ("boundary_left", "<f8"),
+    ("boundary_right", "<f8"),
+])
+
+# Object layer read as enemy spawn points
+SPAWN_LAYER = "Enemies"
+
+# Textures built from the cache, shared across loads of any level
+_texture_cache = {}
+
+
+def source_files(map_name):
+    """The map file followed by every tileset it references."""
+    with open(map_name) as map_file:
+        tilesets = json.load(map_file).get("tilesets", [])
+    map_directory = os.path.dirname(map_name)
+    return [map_name] + [os.path.join(map_directory, tileset["source"])
+                         for tileset in tilesets if "source" in tileset]
+
+
+def tileset_images(map_name):
+    """Image files of every tileset a map uses, relative to the working directory."""
+    with open(map_name) as map_file:
+        tilesets = json.load(map_file).get("tilesets", [])
+    map_directory = os.path.dirname(map_name)
+    images = []
+    for tileset in tilesets:
+        if "source" in tileset:
+            tileset_file = os.path.join(map_directory, tileset["source"])
+            directory = os.path.dirname(tileset_file)
+            sources = [image.get("source") for image in ElementTree.parse(tileset_file).iter("image")]
+        else:
+            directory = map_directory
+            sources = [tileset.get("image")] + [tile.get("image") for tile in tileset.get("tiles", [])]
+        images += [os.path.relpath(os.path.join(directory, source)) for source in sources if source]
+    return list(dict.fromkeys(images))
+
+
+def source_hash(map_name, scaling, layer_scaling):
+    """Hash of the map, its tilesets, their images and the compile options."""
+    digest = hashlib.sha256()
+    digest.update(json.dumps([CACHE_VERSION, scaling, sorted(layer_scaling.items())]).encode())
+    # Hit boxes are traced from the images, so an edited image needs a new cache too
+    for file_name in source_files(map_name) + tileset_images(map_name):
+        with open(file_name, "rb") as source:
+            digest.update(source.read())
+    return digest.hexdigest()
+
+
+def cache_path(map_name, cache_dir=CACHE_DIR):
+    base = os.path.splitext(os.path.basename(map_name))[0]
+    return os.path.join(cache_dir, f"{base}.level")
+
+
+def _nan_if_none(value):
+    return math.nan if value is None else value
+
+
+def _none_if_nan(value):
+    return None if math.isnan(value) else float(value)
+
+
+def _tile_image(tile, map_directory):
+    """Image file and source rectangle of a tile, the same way arcade finds them."""
+    tileset = tile.tileset
+    image = tile.image or tileset.image
+    if tileset.image:
+        margin = tileset.margin or 0
+        spacing = tileset.spacing or 0
+        row, col = divmod(tile.id, tileset.columns)
+        rect = (margin + col * (tileset.tile_width + spacing),
+                margin + row * (tileset.tile_height + spacing),
+                tileset.tile_width, tileset.tile_height)
+    else:
+        rect = (tile.x, tile.y, tile.width, tile.height)
+
+    if not os.path.exists(image):
+        image = os.path.join(map_directory, image)
+    return os.path.relpath(image), [int(value) for value in rect]
+
+
+class _Compiler:
+    """Collects the tables of one level while its layers are walked."""
+
+    def __init__(self, tile_map):
+        self.tile_map = tile_map
+        self.map_directory = os.path.dirname(str(tile_map.tiled_map.map_file))
+        self.images = []
+        self.textures = []
+        self.animations = []
+        self.hit_boxes = []
+        self._index = {}
+
+    def _intern(self, table, key, value):
+        index_key = (id(table), key)
+        if index_key not in self._index:
+            self._index[index_key] = len(table)
+            table.append(value)
+        return self._index[index_key]
+
+    def texture(self, tile, flips=(False, False, False)):
+        image, rect = _tile_image(tile, self.map_directory)
+        image_index = self._intern(self.images, image, image)
+        key = (image_index, tuple(rect), flips)
+        return self._intern(self.textures, key, {"image": image_index, "rect": rect, "flip": list(flips)})
+
+    def animation(self, tile):
+        if not tile.animation:
+            return -1
+        frames = []
+        for frame in tile.animation:
+            frame_tile = self.tile_map._get_tile_by_gid(tile.tileset.firstgid + frame.tile_id)
+            frames.append([self.texture(frame_tile), frame.tile_id, frame.duration])
+        return self._intern(self.animations, json.dumps(frames), frames)
+
+    def hit_box(self, sprite):
+        points = [[float(x), float(y)] for x, y in sprite.hit_box.points]
+        return self._intern(self.hit_boxes, json.dumps(points), points)
+
+    def sprite_records(self, gids, sprites):
+        records = np.zeros(len(sprites), dtype=SPRITE_DTYPE)
+        for record, gid, sprite in zip(records, gids, sprites):
+            tile = self.tile_map._get_tile_by_gid(gid)
+            flips = (bool(tile.flipped_diagonally), bool(tile.flipped_horizontally),
+                     bool(tile.flipped_vertically))
+            record["animation"] = self.animation(tile)
+            if record["animation"] >= 0:
+                # Animated sprites show their first frame
+                record["texture"] = self.animations[record["animation"]][0][0]
+            else:
+                record["texture"] = self.texture(tile, flips)
+            record["hit_box"] = self.hit_box(sprite)
+            record["center_x"], record["center_y"] = sprite.position
+            record["scale_x"], record["scale_y"] = sprite.scale_xy
+            record["angle"] = sprite.angle
+            record["change_x"] = sprite.change_x
+            record["change_y"] = sprite.change_y
+            for name in ("boundary_left", "boundary_right", "boundary_bottom", "boundary_top"):
+                record[name] = _nan_if_none(getattr(sprite, name))
+        return records
+
+
+def _chunk_count(width):
+    return max(1, -(-width // CHUNK_COLUMNS))
+
+
+def chunk_records(records, chunk_width, chunk_count):
+    """
+    Sort sprite records by the chunk holding their center.
+
+    :returns: The sorted records and an offset table; the records of chunk
+        ``c`` are ``records[offsets[c]:offsets[c + 1]]``.
+    """
+    chunks = np.clip(np.floor(records["center_x"] / chunk_width), 0, chunk_count - 1).astype(np.int64)
+    order = np.argsort(chunks, kind="stable")
+    offsets = np.searchsorted(chunks[order], np.arange(chunk_count + 1)).astype("<i8")
+    return records[order], offsets
+
+
+def _spawn_records(tile_map, scaling):
+    objects = tile_map.object_lists.get(SPAWN_LAYER, [])
+    records = np.zeros(len(objects), dtype=SPAWN_DTYPE)
+    for record, tiled_object in zip(records, objects):
+        cartesian = tile_map.get_cartesian(tiled_object.shape[0], tiled_object.shape[1])
+        properties = tiled_object.properties
+        record["type"] = properties.get("type", "")
+        record["center_x"] = math.floor(cartesian[0] * scaling * tile_map.tile_width)
+        record["center_y"] = math.floor((cartesian[1] + 1) * (tile_map.tile_height * scaling))
+        for name in ("change_x", "boundary_left", "boundary_right"):
+            record[name] = _nan_if_none(properties.get(name))
+    return records
+
+
+def compile_level(map_name, output, scaling=1.0, layer_scaling=None):
+    """
+    Compile a Tiled map into a binary level file.
+
+    :param map_name: Path to the Tiled JSON map.
+    :param output: Path of the level file to write.
+    :param scaling: Scaling applied to every layer.
+    :param layer_scaling: Per layer overrides of ``scaling``.
+    """
+    layer_scaling = layer_scaling or {}
+    layer_options = {name: {"scaling": value} for name, value in layer_scaling.items()}
+    tile_map = arcade.load_tilemap(map_name, scaling, layer_options)
+    compiler = _Compiler(tile_map)
+
+    arrays = {}
+    layers = []
+    for layer in tile_map.tiled_map.layers:
+        sprites = tile_map.sprite_lists.get(layer.name)
+        info = {"name": layer.name, "gids": None, "sprites": None}
+
+        if isinstance(layer, pytiled_parser.TileLayer):
+            grid = np.array(layer.data, dtype="<u4")
+            arrays[f"{layer.name}/gids"] = grid
+            info["gids"] = f"{layer.name}/gids"
+            gids = grid[grid != 0].tolist()
+        elif isinstance(layer, pytiled_parser.ObjectLayer):
+            gids = [tiled_object.gid for tiled_object in layer.tiled_objects
+                    if isinstance(tiled_object, pytiled_parser.tiled_object.Tile)]
+        else:
+            gids = []
+
+        if sprites is not None:
+            if len(gids) != len(sprites):
+                raise ValueError(f"Layer '{layer.name}' has {len(gids)} tiles but {len(sprites)} sprites")
+            records, offsets = chunk_records(compiler.sprite_records(gids, sprites),
+                                        tile_map.tile_width * scaling * CHUNK_COLUMNS,
+                                        _chunk_count(tile_map.width))
+            arrays[f"{layer.name}/sprites"] = records
+            arrays[f"{layer.name}/chunks"] = offsets
+            info["sprites"] = f"{layer.name}/sprites"
+            info["chunks"] = f"{layer.name}/chunks"
+            info["visible"] = sprites.visible
+            # How far a sprite can stick out of its chunk
+            info["reach"] = max((max(sprite.width, sprite.height) / 2 for sprite in sprites), default=0)
+        layers.append(info)
+
+    arrays["spawns"] = _spawn_records(tile_map, scaling)
+
+    header = {
+        "version": CACHE_VERSION,
+        "source_hash": source_hash(map_name, scaling, layer_scaling),
+        "map_name": map_name,
+        "scaling": scaling,
+        "width": tile_map.width,
+        "height": tile_map.height,
+        "tile_width": tile_map.tile_width,
+        "tile_height": tile_map.tile_height,
+        "background_color": list(tile_map.background_color) if tile_map.background_color else None,
+        "layers": layers,
+        "images": compiler.images,
+        "textures": compiler.textures,
+        "animations": compiler.animations,
+        "hit_boxes": compiler.hit_boxes,
+        "arrays": {},
+    }
+    write_level(output, header, arrays)
+
+
+def write_level(output, header, arrays):
+    """
+    Write a compiled level file.
+
+    :param header: Header dict; its "arrays" entry is filled in here.
+    :param arrays: Name of every array to the array, stored in this order.
+    """
+    # Lay the arrays out after the header; offsets are relative to the data start
+    offset = 0
+    for name, array in arrays.items():
+        header["arrays"][name] = {"dtype": np.lib.format.dtype_to_descr(array.dtype),
+                                  "shape": list(array.shape), "offset": offset}
+        offset += -(-array.nbytes // ALIGNMENT) * ALIGNMENT
+
+    header_bytes = json.dumps(header).encode()
+    data_start = -(-(len(MAGIC) + 4 + len(header_bytes)) // ALIGNMENT) * ALIGNMENT
+
+    # Written under a name of its own, so two processes compiling the same
+    # level never rename each other's half-written file
+    directory = os.path.dirname(output) or "."
+    os.makedirs(directory, exist_ok=True)
+    handle, temporary = tempfile.mkstemp(dir=directory, prefix=os.path.basename(output), suffix=".tmp")
+    try:
+        with os.fdopen(handle, "wb") as level_file:
+            level_file.write(MAGIC)
+            level_file.write(struct.pack("<I", len(header_bytes)))
+            level_file.write(header_bytes)
+            for name, array in arrays.items():
+                level_file.seek(data_start + header["arrays"][name]["offset"])
+                level_file.write(np.ascontiguousarray(array).tobytes())
+            level_file.truncate(data_start + offset)
+        os.replace(temporary, output)
+    except BaseException:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        raise
+
+
+def _parse_header(buffer):
+    if bytes(buffer[:len(MAGIC)]) != MAGIC:
+        return None, 0
+    header_length, = struct.unpack_from("<I", buffer, len(MAGIC))
+    header_start = len(MAGIC) + 4
+    header = json.loads(bytes(buffer[header_start:header_start + header_length]))
+    data_start = -(-(header_start + header_length) // ALIGNMENT) * ALIGNMENT
+    return header, data_start
+
+
+class LevelData:
+    """A compiled level, backed by a memory-mapped file or any other buffer holding one."""
+
+    def __init__(self, file_name, buffer=None):
+        """
+        :param file_name: The compiled level file.
+        :param buffer: The contents of that file already in memory, e.g.
+            shared memory another process filled. The file is not opened then.
+        """
+        self.file_name = file_name
+        if buffer is None:
+            with open(file_name, "rb") as level_file:
+                buffer = mmap.mmap(level_file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.header, self._data_start = _parse_header(buffer)
+        if self.header is None:
+            raise ValueError(f"{file_name} is not a compiled level")
+        self.buffer = buffer
+
+        self.map_name = self.header["map_name"]
+        self.source_hash = self.header["source_hash"]
+        self.scaling = self.header["scaling"]
+        self.width = self.header["width"]
+        self.height = self.header["height"]
+        self.tile_width = self.header["tile_width"]
+        self.tile_height = self.header["tile_height"]
+        color = self.header["background_color"]
+        self.background_color = tuple(color) if color else None
+        self.layers = self.header["layers"]
+        self.layer_names = [layer["name"] for layer in self.layers]
+
+    def array(self, name):
+        """Read-only view of a stored array, without copying it."""
+        info = self.header["arrays"][name]
+        descr = info["dtype"]
+        if isinstance(descr, list):
+            descr = [tuple(field) for field in descr]
+        dtype = np.lib.format.descr_to_dtype(descr)
+        count = int(np.prod(info["shape"]))
+        return np.frombuffer(self.buffer, dtype=dtype, count=count,
+                             offset=self._data_start + info["offset"]).reshape(info["shape"])
+
+    def _layer(self, name):
+        for layer in self.layers:
+            if layer["name"] == name:
+                return layer
+        raise KeyError(name)
+
+    def gids(self, name):
+        """Tile GIDs of a tile layer, shape (height, width), row 0 at the top."""
+        return self.array(self._layer(name)["gids"])
+
+    def sprites(self, name):
+        """Sprite records of a layer (SPRITE_DTYPE)."""
+        return self.array(self._layer(name)["sprites"])
+
+    @property
+    def chunk_count(self):
+        return _chunk_count(self.width)
+
+    @property
+    def chunk_width(self):
+        """Width of a streaming chunk in world pixels."""
+        return self.tile_width * self.scaling * CHUNK_COLUMNS
+
+    def chunk_offsets(self, name):
+        """Offset table of a layer's sprite records, one entry per chunk plus one."""
+        return self.array(self._layer(name)["chunks"])
+
+    def reach(self, name):
+        """How far, in pixels, a sprite of the layer can extend past its chunk."""
+        return self._layer(name)["reach"]
+
+    @property
+    def enemy_spawns(self):
+        """Enemy spawn records (SPAWN_DTYPE)."""
+        return self.array("spawns")
+
+    @property
+    def pixel_width(self):
+        """Width of the level in world pixels."""
+        return self.width * self.tile_width * self.scaling
+
+
+def load_level(map_name, scaling=1.0, layer_scaling=None, cache_dir=CACHE_DIR):
+    """
+    Load a compiled level, compiling it first if the cache is missing or stale.
+    """
+    layer_scaling = layer_scaling or {}
+    output = cache_path(map_name, cache_dir)
+    expected = source_hash(map_name, scaling, layer_scaling)
+
+    # Anything shorter than the magic, like an empty file, can't be mapped
+    if os.path.exists(output) and os.path.getsize(output) > len(MAGIC):
+        with open(output, "rb") as level_file:
+            # Only the pages holding the header are read
+            with mmap.mmap(level_file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                header, _ = _parse_header(buffer)
+        if header is not None and header.get("source_hash") == expected:
+            return LevelData(output)
+
+    compile_level(map_name, output, scaling, layer_scaling)
+    return LevelData(output)
+
+
+def get_texture(level, index):
+    """Texture number ``index`` of a level's texture table, loaded once per process."""
+    info = level.header["textures"][index]
+    image = level.header["images"][info["image"]]
+    x, y, width, height = info["rect"]
+    key = (image, x, y, width, height, tuple(info["flip"]))
+    texture = _texture_cache.get(key)
+    if texture is None:
+        # The hit box of each sprite comes from the cache, so skip the texture's own
+        pack = assets.current()
+        if pack is not None and image in pack:
+            texture = pack.region_texture(image, x, y, width, height, hit_box_algorithm=algo_bounding_box)
+        else:
+            texture = arcade.load_texture(image, x=x, y=y, width=width, height=height,
+                                          hit_box_algorithm=algo_bounding_box)
+        diagonal, horizontal, vertical = info["flip"]
+        if diagonal:
+            texture = texture.flip_diagonally()
+        if horizontal:
+            texture = texture.flip_horizontally()
+        if vertical:
+            texture = texture.flip_vertically()
+        _texture_cache[key] = texture
+    return texture
+
+
+def preload_textures(level):
+    """Load every texture of a level, so building its sprites later decodes nothing. Returns them."""
+    return [get_texture(level, index) for index in range(len(level.header["textures"]))]
+
+
+def make_sprite(level, record):
+    """
+    Create the sprite described by one SPRITE_DTYPE record.
+
+    Animated tiles start on their first frame; animation.LayerAnimator
+    plays their animation.
+    """
+    sprite = arcade.Sprite(get_texture(level, record["texture"]))
+
+    sprite.scale_xy = float(record["scale_x"]), float(record["scale_y"])
+    sprite.position = float(record["center_x"]), float(record["center_y"])
+    sprite.angle = float(record["angle"])
+    sprite.hit_box = RotatableHitBox(
+        level.header["hit_boxes"][record["hit_box"]],
+        position=sprite.position,
+        angle=sprite.angle,
+        scale=sprite.scale_xy,
+    )
+    sprite.change_x = float(record["change_x"])
+    sprite.change_y = float(record["change_y"])
+    sprite.boundary_left = _none_if_nan(record["boundary_left"])
+    sprite.boundary_right = _none_if_nan(record["boundary_right"])
+    sprite.boundary_bottom = _none_if_nan(record["boundary_bottom"])
+    sprite.boundary_top = _none_if_nan(record["boundary_top"])
+    return sprite
+
+
+def build_scene(level, layer_options=None, streamed=()):
+    """
+    Build an arcade.Scene holding a sprite list for every layer with sprites.
+
+    :param layer_options: Per layer dict of SpriteList options, e.g.
+        ``{"Platforms": {"use_spatial_hash": True}}``.
+    :param streamed: Layers whose sprite lists are left empty, to be filled
+        chunk by chunk by a LevelStreamer.
+    """
+    layer_options = layer_options or {}
+    scene = arcade.Scene()
+    for layer in level.layers:
+        if layer["sprites"] is None:
+            continue
+        options = layer_options.get(layer["name"], {})
+        sprite_list = arcade.SpriteList(use_spatial_hash=options.get("use_spatial_hash", False))
+        sprite_list.visible = layer.get("visible", True)
+        if layer["name"] not in streamed:
+            for record in level.sprites(layer["name"]):
+                sprite_list.append(make_sprite(level, record))
+        scene.add_sprite_list(layer["name"], sprite_list=sprite_list)
+    return scene
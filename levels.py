@@ -0,0 +1,90 @@
+"""
+Level sequence with background preloading.
+
+While a level is being played, the next one in the sequence is prepared
+on a worker thread: its compiled level file is loaded (compiling the Tiled
+map if the cache is stale) and everything its sprites need is decoded.
+Switching levels then only has to build sprites from data already in
+memory, instead of stalling on disk and image decoding.
+"""
+
+import threading
+import time
+
+
+class LevelManager:
+    """Walks a sequence of maps, preparing the next one while the current one is played."""
+
+    def __init__(self, maps, prepare):
+        """
+        :param maps: Map file names in play order. The sequence starts over
+            after the last one.
+        :param prepare: Callable taking a map name and returning its level
+            data. Runs on a worker thread, so it must not touch OpenGL.
+        """
+        self.maps = list(maps)
+        self.prepare = prepare
+
+        # Number of levels finished so far; the current map is derived from it
+        self.index = 0
+
+        # Level data of the current map, once loaded
+        self.current = None
+
+        # Worker preparing the next map, and where it leaves its result
+        self._thread = None
+        self._result = {}
+
+        # Seconds the last advance() waited for the worker to finish
+        self.last_wait = 0.0
+
+    @property
+    def map_name(self):
+        return self.maps[self.index % len(self.maps)]
+
+    @property
+    def next_map_name(self):
+        return self.maps[(self.index + 1) % len(self.maps)]
+
+    def load_current(self):
+        """Level data of the current map, prepared on this thread if nothing did it yet."""
+        if self.current is None:
+            self.current = self.prepare(self.map_name)
+        return self.current
+
+    def prefetch(self):
+        """Start preparing the next map in the background, unless that already started."""
+        if self._thread is not None:
+            return
+
+        map_name = self.next_map_name
+        result = self._result = {}
+
+        def load():
+            try:
+                result["level"] = self.prepare(map_name)
+            except Exception as error:
+                # Raised again on the main thread by advance()
+                result["error"] = error
+
+        self._thread = threading.Thread(target=load, name="level-prefetch", daemon=True)
+        self._thread.start()
+
+    @property
+    def next_ready(self):
+        """True once the next map has been prepared."""
+        return self._thread is not None and not self._thread.is_alive()
+
+    def advance(self):
+        """Make the next map current and return its level data, waiting for the worker if needed."""
+        self.prefetch()
+        start = time.perf_counter()
+        self._thread.join()
+        self.last_wait = time.perf_counter() - start
+
+        result, self._thread = self._result, None
+        if "error" in result:
+            raise result["error"]
+        self.index += 1
+        self.current = result["level"]
+        return self.current
@@ -0,0 +1,131 @@
+"""
+Background asset loading.
+
+Assets are loaded by jobs running one after another on a worker thread,
+so the window keeps drawing while they load. A job may have an upload
+step that needs OpenGL, e.g. adding its textures to the sprite atlas;
+uploads run on the main thread from update(), a few steps at a time
+within a per-frame time budget, so no frame stalls on a large upload.
+
+Jobs added as lazy only start when first asked for, for assets that are
+only needed later on, like the game over screen.
+"""
+
+import collections
+import inspect
+import queue
+import threading
+import time
+
+import arcade
+
+# Seconds of upload work done per frame
+DEFAULT_UPLOAD_BUDGET = 0.004
+
+
+def upload_textures(textures):
+    """Upload step adding textures to the window's sprite atlas, one texture per step."""
+    atlas = arcade.get_window().ctx.default_atlas
+    for texture in textures:
+        atlas.add(texture)
+        yield
+
+
+class AssetLoader:
+    """Loads named assets on a worker thread and uploads them on the main thread."""
+
+    def __init__(self):
+        # name -> (load, upload) of every job added
+        self.jobs = {}
+
+        # Assets loaded and uploaded, by name
+        self.assets = {}
+
+        # Names queued for the worker so far
+        self._requested = set()
+        self._queue = queue.Queue()
+        self._thread = None
+
+        # (name, asset, error) of the jobs the worker finished, waiting for
+        # their upload, and the (name, asset, steps) of the upload under way
+        self._loaded = collections.deque()
+        self._upload = None
+
+    def add(self, name, load, upload=None, lazy=False):
+        """
+        Add a job loading an asset.
+
+        :param load: Callable returning the asset. Runs on the worker
+            thread, so it must not touch OpenGL. None for assets that are
+            only built by their upload.
+        :param upload: Callable taking the asset, run on the main thread
+            once it is loaded and the assets requested before it are
+            uploaded. A generator function is run a step at a time, a step
+            ending at every item it yields; what it returns, if not None,
+            becomes the asset.
+        :param lazy: Wait for the asset to be asked for before loading it.
+        """
+        self.jobs[name] = (load, upload)
+        if not lazy:
+            self.request(name)
+
+    def request(self, name):
+        """Start loading an asset, unless that already started."""
+        if name in self._requested:
+            return
+        self._requested.add(name)
+        self._queue.put(name)
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._work, name="asset-loader", daemon=True)
+            self._thread.start()
+
+    def _work(self):
+        while True:
+            name = self._queue.get()
+            load, _ = self.jobs[name]
+            try:
+                self._loaded.append((name, load() if load is not None else None, None))
+            except Exception as error:
+                # Raised again on the main thread by update()
+                self._loaded.append((name, None, error))
+
+    def update(self, budget=DEFAULT_UPLOAD_BUDGET):
+        """
+        Upload loaded assets until ``budget`` seconds are spent. Call once
+        per frame from the main thread.
+        """
+        deadline = time.perf_counter() + budget
+        while time.perf_counter() < deadline:
+            if self._upload is None:
+                if not self._loaded:
+                    return
+                name, asset, error = self._loaded.popleft()
+                if error is not None:
+                    raise error
+                _, upload = self.jobs[name]
+                steps = upload(asset) if upload is not None else None
+                self._upload = (name, asset, steps if inspect.isgenerator(steps) else iter(()))
+
+            name, asset, steps = self._upload
+            try:
+                next(steps)
+            except StopIteration as stop:
+                self.assets[name] = asset if stop.value is None else stop.value
+                self._upload = None
+
+    def ready(self, *names):
+        """True once every asset named is loaded and uploaded."""
+        return all(name in self.assets for name in names)
+
+    def get(self, name):
+        """An asset, or None while it is still loading. Lazy assets start loading."""
+        self.request(name)
+        return self.assets.get(name)
+
+    def progress(self, *names):
+        """Fraction of the assets named that are ready."""
+        return sum(name in self.assets for name in names) / len(names) if names else 1.0
+
+
+# The process-wide loader
+loader = AssetLoader()
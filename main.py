@@ -2,9 +2,44 @@
 Silent Valley
 """
 
-import arcade
+import argparse
+import collections
+import glob
 import math
-import random
+import os
+import statistics
+import struct
+import sys
+import time
+import zlib
+
+# arcade opens a display as soon as it is imported unless told not to
+if any(flag in sys.argv for flag in ("--headless", "--compile-levels", "--pack-assets", "--turbo")):
+    os.environ.setdefault("ARCADE_HEADLESS", "1")
+
+import arcade
+import numpy as np
+
+import assets
+import level_cache
+import textures
+from activation import MovingPlatforms, activation_region
+from animation import Animator, LayerAnimator, load_clips
+from enemies import EnemySwarm
+from hud import ProfilerOverlay, ScoreDisplay, TextLayer
+from levels import LevelManager
+from loading import loader, upload_textures
+from mixer import Mixer
+from music import MusicPlayer
+from particles import ParticleEffects
+from pathfinding import FlowField
+from physics import PlatformerPhysics, TileWalls
+from profiling import profiler
+from replay import InputRecording, ReplayDivergence, ReplayPlayer
+from renderer import StaticLayerRenderer
+from streaming import LevelStreamer
+from tile_index import TileIndex
+from timestep import FixedTimestep, SpriteInterpolator
 
 # Constants
 SCREEN_WIDTH = 900
@@ -16,14 +51,22 @@ CHARACTER_SCALING = 2
 TILE_SCALING = 2
 COIN_SCALING = 2
 
-# End of the map is 5000 according to player_sprite.center_x
-END_OF_MAP = 5040
+# The level ends this many pixels before the right edge of the map
+# (5040 according to player_sprite.center_x on map1)
+END_OF_MAP_MARGIN = 384
 
 # Movement speed of player, in pixels per frame
 PLAYER_MOVEMENT_SPEED = 8
 GRAVITY = 1
 PLAYER_JUMP_SPEED = 18
 
+# Highest ledge the player walks up onto without jumping: above the rocks
+# and other sloped tiles, below a full tile so walls still stop the player
+PLAYER_STEP_HEIGHT = 40
+
+# Distance chasing enemies fly per step, a bit slower than the player walks
+CHASE_SPEED = 3
+
 # How many pixels to keep as a minimum margin between the character
 # and the edge of the screen.
 LEFT_VIEWPORT_MARGIN = 200
@@ -31,6 +74,9 @@ RIGHT_VIEWPORT_MARGIN = 200
 BOTTOM_VIEWPORT_MARGIN = 150
 TOP_VIEWPORT_MARGIN = 100
 
+# Background music, played as a shuffled playlist
+MUSIC_TRACKS = [f"data/music/track{i}.mp3" for i in range(1, 13)]
+
 # Player starting position -def is 350 for x
 PLAYER_START_X = 350
 PLAYER_START_Y = 300
@@ -46,16 +92,189 @@ LAYER_NAME_STATUES = "Statues"
 # Player Layer
 LAYER_NAME_PLAYER = "Player"
 
+# Frame times kept to compare a level transition against
+FRAME_HISTORY = 120
+
+# Where the profiler's frames are exported to, as .csv and .json (Chrome trace)
+PROFILE_PREFIX = "profile"
+
+# Maps played in order; the sequence starts over after the last one
+LEVEL_MAPS = ["data/map1.json"]
+
+# Layers whose sprites only exist in the chunks around the camera
+STREAMED_LAYERS = [
+    "Background",
+    "OrangeTrees",
+    LAYER_NAME_DEATH,
+    LAYER_NAME_STATUES,
+    LAYER_NAME_PLATFORMS,
+    LAYER_NAME_COINS,
+]
+
+# Layers whose static tiles are drawn from baked chunk textures
+BAKED_LAYERS = ["Background", "OrangeTrees", LAYER_NAME_STATUES, LAYER_NAME_PLATFORMS]
+
+# Baked layers whose sprites nothing collides with (the platforms are
+# collided with through their tile grid), so only their animated tiles need sprites
+DECORATION_LAYERS = ["Background", "OrangeTrees", LAYER_NAME_STATUES, LAYER_NAME_PLATFORMS]
+
+# Enemies and moving platforms further than this many pixels left or right
+# of the camera (give or take half of it) sleep until it comes closer
+ACTIVATION_MARGIN = 450
+
+# Layers with animated tiles, animated only where they are on screen
+ANIMATED_LAYERS = [LAYER_NAME_COINS, LAYER_NAME_STATUES, LAYER_NAME_DEATH]
+
+# Images packed into the asset pack, on top of the tilesets of every map
+PACKED_IMAGES = ["data/princess/*/*.png", "data/bat/*.png"]
+
+# Animation clips: frame file name format, first and last frame, seconds per frame
+PLAYER_CLIPS = {
+    "idle": ("data/princess/idle/idle{}.png", 1, 1, 0),
+    "jump": ("data/princess/jump/jump{}.png", 1, 1, 0),
+    "fall": ("data/princess/fall/fall{}.png", 1, 1, 0),
+    "walk": ("data/princess/walk/walk{}.png", 1, 7, 1 / 60),
+}
+BAT_CLIPS = {
+    "idle": ("data/bat/bat_flying{}.png", 1, 1, 0),
+    "walk": ("data/bat/bat_flying{}.png", 1, 4, 4 / 60),
+}
+
+# Animation states in priority order, with the condition on the sprite for each
+PLAYER_STATES = [
+    ("jump", lambda sprite: sprite.change_y > 0 and not sprite.is_on_ladder),
+    ("fall", lambda sprite: sprite.change_y < 0 and not sprite.is_on_ladder),
+    ("idle", lambda sprite: sprite.change_x == 0),
+    ("walk", lambda sprite: True),
+]
+ENEMY_STATES = [
+    ("idle", lambda sprite: sprite.change_x == 0),
+    ("walk", lambda sprite: True),
+]
+
 # Constants used to track if the player is facing left or right
 RIGHT_FACING = 0
 LEFT_FACING = 1
 
+# The simulation always advances in fixed steps of this size, whatever the
+# frame rate. Speeds, GRAVITY, jump and every other movement constant are
+# per step, so the rate is fixed: changing it changes the game's speed
+SIMULATION_RATE = 60
+SIMULATION_DELTA = 1 / SIMULATION_RATE
+
+# Frames drawn per second by default (--fps)
+FRAME_RATE = 60
+
+# Input bits fed into GameSimulation.step()
+INPUT_LEFT = 1
+INPUT_RIGHT = 2
+INPUT_UP = 4
+INPUT_DOWN = 8
+
+# Events reported back by GameSimulation.step()
+EVENT_COIN = "coin"
+EVENT_JUMP = "jump"
+EVENT_DEATH = "death"
+EVENT_LEVEL_COMPLETE = "level_complete"
+
+# Sound effect played for each event
+SOUND_EFFECTS = {
+    EVENT_COIN: ":resources:sounds/coin1.wav",
+    EVENT_JUMP: ":resources:sounds/jump1.wav",
+    EVENT_DEATH: ":resources:sounds/gameover1.wav",
+}
+
+# Particle kinds: frame strip, frame count, ticks per frame (0 plays the
+# strip once over a particle's life), capacity, gravity, fraction of the
+# life after which they fade out, additive blending
+PARTICLE_KINDS = {
+    "sparkle": ("data/coin_rot_anim.png", 6, 3, 4096, -0.3, 0.5, False),
+    "spirit": ("data/vfx.png", 16, 0, 1024, 0.0, 0.8, False),
+    "ember": ("data/burning_loop_1.png", 8, 5, 8192, 0.03, 0.3, True),
+}
+
+# Sparkles flying out of a coin picked up
+COIN_SPARKLES = 16
+
+# Small spirits scattering from where the player died, around a big one
+DEATH_SPIRITS = 24
+
+# Seconds the death effect plays before the game over screen
+DEATH_EFFECT_TIME = 1.25
+
+# Full screen images of the menus
+MENU_BACKGROUND = "data/bg.jpg"
+GAME_OVER_BACKGROUND = "data/gameover.jpg"
+
+# Size the sprite atlas starts at, large enough for the menu images so it
+# never has to grow, which stalls a frame
+ATLAS_SIZE = (1024, 1024)
+
+# Seconds per frame spent uploading assets while the loading screen is up;
+# other views leave loading.DEFAULT_UPLOAD_BUDGET to the game
+LOADING_UPLOAD_BUDGET = 0.012
+
+# Names of the assets loaded in the background (see loading.py)
+ASSET_MENU_BACKGROUND = "menu_background"
+ASSET_GAME_OVER_BACKGROUND = "game_over_background"
+ASSET_FIRST_LEVEL = "first_level"
+ASSET_SOUNDS = "sounds"
+ASSET_GAME = "game"
+
+
+class LoadingView(arcade.View):
+    """Shows how far background loading got until some assets are ready, then moves on."""
+
+    def __init__(self, names, make_view):
+        """
+        :param names: Names of the assets to wait for.
+        :param make_view: Callable building the view to show once they are ready.
+        """
+        super().__init__()
+        self.names = names
+        self.make_view = make_view
+
+    def on_show_view(self):
+        """ This is run once when we switch to this view """
+        self.window.background_color = arcade.csscolor.DARK_SLATE_BLUE
+        arcade.set_viewport(0, self.window.width, 0, self.window.height)
+
+    def on_update(self, delta_time):
+        loader.update(LOADING_UPLOAD_BUDGET)
+        if loader.ready(*self.names):
+            self.window.show_view(self.make_view())
+
+    def on_draw(self):
+        """ Draw this view """
+        # Just a progress bar: laying out the first text would hold up the first frame
+        self.clear()
+        right = 250 + 400 * loader.progress(*self.names)
+        arcade.draw_lrbt_rectangle_filled(250, right, 220, 240, arcade.color.ASH_GREY)
+        arcade.draw_lrbt_rectangle_outline(250, 650, 220, 240, arcade.color.ASH_GREY)
+
+
+def show_when_ready(window, names, make_view):
+    """Show the view built by ``make_view`` once the assets named are ready, with a loading screen until then."""
+    if loader.ready(*names):
+        window.show_view(make_view())
+    else:
+        window.show_view(LoadingView(names, make_view))
+
 
 class GameOverView(arcade.View):
 
-    def __init__(self):
+    def __init__(self, game_view):
         super().__init__()
-        self.texture = arcade.load_texture("data/gameover.jpg")
+
+        # The game we came from, restarted in place when the player continues
+        self.game_view = game_view
+
+        # Only loaded the first time the game is lost, drawn once it is ready
+        loader.request(ASSET_GAME_OVER_BACKGROUND)
+
+        # Text is built once, with the view; GameView keeps the view for every loss
+        self.text = TextLayer()
+        self.text.add("game_over", "GAME OVER", 250, 100, arcade.color.ASH_GREY, 45, "Kenney Rocket")
 
     def on_show_view(self):
         """ This is run once when we switch to this view """
@@ -65,137 +284,99 @@ class GameOverView(arcade.View):
         # to reset the viewport back to the start, so we can see what we draw.
         arcade.set_viewport(0, self.window.width, 0, self.window.height)
 
+    def on_update(self, delta_time):
+        loader.update()
+
     def on_draw(self):
         """ Draw this view """
         self.clear()
-        self.texture.draw_scaled(450, 245)
-
-        game_over = arcade.Text(
-            "GAME OVER",
-            250,
-            100,
-            arcade.color.ASH_GREY,
-            45,
-            font_name="Kenney Rocket",
-        )
-
-        game_over.draw()
+        texture = loader.get(ASSET_GAME_OVER_BACKGROUND)
+        if texture is not None:
+            texture.draw_scaled(450, 245)
+        self.text.draw()
 
     def on_key_press(self, key, modifiers):
         if key == arcade.key.ESCAPE or key == arcade.key.Q:
             arcade.exit()
         elif key == arcade.key.SPACE:
-            game_view = GameView()
-            game_view.setup()
-            self.window.show_view(game_view)
+            with profiler.phase("view_switch"):
+                self.game_view.restart()
+                self.window.show_view(self.game_view)
 
 
 class InstructionView(arcade.View):
 
-    def __init__(self):
+    def __init__(self, music, recording=None):
         super().__init__()
-        self.texture = arcade.load_texture("data/bg.jpg")
-        self.songs = ["data/music/track1.mp3",
-                      "data/music/track2.mp3",
-                      "data/music/track3.mp3",
-                      "data/music/track4.mp3",
-                      "data/music/track5.mp3",
-                      "data/music/track6.mp3",
-                      "data/music/track7.mp3",
-                      "data/music/track8.mp3",
-                      "data/music/track9.mp3",
-                      "data/music/track10.mp3",
-                      "data/music/track11.mp3",
-                      "data/music/track12.mp3"]
-        self.cur_song_index = random.randint(0, 11)
-        self.my_music = arcade.load_sound(self.songs[self.cur_song_index])
+        self.music = music
+
+        # Everything the game needs loads in the background while the menu
+        # is up, so the game starts as soon as space is pressed
+        loader.request(ASSET_MENU_BACKGROUND)
+        loader.request(ASSET_FIRST_LEVEL)
+        loader.request(ASSET_SOUNDS)
+        loader.add(ASSET_GAME, None, upload=lambda _: prepare_game(recording))
+
+        # Where the game records its inputs, if it is being recorded
+        self.recording = recording
+
+        # Text is built once, with the view; GameView keeps the view for every loss
+        self.text = TextLayer()
+        self.text.add("game_name", "SILENT VALLEY", 550, 430, arcade.color.ASH_GREY, 25, "Kenney Future")
+        self.text.add("start_game", "PRESS SPACE TO START PLAYING", 550, 380, arcade.color.ASH_GREY, 15,
+                      "Kenney Mini")
+        self.text.add("exit_game", "PRESS ESC OR Q TO EXIT", 610, 330, arcade.color.ASH_GREY, 15, "Kenney Mini")
 
     def on_show_view(self):
         """ This is run once when we switch to this view """
         self.window.background_color = arcade.csscolor.DARK_SLATE_BLUE
 
-        # Load music
-
-        arcade.play_sound(self.my_music, looping=True)
+        # Start streaming music, the first track is opened in the background
+        self.music.play()
 
         # Reset the viewport, necessary if we have a scrolling game, and we need
         # to reset the viewport back to the start, so we can see what we draw.
         arcade.set_viewport(0, self.window.width, 0, self.window.height)
 
+    def on_update(self, delta_time):
+        # The first level keeps uploading while the menu is up
+        loader.update()
+
     def on_draw(self):
         """ Draw this view """
         self.clear()
-        self.texture.draw_scaled(450, 245)
-
-        game_name = arcade.Text(
-            "SILENT VALLEY",
-            550,
-            430,
-            arcade.color.ASH_GREY,
-            25,
-            font_name="Kenney Future",
-        )
-
-        start_game = arcade.Text(
-            "PRESS SPACE TO START PLAYING",
-            550,
-            380,
-            arcade.color.ASH_GREY,
-            15,
-            font_name="Kenney Mini",
-        )
-
-        exit_game = arcade.Text(
-            "PRESS ESC OR Q TO EXIT",
-            610,
-            330,
-            arcade.color.ASH_GREY,
-            15,
-            font_name="Kenney Mini",
-        )
-
-        game_name.draw()
-        start_game.draw()
-        exit_game.draw()
+        texture = loader.get(ASSET_MENU_BACKGROUND)
+        if texture is not None:
+            texture.draw_scaled(450, 245)
+        self.text.draw()
 
     def on_key_press(self, key, modifiers):
         if key == arcade.key.ESCAPE or key == arcade.key.Q:
             arcade.exit()
         elif key == arcade.key.SPACE:
-            game_view = GameView()
-            game_view.setup()
-            self.window.show_view(game_view)
+            with profiler.phase("view_switch"):
+                show_when_ready(self.window, [ASSET_FIRST_LEVEL, ASSET_SOUNDS, ASSET_GAME],
+                                lambda: loader.get(ASSET_GAME))
 
 
 class Entity(arcade.Sprite):
 
-    def __init__(self, name_folder, name_file):
+    def __init__(self, clips, states):
         super().__init__()
 
         # Default to facing right
 
         self.facing_direction = RIGHT_FACING
 
-        # Used for image sequences
-
-        self.cur_texture = 0
         self.scale = 3
         self.character_face_direction = RIGHT_FACING
 
-        main_path = f"data/{name_folder}/{name_file}"
-
-        self.idle_texture_pair = arcade.load_texture_pair(f"{main_path}_flying1.png")
-        # self.death_texture_pair = arcade.load_texture_pair(f"{main_path}_death1.png")
-
-        # Load textures for walking
-        self.walk_textures = []
-
-        for i in range(1, 5):
-            texture = arcade.load_texture_pair(f"{main_path}_flying{i}.png")
-            self.walk_textures.append(texture)
+        # Plays the clip of the current state; textures are shared by every
+        # instance through the registry
+        self.animator = Animator(load_clips(clips), states)
 
         # Set the initial texture
-        self.texture = self.idle_texture_pair[0]
+        self.texture = self.animator.clips["idle"].frames[0][RIGHT_FACING]
 
         # Hit box will be set based on the first image used. If you want to specify
 
@@ -224,13 +405,14 @@ class Entity(arcade.Sprite):
 
 class Enemy(Entity):
 
-    def __init__(self, name_folder, name_file):
+    # Distance flown per step chasing the player, 0 for patrolling enemies
+    chase_speed = 0
 
-        # Setup parent class
+    def __init__(self, clips, states=ENEMY_STATES):
 
-        super().__init__(name_folder, name_file)
+        # Setup parent class
 
-        self.should_update_walk = 0
+        super().__init__(clips, states)
 
     def update_animation(self, delta_time: float = 1 / 60):
 
@@ -244,37 +426,30 @@ class Enemy(Entity):
 
             self.facing_direction = RIGHT_FACING
 
-        # Idle animation
-
-        if self.change_x == 0:
-            self.texture = self.idle_texture_pair[self.facing_direction]
-
-            return
-
-        # Walking animation
+        # Idle or walking, each frame shown for its clip's duration
 
-        if self.should_update_walk == 3:
+        self.texture = self.animator.update(self, delta_time)[self.facing_direction]
 
-            self.cur_texture += 1
 
-            if self.cur_texture > 3:
-                self.cur_texture = 0
-
-            self.texture = self.walk_textures[self.cur_texture][self.facing_direction]
+class BatEnemy(Enemy):
 
-            self.should_update_walk = 0
+    def __init__(self):
+        # Set up parent class
 
-            return
+        super().__init__(BAT_CLIPS)
 
-        self.should_update_walk += 1
 
+class ChasingBatEnemy(BatEnemy):
+    """Bat flying after the player around the platforms instead of patrolling."""
 
-class BatEnemy(Enemy):
+    chase_speed = CHASE_SPEED
 
-    def __init__(self):
-        # Set up parent class
 
-        super().__init__("bat", "bat")
+# Enemy class for each "type" property of the Enemies layer
+ENEMY_TYPES = {
+    "bat": BatEnemy,
+    "chasing_bat": ChasingBatEnemy,
+}
 
 
 class PlayerCharacter(arcade.Sprite):
@@ -290,10 +465,6 @@ class PlayerCharacter(arcade.Sprite):
 
         self.character_face_direction = RIGHT_FACING
 
-        # Used for flipping between image sequences
-
-        self.cur_texture = 0
-
         self.scale = CHARACTER_SCALING
 
         # Track our state
@@ -306,30 +477,13 @@ class PlayerCharacter(arcade.Sprite):
 
         # --- Load Textures ---
 
-        # Images from Kenney.nl's Asset Pack 3
+        # Images from Kenney.nl's Asset Pack 3, shared by every instance through the registry
 
-        main_path = "data"
-
-        # Load textures for idle standing
-
-        self.idle_texture_pair = arcade.load_texture_pair(f"{main_path}/princess/idle/idle1.png")
-
-        self.jump_texture_pair = arcade.load_texture_pair(f"{main_path}/princess/jump/jump1.png")
-
-        self.fall_texture_pair = arcade.load_texture_pair(f"{main_path}/princess/fall/fall1.png")
-
-        # Load textures for walking
-
-        self.walk_textures = []
-
-        for i in range(1, 8):
-            texture = arcade.load_texture_pair(f"{main_path}/princess/walk/walk{i}.png")
-
-            self.walk_textures.append(texture)
+        self.animator = Animator(load_clips(PLAYER_CLIPS), PLAYER_STATES)
 
         # Set the initial texture
 
-        self.texture = self.idle_texture_pair[0]
+        self.texture = self.animator.clips["idle"].frames[0][RIGHT_FACING]
 
         # Hit box will be set based on the first image used. If you want to specify
 
@@ -367,64 +521,100 @@ class PlayerCharacter(arcade.Sprite):
 
             self.character_face_direction = RIGHT_FACING
 
-        # Jumping animation
+        # Jumping, falling, idle or walking, each frame shown for its clip's duration
 
-        if self.change_y > 0 and not self.is_on_ladder:
+        self.texture = self.animator.update(self, delta_time)[self.character_face_direction]
 
-            self.texture = self.jump_texture_pair[self.character_face_direction]
 
-            return
+class SimulationSnapshot:
+    """
+    Everything about a running level that can change while playing.
 
-        elif self.change_y < 0 and not self.is_on_ladder:
+    Taken with GameSimulation.snapshot() and put back in place with
+    GameSimulation.restore(), without rebuilding any sprites.
+    """
 
-            self.texture = self.fall_texture_pair[self.character_face_direction]
+    def __init__(self, simulation):
+        player = simulation.player_sprite
+        self.player = (player.center_x, player.center_y, player.change_x, player.change_y,
+                       player.character_face_direction, player.animator.state, player.animator.time,
+                       player.texture)
 
-            return
+        self.enemies = simulation.enemies.get_state()
 
-        # Idle animation
+        self.moving_platforms = simulation.moving_platforms.get_state()
 
-        if self.change_x == 0:
-            self.texture = self.idle_texture_pair[self.character_face_direction]
+        # One bit per coin of the level, set when it has been collected
+        self.coins_collected = np.packbits(simulation.coins_collected)
 
-            return
+        self.score = simulation.score
+        self.keys = simulation.keys
+        self.jump_needs_reset = simulation.jump_needs_reset
+        self.tick = simulation.tick
+        self.game_over = simulation.game_over
+        self.level_complete = simulation.level_complete
 
-        # Walking animation
 
-        self.cur_texture += 1
+def prepare_level(map_name):
+    """
+    Load a level and everything needed to build it, without touching OpenGL.
 
-        if self.cur_texture > 6:
-            self.cur_texture = 0
+    Used by the LevelManager to get the next level ready on a worker thread.
+    """
+    return preload_level(load_level_data(map_name))
 
-        self.texture = self.walk_textures[self.cur_texture][
 
-            self.character_face_direction
+def packed_images(maps=LEVEL_MAPS):
+    """File names of every image in the asset pack."""
+    files = sorted(file_name for pattern in PACKED_IMAGES for file_name in glob.glob(pattern))
+    for map_name in maps:
+        files += level_cache.tileset_images(map_name)
+    return list(dict.fromkeys(files))
 
-        ]
 
+def preload_level(level_data):
+    """Load everything needed to build a loaded level's sprites."""
+    assets.load_pack(packed_images())
+    level_cache.preload_textures(level_data)
+    for enemy_type in set(level_data.enemy_spawns["type"].tolist()):
+        # Creating one loads the enemy's textures into the registry
+        ENEMY_TYPES[enemy_type]()
+    return level_data
 
-class GameView(arcade.View):
-    """
-    Main application class.
-    """
 
-    def __init__(self):
+def upload_level(level_data):
+    """Upload step adding a prepared level's textures and the characters' to the sprite atlas."""
+    yield from upload_textures(level_cache.preload_textures(level_data) + textures.loaded_textures())
 
-        # Call the parent class and set up the window
-        super().__init__()
 
-        # Disable mouse
-        self.window.set_mouse_visible(False)
+def load_level_data(map_name):
+    """Load a compiled level with the game's scaling, compiling it if needed."""
+    return level_cache.load_level(map_name, TILE_SCALING, {LAYER_NAME_COINS: COIN_SCALING})
 
-        # Track the current state of what key is pressed
 
-        self.left_pressed = False
-        self.right_pressed = False
-        self.up_pressed = False
-        self.down_pressed = False
-        self.jump_needs_reset = False
+class GameSimulation:
+    """
+    Headless game state and logic.
 
-        # Our TileMap Object
-        self.tile_map = None
+    Owns the tile map, player, enemies, coins and physics, and advances them
+    one fixed step at a time from explicit inputs. Nothing in here needs a
+    window, so it can be stepped on display-less machines.
+    """
+
+    def __init__(self, maps=LEVEL_MAPS, prepare=prepare_level, activation_margin=ACTIVATION_MARGIN):
+        """
+        :param maps: Map names in play order.
+        :param prepare: Callable returning the level data of a map name,
+            see LevelManager.
+        :param activation_margin: How far beside the camera enemies and
+            moving platforms keep moving; math.inf keeps all of them awake.
+        """
+
+        # The sequence of levels, with the next one loading in the background
+        self.levels = LevelManager(maps, prepare)
+
+        # The compiled level we are playing
+        self.level_data = None
 
         # Our Scene Object
         self.scene = None
@@ -435,11 +625,37 @@ class GameView(arcade.View):
         # Our physics engine
         self.physics_engine = None
 
-        # A Camera that can be used for scrolling the screen
-        self.camera = None
+        # Positions and velocities of every enemy
+        self.enemies = None
 
-        # A Camera that can be used to draw GUI elements
-        self.gui_camera = None
+        # Ways to the player around the platforms, None without chasing enemies
+        self.flow_field = None
+
+        # The moving platforms, of which only those near the camera move
+        self.moving_platforms = None
+        self.activation_margin = activation_margin
+
+        # Loads and releases the chunks of the level around the camera
+        self.streamer = None
+
+        # Animates the tiles on screen
+        self.tile_animator = None
+
+        # Which coins of the level, by record index, are collected
+        self.coins_collected = None
+
+        # Tile grids of the coins left and of the hazards, and the walls
+        # the physics engine sweeps against
+        self.coin_index = None
+        self.death_index = None
+        self.walls = None
+
+        # State right after setup, restored to restart the level
+        self.initial_state = None
+
+        # Currently held input bits and whether jump has to be released first
+        self.keys = 0
+        self.jump_needs_reset = False
 
         # Keep track of the score
         self.score = 0
@@ -453,47 +669,56 @@ class GameView(arcade.View):
         # Level
         self.level = 1
 
-        # Load sounds
-        self.collect_coin_sound = arcade.load_sound(":resources:sounds/coin1.wav")
-        self.jump_sound = arcade.load_sound(":resources:sounds/jump1.wav")
-        self.game_over = arcade.load_sound(":resources:sounds/gameover1.wav")
+        # Number of steps taken since setup
+        self.tick = 0
 
-        self.background_color = arcade.csscolor.CORNFLOWER_BLUE
+        # Set once the player died or reached the end of the map
+        self.game_over = False
+        self.level_complete = False
 
-    def setup(self):
-        """Set up the game here. Call this function to restart the game."""
+        # Events produced by the last step, the coins it picked up by
+        # record index and where the player died, for the effects
+        self.events = []
+        self.coins_picked = []
+        self.death_position = None
 
-        # Set up the Cameras
-        viewport = (0, 0, SCREEN_WIDTH, SCREEN_HEIGHT)
-        self.camera = arcade.SimpleCamera(viewport=viewport)
-        self.gui_camera = arcade.SimpleCamera(viewport=viewport)
+        # Background color from the map, if it has one
+        self.background_color = None
 
-        # Name of map file to load
-        # map_name = f"/data/map{self.level}.json"
-        map_name = f"data/map1.json"
+    def setup(self):
+        """Set up the level. Call this function to restart the game."""
 
         # Layer specific options are defined based on Layer names in a dictionary
-        # Doing this will make the SpriteList for the platforms layer
-        # use spatial hashing for detection.
+        # Doing this will make the SpriteList for the moving platforms layer
+        # use spatial hashing for detection, so collisions never need the GPU.
+        # Platforms, coins and hazards are looked up in their tile grid instead.
         layer_options = {
-            LAYER_NAME_PLATFORMS: {
-                "use_spatial_hash": True,
-            },
             LAYER_NAME_MOVING_PLATFORMS: {
-                "use_spatial_hash": False,
-            },
-            LAYER_NAME_COINS: {
                 "use_spatial_hash": True,
-                "scaling": COIN_SCALING
-            }
+            },
         }
 
-        # Read in the tiled map
-        self.tile_map = arcade.load_tilemap(map_name, TILE_SCALING, layer_options)
+        # Read in the compiled level, compiling the tiled map if needed
+        self.level_data = self.levels.load_current()
+
+        # Initialize Scene with our level, this will add all layers
+        # as SpriteLists in the scene in the proper order. Streamed layers
+        # start empty and are filled around the camera.
+        self.scene = level_cache.build_scene(self.level_data, layer_options, STREAMED_LAYERS)
 
-        # Initialize Scene with our TileMap, this will automatically add all layers
-        # from the map as SpriteLists in the scene in the proper order.
-        self.scene = arcade.Scene.from_tilemap(self.tile_map)
+        self.coins_collected = np.zeros(len(self.level_data.sprites(LAYER_NAME_COINS)), dtype=bool)
+        skip = {LAYER_NAME_COINS: self.coins_collected.__getitem__}
+        for name in DECORATION_LAYERS:
+            if name in self.level_data.layer_names:
+                static = self.level_data.sprites(name)["animation"] < 0
+                skip[name] = static.__getitem__
+        self.streamer = LevelStreamer(self.level_data, self.scene, STREAMED_LAYERS, skip=skip)
+        self.tile_animator = LayerAnimator(self.level_data, self.streamer, ANIMATED_LAYERS)
+
+        # Coins and hazards are found by looking up the cells around the player
+        self.coin_index = TileIndex(self.level_data, LAYER_NAME_COINS)
+        self.death_index = TileIndex(self.level_data, LAYER_NAME_DEATH)
+        self.walls = TileWalls(TileIndex(self.level_data, LAYER_NAME_PLATFORMS))
 
         # Keep track of the score
         if self.reset_score:
@@ -501,6 +726,15 @@ class GameView(arcade.View):
 
         self.reset_score = True
 
+        self.keys = 0
+        self.jump_needs_reset = False
+        self.tick = 0
+        self.game_over = False
+        self.level_complete = False
+        self.events = []
+        self.coins_picked = []
+        self.death_position = None
+
         # Set up the player, specifically placing it at these coordinates.
         self.player_sprite = PlayerCharacter()
         self.player_sprite.center_x = PLAYER_START_X
@@ -508,258 +742,853 @@ class GameView(arcade.View):
         self.scene.add_sprite(LAYER_NAME_PLAYER, self.player_sprite)
 
         # Calculate the ending point for the game
-        self.end_of_map = END_OF_MAP
+        self.end_of_map = self.level_data.pixel_width - END_OF_MAP_MARGIN
 
         # -- Enemies
+        self.enemies = EnemySwarm()
+        self.scene.add_sprite_list(LAYER_NAME_ENEMIES)
 
-        enemies_layer = self.tile_map.object_lists[LAYER_NAME_ENEMIES]
+        for spawn in self.level_data.enemy_spawns:
 
-        for my_object in enemies_layer:
+            enemy = ENEMY_TYPES[spawn["type"]]()
 
-            cartesian = self.tile_map.get_cartesian(
+            enemy.center_x = float(spawn["center_x"])
+            enemy.center_y = float(spawn["center_y"])
 
-                my_object.shape[0], my_object.shape[1]
+            if not math.isnan(spawn["boundary_left"]):
+                enemy.boundary_left = float(spawn["boundary_left"])
 
-            )
+            if not math.isnan(spawn["boundary_right"]):
+                enemy.boundary_right = float(spawn["boundary_right"])
 
-            enemy_type = my_object.properties["type"]
+            if not math.isnan(spawn["change_x"]):
+                enemy.change_x = float(spawn["change_x"])
 
-            if enemy_type == "bat":
-                enemy = BatEnemy()
+            self.scene.add_sprite(LAYER_NAME_ENEMIES, enemy)
+            self.enemies.add_sprite(enemy)
 
-            enemy.center_x = math.floor(
+        # One field shared by every chasing enemy, over the same tiles the
+        # player collides with
+        self.flow_field = FlowField.from_index(self.walls.index) if len(self.enemies.chasers) else None
 
-                cartesian[0] * TILE_SCALING * self.tile_map.tile_width
+        self.moving_platforms = MovingPlatforms(self.scene[LAYER_NAME_MOVING_PLATFORMS])
 
-            )
+        # --- Other stuff
+        self.background_color = self.level_data.background_color
 
-            enemy.center_y = math.floor(
+        # Create the 'physics engine', sweeping the player against the
+        # platform tiles and the awake moving platforms
+        self.physics_engine = PlatformerPhysics(
+            self.player_sprite, self.walls, gravity_constant=GRAVITY,
+            platforms=[self.moving_platforms.awake], step_height=PLAYER_STEP_HEIGHT
+        )
+
+        self.update_streaming()
 
-                (cartesian[1] + 1) * (self.tile_map.tile_height * TILE_SCALING)
+        # Remember the fresh level so restarting does not rebuild it
+        self.initial_state = self.snapshot()
 
-            )
+        # Get the next level ready while this one is played
+        self.levels.prefetch()
 
-            if "boundary_left" in my_object.properties:
-                enemy.boundary_left = my_object.properties["boundary_left"]
+    def next_level(self):
+        """Switch to the next level, which was prepared in the background."""
+        self.levels.advance()
+        self.setup()
 
-            if "boundary_right" in my_object.properties:
-                enemy.boundary_right = my_object.properties["boundary_right"]
+    def camera_position(self, viewport_width=SCREEN_WIDTH, viewport_height=SCREEN_HEIGHT):
+        """Lower left corner of a camera centered on the player, kept inside the map."""
+        screen_center_x = self.player_sprite.center_x - (viewport_width / 2)
+        screen_center_y = self.player_sprite.center_y - (viewport_height / 2)
+        if screen_center_x < 0:
+            screen_center_x = 0
+        if screen_center_y < 0:
+            screen_center_y = 0
+        return screen_center_x, screen_center_y
+
+    def update_streaming(self):
+        """Make sure the chunks around the camera are loaded."""
+        left, _ = self.camera_position()
+        self.streamer.update(left, left + SCREEN_WIDTH)
+
+    def activate(self):
+        """Wake the enemies and moving platforms near the camera and put the others to sleep."""
+        left, _ = self.camera_position()
+        left, right = activation_region(left, left + SCREEN_WIDTH, self.activation_margin)
+        self.enemies.activate(left, right)
+        self.moving_platforms.activate(left, right)
+
+    def snapshot(self):
+        """Capture the current state of the level."""
+        return SimulationSnapshot(self)
+
+    def checksum(self):
+        """CRC32 of the state the rest of the game depends on, to catch replays that diverge."""
+
+        player = self.player_sprite
+        checksum = zlib.crc32(struct.pack("<4d5i?", player.center_x, player.center_y,
+                                          player.change_x, player.change_y, self.score, self.level,
+                                          self.levels.index, self.tick, self.keys, self.jump_needs_reset))
+        for array in self.enemies.get_state():
+            checksum = zlib.crc32(array.tobytes(), checksum)
+        for center_x, center_y, _, _ in self.moving_platforms.get_state():
+            checksum = zlib.crc32(struct.pack("<2d", center_x, center_y), checksum)
+        return zlib.crc32(self.coins_collected.tobytes(), checksum)
+
+    def restore(self, snapshot):
+        """Put the level back into a captured state, in place."""
+
+        player = self.player_sprite
+        (player.center_x, player.center_y, player.change_x, player.change_y,
+         player.character_face_direction, player.animator.state, player.animator.time,
+         player.texture) = snapshot.player
+
+        self.enemies.set_state(snapshot.enemies)
+
+        self.moving_platforms.set_state(snapshot.moving_platforms)
+
+        # Coins in the loaded chunks are materialized again from the bitset
+        collected = np.unpackbits(snapshot.coins_collected, count=len(self.coins_collected)).astype(bool)
+        if (collected != self.coins_collected).any():
+            self.coins_collected[:] = collected
+            self.coin_index.restore(~collected)
+            self.streamer.reload(LAYER_NAME_COINS)
+
+        self.score = snapshot.score
+        self.keys = snapshot.keys
+        self.jump_needs_reset = snapshot.jump_needs_reset
+        self.tick = snapshot.tick
+        self.game_over = snapshot.game_over
+        self.level_complete = snapshot.level_complete
+        self.events = []
+        self.coins_picked = []
+        self.death_position = None
+
+        self.update_streaming()
+
+    def restart(self):
+        """Go back to the start of the level."""
+        self.restore(self.initial_state)
 
-            if "change_x" in my_object.properties:
-                enemy.change_x = my_object.properties["change_x"]
+    def process_keychange(self):
+        """
+        Called when the held keys change.
+        """
 
-            self.scene.add_sprite(LAYER_NAME_ENEMIES, enemy)
+        up_pressed = self.keys & INPUT_UP
+        down_pressed = self.keys & INPUT_DOWN
+        left_pressed = self.keys & INPUT_LEFT
+        right_pressed = self.keys & INPUT_RIGHT
 
-        # --- Other stuff
-        # Set the background color
-        if self.tile_map.background_color:
-            self.background_color = self.tile_map.background_color
-
-        # Create the 'physics engine'
-        self.physics_engine = arcade.PhysicsEnginePlatformer(
-            self.player_sprite, gravity_constant=GRAVITY,
-            walls=self.scene["Platforms"],
-            platforms=self.scene[LAYER_NAME_MOVING_PLATFORMS]
-        )
+        # Process up/down
+        if up_pressed and not down_pressed:
 
-    def on_draw(self):
-        """Render the screen."""
+            if self.physics_engine.can_jump(y_distance=10) and not self.jump_needs_reset:
+                self.player_sprite.change_y = PLAYER_JUMP_SPEED
+                self.jump_needs_reset = True
+                self.events.append(EVENT_JUMP)
 
-        # Clear the screen to the background color
-        self.clear()
+        # Process left/right
+        if right_pressed and not left_pressed:
+            self.player_sprite.change_x = PLAYER_MOVEMENT_SPEED
 
-        # Activate the game camera
-        self.camera.use()
-
-        # Draw our Scene
-        self.scene.draw()
-
-        # Activate the GUI camera before drawing GUI elements
-        self.gui_camera.use()
-
-        # Draw our score on the screen, scrolling it with the viewport
-        score_x = 10
-        score_y = 10
-        default_font_size = 13
-        score_text = arcade.Text(
-            f"Score: {self.score}",
-            score_x,
-            score_y,
-            arcade.color.BLACK,
-            default_font_size,
-            font_name="Kenney Future",
-        )
+        elif left_pressed and not right_pressed:
+            self.player_sprite.change_x = -PLAYER_MOVEMENT_SPEED
 
-        score_text.draw()
+        else:
+            self.player_sprite.change_x = 0
 
-    def process_keychange(self):
+    def set_keys(self, keys):
+        """Apply a new set of held input bits."""
+
+        if keys == self.keys:
+            return
+
+        # Releasing up allows the next jump
+        if self.keys & INPUT_UP and not keys & INPUT_UP:
+            self.jump_needs_reset = False
+
+        self.keys = keys
+        self.process_keychange()
+
+    def kill_player(self):
+        """Put the player back at the start and end the run."""
+
+        self.death_position = self.player_sprite.position
+        self.player_sprite.change_x = 0
+        self.player_sprite.change_y = 0
+        self.player_sprite.center_x = PLAYER_START_X
+        self.player_sprite.center_y = PLAYER_START_Y
+        self.game_over = True
+        self.events.append(EVENT_DEATH)
+
+    def touches_enemy(self):
+        """Check the player against the enemies near its hit box."""
+
+        player = self.player_sprite
+        nearby = self.enemies.rows_in_box(player.left, player.right,
+                                          player.bottom, player.top).tolist()
+        if not nearby:
+            return False
+
+        # Only the few enemies overlapping our bounding box need an exact test
+        self.enemies.sync_rows(nearby)
+        for i in nearby:
+            enemy = self.enemies.sprites[i]
+            if enemy is None or arcade.check_for_collision(player, enemy):
+                return True
+        return False
+
+    def sync_view(self, left, right, bottom, top, delta_time=SIMULATION_DELTA):
+        """Bring the sprites inside the given viewport up to date for drawing."""
+
+        for enemy in self.enemies.sync_sprites(left, right, bottom, top):
+            enemy.update_animation(delta_time)
+
+        self.tile_animator.update(left, right, delta_time)
 
+    def step(self, keys=None, delta_time=SIMULATION_DELTA):
         """
+        Advance the game by one fixed step.
 
-        Called when we change a key up/down, or we move on/off a ladder.
+        :param keys: Held input bits (INPUT_*), or None to keep the current ones.
+        :param delta_time: Step length handed to the animations.
+        :returns: List of EVENT_* strings produced during this step.
+        """
+
+        self.events = []
+        self.coins_picked = []
+        self.death_position = None
+
+        if keys is not None:
+            self.set_keys(keys)
+
+        # Update the player's animation, enemies and tiles are animated by
+        # sync_view() only when on screen
+        with profiler.phase("animation"):
+            self.player_sprite.update_animation(delta_time)
+
+        # Only enemies and moving platforms near the camera move
+        with profiler.phase("activation"):
+            self.activate()
+
+        with profiler.phase("moving_platforms"):
+            self.moving_platforms.update()
+
+        # Point the chasing enemies towards the player
+        if self.flow_field is not None:
+            with profiler.phase("pathfinding"):
+                player = self.player_sprite
+                self.flow_field.update(player.center_x, player.center_y)
+                self.enemies.chase(self.flow_field, player.center_x, player.center_y)
+
+        # Move the awake enemies and reverse the ones that hit a boundary
+        with profiler.phase("enemies"):
+            self.enemies.update()
+
+        # Move the player with the physics engine
+        with profiler.phase("physics"):
+            self.physics_engine.update()
 
+        # Load the chunks the camera is moving into before colliding with them
+        with profiler.phase("streaming"):
+            self.update_streaming()
+
+        # See if we hit any coins
+        with profiler.phase("coins"):
+            coin_hit_list = self.coin_index.collisions(self.player_sprite)
+
+            # Loop through each coin we hit (if any) and remove it
+            for index in coin_hit_list:
+                # Remove the coin
+                self.coin_index.remove(index)
+                self.coins_collected[index] = True
+                self.streamer.discard(LAYER_NAME_COINS, index)
+                self.events.append(EVENT_COIN)
+                self.coins_picked.append(index)
+                # Add one to the score
+                self.score += 1
+
+        with profiler.phase("hazards"):
+            # Did the player fall off the map?
+            if self.player_sprite.center_y < -100:
+                self.kill_player()
+
+            # Did the player touch something they should not?
+            elif self.touches_enemy() or self.death_index.collisions(self.player_sprite):
+                self.kill_player()
+
+        # See if the user got to the end of the level (5000 is the actual end for player_sprite.center_x)
+        if self.player_sprite.center_x >= self.end_of_map and not self.level_complete:
+            # Advance to the next level
+            self.level += 1
+            self.level_complete = True
+            self.events.append(EVENT_LEVEL_COMPLETE)
+
+            # Make sure to keep the score from this level when setting up the next level
+            self.reset_score = False
+
+        self.tick += 1
+
+        return self.events
+
+
+class GameView(arcade.View):
+    """
+    Main application class.
+
+    Renders a GameSimulation and turns its events into sounds, particles and view changes.
+    """
+
+    def __init__(self, recording=None, replay=None, sounds=SOUND_EFFECTS):
+        """
+        :param recording: InputRecording every step's keys are added to.
+        :param replay: ReplayPlayer to take the keys from instead of the keyboard.
+        :param sounds: Sound effects by event, file names or loaded sounds.
         """
 
-        # Process up/down
+        # Call the parent class and set up the window
+        super().__init__()
 
-        if self.up_pressed and not self.down_pressed:
+        # Track the current state of what key is pressed
+        self.keys = 0
 
-            if self.physics_engine.can_jump(y_distance=10) and not self.jump_needs_reset:
-                self.player_sprite.change_y = PLAYER_JUMP_SPEED
-                self.jump_needs_reset = True
-                arcade.play_sound(self.jump_sound)
+        # Inputs being recorded or played back
+        self.recording = recording
+        self.replay = replay
 
-        # Process left/right
+        # The game itself
+        self.simulation = GameSimulation(replay.recording.maps if replay else LEVEL_MAPS)
 
-        if self.right_pressed and not self.left_pressed:
-            self.player_sprite.change_x = PLAYER_MOVEMENT_SPEED
+        # Steps due every frame, and where the moving sprites were before
+        # the last one, to draw them in between
+        self.timestep = FixedTimestep(SIMULATION_RATE)
+        self.interpolator = SpriteInterpolator()
 
-        elif self.left_pressed and not self.right_pressed:
-            self.player_sprite.change_x = -PLAYER_MOVEMENT_SPEED
+        # A Camera that can be used for scrolling the screen
+        self.camera = None
 
-        else:
+        # A Camera that can be used to draw GUI elements
+        self.gui_camera = None
 
-            self.player_sprite.change_x = 0
+        # Draws the static layers from baked chunk textures
+        self.renderer = None
+
+        # Names of the scene's sprite lists in draw order
+        self.draw_order = []
+
+        # Score text, only laid out again when the score changes
+        self.hud = ScoreDisplay()
+
+        # Recent frame times, and the pending (swap, wait) times of a level transition
+        self.frame_times = collections.deque(maxlen=FRAME_HISTORY)
+        self.transition = None
+
+        # Per-phase frame timings, shown while the profiler is on (F3)
+        self.profiler_overlay = ProfilerOverlay(profiler)
+
+        # Load sounds, played from a fixed pool of voices
+        self.mixer = Mixer(sounds)
+
+        # Coin sparkles, death spirits and fire embers, and where on the
+        # level embers rise from, sorted by x
+        self.effects = ParticleEffects(PARTICLE_KINDS)
+        self.fire_x = None
+        self.fire_y = None
+
+        # Seconds of death effect left before the game over screen, None
+        # while playing
+        self.dying = None
+
+        # Game over screen, built on the first death and shown again on the
+        # next ones so its text is only laid out once
+        self.game_over_view = None
+
+        self.background_color = arcade.csscolor.CORNFLOWER_BLUE
+
+    @property
+    def scene(self):
+        return self.simulation.scene
+
+    @property
+    def player_sprite(self):
+        return self.simulation.player_sprite
+
+    @property
+    def score(self):
+        return self.simulation.score
+
+    def setup(self):
+        """Set up the game here. Call this function to restart the game."""
+
+        # Set up the Cameras
+        viewport = (0, 0, SCREEN_WIDTH, SCREEN_HEIGHT)
+        self.camera = arcade.SimpleCamera(viewport=viewport)
+        self.gui_camera = arcade.SimpleCamera(viewport=viewport)
+
+        with profiler.phase("setup"):
+            self.simulation.setup()
+            self.setup_level()
+
+    def warm_up(self):
+        """Generator baking the chunks the first frame shows, one per step, see loading.AssetLoader."""
+        left, _ = self.camera.position
+        yield from self.renderer.bake_steps(left, left + self.camera.viewport_width)
+
+    def setup_level(self):
+        """Prepare drawing the level the simulation has just set up."""
+
+        level_data = self.simulation.level_data
+        self.renderer = StaticLayerRenderer(level_data, BAKED_LAYERS)
+        self.draw_order = [layer["name"] for layer in level_data.layers if layer["sprites"] is not None]
+        self.draw_order += [LAYER_NAME_PLAYER, LAYER_NAME_ENEMIES]
+
+        # The Death layer is the fire
+        fire = np.sort(level_data.sprites(LAYER_NAME_DEATH)[["center_x", "center_y"]], order="center_x")
+        self.fire_x = fire["center_x"].astype(np.float32)
+        self.fire_y = fire["center_y"].astype(np.float32)
+
+        # Set the background color
+        if self.simulation.background_color:
+            self.background_color = self.simulation.background_color
+
+    def next_level(self):
+        """Swap in the next level; the hitch is reported on the following frame."""
+
+        start = time.perf_counter()
+        with profiler.phase("setup"):
+            self.simulation.next_level()
+            self.setup_level()
+        self.keys = 0
+        self.interpolator.clear()
+        self.effects.clear()
+        self.timestep.reset()
+        self.center_camera_to_player()
+        self.transition = (time.perf_counter() - start, self.simulation.levels.last_wait)
+
+    def report_transition(self, delta_time):
+        """Print how long the frame of a level transition took compared to the ones before it."""
+
+        swap, wait = self.transition
+        self.transition = None
+        typical = statistics.median(self.frame_times) if self.frame_times else delta_time
+        print(f"Level {self.simulation.level} ({self.simulation.levels.map_name}): "
+              f"transition frame {delta_time * 1000:.1f} ms vs {typical * 1000:.1f} ms typical "
+              f"(swap {swap * 1000:.1f} ms, {wait * 1000:.1f} ms of it waiting for preloading)")
+
+    def restart(self):
+        """Restart from the start of the level, without reloading anything."""
+
+        self.simulation.restart()
+        self.keys = 0
+        self.interpolator.clear()
+        self.dying = None
+        self.player_sprite.visible = True
+        self.center_camera_to_player()
+
+    def on_show_view(self):
+        # Disable mouse
+        self.window.set_mouse_visible(False)
+
+    def on_draw(self):
+        """Render the screen."""
+
+        with profiler.phase("draw"):
+            # Clear the screen to the background color
+            self.clear()
+
+            # Moving sprites and the camera are drawn between the last two
+            # steps; the camera stays where the player died while dying
+            with self.interpolator.blend(self.interpolated_sprites(), self.timestep.alpha):
+                if self.dying is None:
+                    self.center_camera_to_player()
+
+                # Activate the game camera
+                self.camera.use()
+
+                # Draw our Scene, only the chunks of the static layers that are on screen
+                left, _ = self.camera.position
+                self.renderer.draw(self.scene, self.draw_order, left, left + self.camera.viewport_width)
+
+            # Particles over everything, a draw call per kind
+            self.effects.draw(self.timestep.alpha)
+
+            # Activate the GUI camera before drawing GUI elements
+            self.gui_camera.use()
+
+            # Draw our score on the screen, scrolling it with the viewport
+            self.hud.set_score(self.score)
+            self.hud.draw()
+
+        if profiler.enabled:
+            self.profiler_overlay.draw()
 
     def on_key_press(self, key, modifiers):
         """Called whenever a key is pressed."""
 
         if key == arcade.key.UP or key == arcade.key.W:
-            self.up_pressed = True
+            self.keys |= INPUT_UP
 
         elif key == arcade.key.DOWN or key == arcade.key.S:
-            self.down_pressed = True
+            self.keys |= INPUT_DOWN
 
         elif key == arcade.key.LEFT or key == arcade.key.A:
-            self.left_pressed = True
+            self.keys |= INPUT_LEFT
 
         elif key == arcade.key.RIGHT or key == arcade.key.D:
-            self.right_pressed = True
+            self.keys |= INPUT_RIGHT
+
+        elif key == arcade.key.F3:
+            profiler.enable(not profiler.enabled)
+
+        elif key == arcade.key.F4:
+            export_profile()
+            print(self.mixer.report())
+
         elif key == arcade.key.ESCAPE or key == arcade.key.Q:
             arcade.exit()
 
-        self.process_keychange()
-
     def on_key_release(self, key, modifiers):
         """Called when the user releases a key."""
 
         if key == arcade.key.UP or key == arcade.key.W:
-            self.up_pressed = False
-            self.jump_needs_reset = False
+            self.keys &= ~INPUT_UP
 
         elif key == arcade.key.DOWN or key == arcade.key.S:
-            self.down_pressed = False
+            self.keys &= ~INPUT_DOWN
 
         elif key == arcade.key.LEFT or key == arcade.key.A:
-            self.left_pressed = False
+            self.keys &= ~INPUT_LEFT
 
         elif key == arcade.key.RIGHT or key == arcade.key.D:
-            self.right_pressed = False
-
-        self.process_keychange()
+            self.keys &= ~INPUT_RIGHT
 
     def center_camera_to_player(self):
-        screen_center_x = self.player_sprite.center_x - (self.camera.viewport_width / 2)
-        screen_center_y = self.player_sprite.center_y - (self.camera.viewport_height / 2)
-        if screen_center_x < 0:
-            screen_center_x = 0
-        if screen_center_y < 0:
-            screen_center_y = 0
-        player_centered = screen_center_x, screen_center_y
+        player_centered = self.simulation.camera_position(self.camera.viewport_width,
+                                                          self.camera.viewport_height)
         self.camera.move_to(player_centered)
 
+    def interpolated_sprites(self):
+        """Sprites moved by the steps: the player, the awake moving platforms and the enemies on screen."""
+        enemies = self.simulation.enemies
+        on_screen = [enemies.sprites[i] for i in enemies.synced.tolist() if enemies.sprites[i] is not None]
+        return [self.player_sprite, *self.simulation.moving_platforms.awake, *on_screen]
+
     def on_update(self, delta_time):
-        """Movement and game logic"""
+        """Run the simulation steps due since the last frame, then follow the player"""
 
-        # Update animations
-        self.scene.update_animation(delta_time,
-                                    [LAYER_NAME_COINS, LAYER_NAME_STATUES, LAYER_NAME_PLAYER, LAYER_NAME_DEATH,
-                                     LAYER_NAME_ENEMIES])
+        profiler.next_frame()
+        if self.transition is not None:
+            self.report_transition(delta_time)
+        self.frame_times.append(delta_time)
 
-        if self.physics_engine.can_jump():
-            self.player_sprite.can_jump = False
+        steps = self.timestep.advance(delta_time)
+        if self.dying is not None:
+            self.play_death(steps, delta_time)
+            return
 
-        else:
-            self.player_sprite.can_jump = True
+        carry_on = True
+        for step in range(steps):
+            if step == steps - 1:
+                # Enemy sprites are only synced once a frame, so the ones on
+                # screen are brought up to date before their position is taken
+                enemies = self.simulation.enemies
+                enemies.sync_rows(enemies.synced.tolist())
+                self.interpolator.capture(self.interpolated_sprites())
+            if not self.step():
+                carry_on = False
+                break
+
+        # Sounds asked for by any of the frame's steps start together, the
+        # same sound merged into one
+        self.mixer.update()
+        if not carry_on:
+            return
 
-        self.scene.update([LAYER_NAME_MOVING_PLATFORMS, LAYER_NAME_ENEMIES])
+        # Position the camera
+        with profiler.phase("camera"):
+            self.center_camera_to_player()
+
+        left, bottom = self.camera.goal_position
+        with profiler.phase("sync_view"):
+            self.simulation.sync_view(left, left + self.camera.viewport_width,
+                                      bottom, bottom + self.camera.viewport_height,
+                                      delta_time)
+
+    def play_effects(self):
+        """Spawn the particles for the last step: coin sparkles, death spirits and fire."""
+
+        simulation = self.simulation
+        effects = self.effects
+
+        coins = simulation.level_data.sprites(LAYER_NAME_COINS)
+        for index in simulation.coins_picked:
+            effects["sparkle"].spawn(COIN_SPARKLES, coins["center_x"][index], coins["center_y"][index],
+                                     speed=(2, 5), angle=(20, 160), life=(25, 40), scale=(0.35, 0.6))
+
+        if simulation.death_position is not None:
+            # Players falling off the map die below the screen
+            x, y = simulation.death_position
+            y = max(y, self.camera.goal_position[1])
+            effects["spirit"].spawn(1, x, y, speed=(0.5, 0.5), angle=(90, 90), life=(80, 80), scale=(2, 2))
+            effects["spirit"].spawn(DEATH_SPIRITS, x, y, speed=(1, 3), life=(40, 70), scale=(0.4, 0.8),
+                                    spread=(16, 24))
+
+        self.emit_fire()
+
+    def emit_fire(self):
+        """Spawn an ember over every fire tile on screen, or about to be."""
+
+        left, _ = self.camera.goal_position
+        first, last = np.searchsorted(self.fire_x, (left - SCREEN_WIDTH / 2, left + SCREEN_WIDTH * 1.5))
+        if first < last:
+            self.effects["ember"].spawn(last - first, self.fire_x[first:last], self.fire_y[first:last],
+                                        speed=(0.5, 1.5), angle=(70, 110), life=(40, 70),
+                                        scale=(0.25, 0.45), spread=(16, 12))
+
+    def play_death(self, steps, delta_time):
+        """Let the death effect play for the steps due, then show the game over screen."""
+
+        with profiler.phase("particles"):
+            for _ in range(steps):
+                self.emit_fire()
+                self.effects.update()
+
+        self.dying -= delta_time
+        if self.dying <= 0:
+            with profiler.phase("view_switch"):
+                if self.game_over_view is None:
+                    self.game_over_view = GameOverView(self)
+                self.window.show_view(self.game_over_view)
+
+    def step(self):
+        """
+        Advance the simulation by one step and react to its events.
 
-        # See if the enemy hit a boundary and needs to reverse direction.
+        :returns: False when the frame should stop here: the view was
+            left, or the level changed.
+        """
 
-        for enemy in self.scene[LAYER_NAME_ENEMIES]:
+        if self.replay is not None:
+            if self.replay.done:
+                print(f"Replayed {self.replay.tick} ticks, {self.replay.verified} checksums matched")
+                arcade.exit()
+                return False
+            self.keys = self.replay.next_keys()
 
-            if (
-                    enemy.boundary_right
-                    and enemy.right > enemy.boundary_right
-                    and enemy.change_x > 0
-            ):
-                enemy.change_x *= -1
+        with profiler.phase("step"):
+            events = self.simulation.step(self.keys)
 
-            if (
-                    enemy.boundary_left
-                    and enemy.left < enemy.boundary_left
-                    and enemy.change_x < 0
-            ):
-                enemy.change_x *= -1
+        if self.recording is not None:
+            self.recording.record(self.keys, self.simulation)
+        if self.replay is not None:
+            self.replay.verify(self.simulation)
 
-        # Move the player with the physics engine
-        self.physics_engine.update()
+        with profiler.phase("particles"):
+            # Spawned before the time moves on, so they are born at the start
+            # of the step and already move in the frame drawing it
+            self.play_effects()
+            self.effects.update()
 
-        # See if we hit any coins
-        coin_hit_list = arcade.check_for_collision_with_list(
-            self.player_sprite, self.scene[LAYER_NAME_COINS]
-        )
+        # Started by on_update() once the frame's steps are done
+        for event in events:
+            if event in SOUND_EFFECTS:
+                self.mixer.play(event)
 
-        # Loop through each coin we hit (if any) and remove it
-        for coin in coin_hit_list:
-            # Remove the coin
-            coin.remove_from_sprite_lists()
-            # Play a sound
-            arcade.play_sound(self.collect_coin_sound)
-            # Add one to the score
-            self.score += 1
-
-        # Did the player fall off the map?
-        if self.player_sprite.center_y < -100:
-            self.player_sprite.center_x = PLAYER_START_X
-            self.player_sprite.center_y = PLAYER_START_Y
-            arcade.play_sound(self.game_over)
-            game_view = GameOverView()
-            self.window.show_view(game_view)
-
-        # Did the player touch something they should not?
-        if arcade.check_for_collision_with_lists(
-                self.player_sprite,
-                [
-                    self.scene[LAYER_NAME_ENEMIES],
-                    self.scene[LAYER_NAME_DEATH]
-                ]):
-            self.player_sprite.change_x = 0
-            self.player_sprite.change_y = 0
-            self.player_sprite.center_x = PLAYER_START_X
-            self.player_sprite.center_y = PLAYER_START_Y
-            arcade.play_sound(self.game_over)
-            game_view = GameOverView()
-            self.window.show_view(game_view)
+        if EVENT_DEATH in events and self.replay is not None:
+            # The recorded player continued from the game over screen right away
+            self.restart()
+            return True
 
-        # See if the user got to the end of the level (5000 is the actual end for player_sprite.center_x)
-        if self.player_sprite.center_x >= self.end_of_map:
-            # Advance to the next level
-            self.level += 1
+        if EVENT_DEATH in events:
+            # The player is already back at the start; hide them and hold
+            # everything still while the death effect plays
+            self.dying = DEATH_EFFECT_TIME
+            self.player_sprite.visible = False
+            self.interpolator.clear()
+            return False
 
-            # Make sure to keep the score from this level when setting up the next level
-            self.reset_score = False
+        if EVENT_LEVEL_COMPLETE in events:
+            self.next_level()
+            return False
 
-        # Position the camera
-        self.center_camera_to_player()
+        return True
+
+
+def export_profile(prefix=PROFILE_PREFIX):
+    """Write the profiler's buffered frames as CSV and as a Chrome trace."""
+    profiler.export_csv(f"{prefix}.csv")
+    profiler.export_chrome_trace(f"{prefix}.json")
+    print(f"Wrote the last {min(profiler.frame, profiler.capacity)} profiled frames to {prefix}.csv and {prefix}.json")
+
+
+def play_tick(simulation, keys, recording=None, replay=None):
+    """
+    Advance the game by one tick without a window, the way GameView does.
+
+    The player continues right away after dying, and moves on to the next
+    level when they finish one.
+
+    :param recording: InputRecording to add the tick to.
+    :param replay: ReplayPlayer the keys came from, to check the step against.
+    :returns: True if the tick moved on to the next level.
+    """
+    with profiler.phase("step"):
+        simulation.step(keys)
+    if recording is not None:
+        recording.record(keys, simulation)
+    if replay is not None:
+        replay.verify(simulation)
+
+    if simulation.game_over:
+        with profiler.phase("setup"):
+            simulation.restart()
+    elif simulation.level_complete:
+        with profiler.phase("setup"):
+            simulation.next_level()
+        return True
+    else:
+        left, bottom = simulation.camera_position()
+        simulation.sync_view(left, left + SCREEN_WIDTH, bottom, bottom + SCREEN_HEIGHT)
+    return False
+
+
+def prepare_game(recording=None):
+    """Upload steps building the GameView on the first level and sounds loaded in the background."""
+    game_view = GameView(recording=recording, sounds=loader.get(ASSET_SOUNDS))
+    yield
+    game_view.simulation.levels.current = loader.get(ASSET_FIRST_LEVEL)
+    game_view.setup()
+    yield
+    yield from game_view.warm_up()
+    return game_view
+
+
+def start(window, music, recording=None):
+    """Show the menu on a fresh window, the game loading in the background."""
+    window.ctx.atlas_size = ATLAS_SIZE
+    window.show_view(InstructionView(music, recording))
+
+
+# Assets loaded in the background, each once it is first asked for
+loader.add(ASSET_MENU_BACKGROUND, lambda: arcade.load_texture(MENU_BACKGROUND),
+           upload=lambda texture: upload_textures([texture]), lazy=True)
+loader.add(ASSET_GAME_OVER_BACKGROUND, lambda: arcade.load_texture(GAME_OVER_BACKGROUND),
+           upload=lambda texture: upload_textures([texture]), lazy=True)
+loader.add(ASSET_FIRST_LEVEL, lambda: prepare_level(LEVEL_MAPS[0]), upload=upload_level, lazy=True)
+loader.add(ASSET_SOUNDS, lambda: {name: arcade.load_sound(file_name) for name, file_name in SOUND_EFFECTS.items()},
+           lazy=True)
+
+
+def run_headless(ticks, keys=INPUT_RIGHT, recording=None):
+    """
+    Step the game without a window and report how fast it ran.
+
+    Restarts the level whenever the player dies and moves on to the next
+    one whenever they finish it.
+    """
+    simulation = GameSimulation()
+    simulation.setup()
+
+    transitions = []
+    start = time.perf_counter()
+    for _ in range(ticks):
+        profiler.next_frame()
+        transition_start = time.perf_counter()
+        if play_tick(simulation, keys, recording):
+            transitions.append(time.perf_counter() - transition_start)
+    elapsed = time.perf_counter() - start
+
+    print(f"{ticks} ticks in {elapsed:.3f}s ({ticks / elapsed:.0f} ticks/s), score {simulation.score}")
+    if transitions:
+        print(f"{len(transitions)} level transitions, worst {max(transitions) * 1000:.1f} ms "
+              f"(a tick is {SIMULATION_DELTA * 1000:.1f} ms)")
+    if profiler.enabled:
+        for name, (p50, p99) in profiler.percentiles().items():
+            print(f"{name:>16} p50 {p50 * 1000:7.3f} ms  p99 {p99 * 1000:7.3f} ms")
+        export_profile()
+
+
+def run_replay(recording):
+    """Replay a recording without a window as fast as possible, checking every checksum."""
+    simulation = GameSimulation(recording.maps)
+    simulation.setup()
+    replay = ReplayPlayer(recording)
+
+    start = time.perf_counter()
+    while not replay.done:
+        play_tick(simulation, replay.next_keys(), replay=replay)
+    elapsed = time.perf_counter() - start
+
+    print(f"Replayed {replay.tick} ticks in {elapsed:.3f}s ({replay.tick / elapsed:.0f} ticks/s, "
+          f"{replay.tick * SIMULATION_DELTA / elapsed:.0f}x real time), "
+          f"{replay.verified} checksums matched, score {simulation.score}")
 
 
 def main():
     """Main function"""
-    window = arcade.Window(SCREEN_WIDTH, SCREEN_HEIGHT, SCREEN_TITLE)
-    start_view = InstructionView()
-    window.show_view(start_view)
-    arcade.run()
+    parser = argparse.ArgumentParser(description=SCREEN_TITLE)
+    parser.add_argument("--headless", type=int, metavar="TICKS",
+                        help="step the game for TICKS ticks without opening a window")
+    parser.add_argument("--compile-levels", nargs="*", metavar="MAP",
+                        help="compile tiled maps (default: all in data/) into the level cache and exit")
+    parser.add_argument("--pack-assets", action="store_true",
+                        help="pack the character frames and tilesets into the asset pack in data/cache and exit")
+    parser.add_argument("--profile", action="store_true",
+                        help="record per-phase frame timings from the start (F3 toggles them in game)")
+    parser.add_argument("--record", metavar="FILE",
+                        help="record the inputs of the session to FILE, written on exit")
+    parser.add_argument("--replay", metavar="FILE",
+                        help="play back a recording at real time, checking it still plays the same")
+    parser.add_argument("--turbo", action="store_true",
+                        help="with --replay, replay without a window as fast as possible")
+    parser.add_argument("--fps", type=float, default=FRAME_RATE,
+                        help=f"frames drawn per second; the game still steps {SIMULATION_RATE} times a second")
+    args = parser.parse_args()
+
+    profiler.enable(args.profile)
+
+    if args.compile_levels is not None:
+        for map_name in args.compile_levels or sorted(glob.glob("data/map*.json")):
+            level_data = load_level_data(map_name)
+            print(f"{map_name} -> {level_data.file_name}")
+        return
+
+    if args.pack_assets:
+        files = packed_images()
+        manifest = assets.pack_assets(files)
+        print(f"{len(files)} images -> {manifest}")
+        return
+
+    recording = InputRecording(LEVEL_MAPS) if args.record else None
+
+    if args.replay and args.turbo:
+        try:
+            run_replay(InputRecording.load(args.replay))
+        except ReplayDivergence as error:
+            sys.exit(str(error))
+        return
+
+    if args.headless:
+        run_headless(args.headless, recording=recording)
+    else:
+        window = arcade.Window(SCREEN_WIDTH, SCREEN_HEIGHT, SCREEN_TITLE,
+                               update_rate=1 / args.fps, draw_rate=1 / args.fps)
+
+        if args.replay:
+            # Straight into the game, driven by the recording
+            game_view = GameView(replay=ReplayPlayer(InputRecording.load(args.replay)))
+            game_view.setup()
+            window.show_view(game_view)
+        else:
+            # The music outlives every view, so it is owned here
+            music = MusicPlayer(MUSIC_TRACKS)
+            start(window, music, recording)
+        arcade.run()
+
+    if recording is not None:
+        recording.save(args.record)
+        print(f"Recorded {len(recording)} ticks to {args.record}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,132 @@
+"""
+Sound effects mixer.
+
+Every sound effect is decoded into memory once, and plays on one of a
+fixed pool of voices created up front rather than on a new player each
+time. Sounds asked for during a frame start together when update() is
+called: several requests for the same sound merge into one, and a sound
+never holds more than its cap of voices, past which its oldest voice
+starts over. When every voice is busy, the one closest to finishing is
+taken. report() tells how the voices were used.
+"""
+
+import time
+
+import arcade
+import pyglet
+
+# Voices in the pool
+DEFAULT_VOICES = 8
+
+# Voices one sound may hold at once
+DEFAULT_VOICES_PER_SOUND = 3
+
+
+class Voice(pyglet.media.Player):
+    """A player that keeps its source and audio buffers when a sound ends, ready for the next one."""
+
+    def __init__(self):
+        super().__init__()
+
+        # Name of the sound last started, and mixer time at which it finishes
+        self.sound = None
+        self.ends = 0.0
+
+    def on_eos(self):
+        # Rewind and wait, instead of moving on to the next source which
+        # would release the audio player
+        self.pause()
+        self.seek(0.0)
+
+    def start(self, name, source, ends):
+        """Play ``source`` from the start, switching to it if another sound was loaded."""
+        if self.sound == name:
+            self.seek(0.0)
+        else:
+            self.queue(source)
+            if self.sound is not None:
+                self.next_source()
+            self.sound = name
+        self.ends = ends
+        self.play()
+
+
+class Mixer:
+    """Plays sound effects on a fixed pool of voices."""
+
+    def __init__(self, sounds, voices=DEFAULT_VOICES, voices_per_sound=DEFAULT_VOICES_PER_SOUND, volume=1.0):
+        """
+        :param sounds: Dict of sound name to file name, or to a sound
+            already loaded with arcade.load_sound().
+        :param voices: Size of the voice pool.
+        :param voices_per_sound: Most voices a single sound may hold.
+        """
+        # Decoded up front, every voice plays from the same samples
+        self.sounds = {name: arcade.load_sound(sound) if isinstance(sound, str) else sound
+                       for name, sound in sounds.items()}
+        self.durations = {name: sound.get_length() for name, sound in self.sounds.items()}
+
+        self.voices = [Voice() for _ in range(voices)]
+        for voice in self.voices:
+            voice.volume = volume
+        self.voices_per_sound = voices_per_sound
+
+        # Requests since the last update(), by sound
+        self.pending = {}
+
+        # Usage counters, by sound
+        self.requested = dict.fromkeys(self.sounds, 0)
+        self.played = dict.fromkeys(self.sounds, 0)
+        self.merged = dict.fromkeys(self.sounds, 0)
+        self.restarted = dict.fromkeys(self.sounds, 0)
+        self.stolen = dict.fromkeys(self.sounds, 0)
+
+        # Most voices playing at once
+        self.peak_voices = 0
+
+    def play(self, name):
+        """Ask for a sound, started by the next update()."""
+        self.pending[name] = self.pending.get(name, 0) + 1
+
+    def update(self):
+        """Start the sounds asked for since the last call. Call once per frame."""
+        if not self.pending:
+            return
+        now = time.perf_counter()
+        for name, count in self.pending.items():
+            self.requested[name] += count
+            self.merged[name] += count - 1
+            self._start(name, now)
+        self.pending.clear()
+
+        busy = sum(voice.ends > now for voice in self.voices)
+        self.peak_voices = max(self.peak_voices, busy)
+
+    def _start(self, name, now):
+        own = [voice for voice in self.voices if voice.sound == name and voice.ends > now]
+        free = [voice for voice in self.voices if voice.ends <= now]
+        if len(own) >= self.voices_per_sound:
+            voice = min(own, key=lambda voice: voice.ends)
+            self.restarted[name] += 1
+        elif free:
+            # A voice that last played this sound needs no switching
+            voice = min(free, key=lambda voice: voice.sound != name)
+        else:
+            voice = min(self.voices, key=lambda voice: voice.ends)
+            self.stolen[name] += 1
+        voice.start(name, self.sounds[name].source, now + self.durations[name])
+        self.played[name] += 1
+
+    def report(self):
+        """Voice usage so far, as a printable table."""
+        lines = [f"{len(self.voices)} voices, at most {self.peak_voices} playing at once",
+                 f"{'sound':<12} {'requested':>9} {'played':>7} {'merged':>7} {'restarted':>9} {'stolen':>7}"]
+        for name in self.sounds:
+            lines.append(f"{name:<12} {self.requested[name]:>9} {self.played[name]:>7} {self.merged[name]:>7} "
+                         f"{self.restarted[name]:>9} {self.stolen[name]:>7}")
+        return "\n".join(lines)
+
+    def stop(self):
+        """Silence every voice and release its audio player."""
+        for voice in self.voices:
+            voice.delete()
@@ -0,0 +1,115 @@
+"""
+Streaming background music.
+
+Tracks are streamed from disk instead of being decoded up front, so only a
+small buffer of each one is ever resident. The next track of the playlist
+is opened on a background thread and queued behind the current one, so the
+player moves on to it without a gap.
+"""
+
+import random
+import threading
+
+import arcade
+import pyglet
+
+# How often the main thread checks for a finished prefetch, in seconds
+PREFETCH_POLL_INTERVAL = 0.25
+
+
+def open_track(file_name):
+    """Open a track for streaming. Returns a pyglet source."""
+    return arcade.load_sound(file_name, streaming=True).source
+
+
+class MusicPlayer:
+    """Plays a playlist of tracks in a loop, one streaming source at a time."""
+
+    def __init__(self, tracks, shuffle=True, volume=1.0):
+        self.tracks = list(tracks)
+        if shuffle:
+            random.shuffle(self.tracks)
+        self.volume = volume
+
+        # Index into self.tracks of the track playing now
+        self.index = 0
+
+        self.player = None
+
+        # Source opened by the prefetch thread, waiting to be queued
+        self._ready = None
+        self._ready_lock = threading.Lock()
+        self._prefetching = False
+
+        # True while nothing is queued and the next source should start playing
+        self._waiting = True
+
+    @property
+    def current_track(self):
+        return self.tracks[self.index]
+
+    def play(self):
+        """Start (or resume) the music. Returns immediately."""
+        if self.player is not None:
+            self.player.play()
+            return
+
+        self.player = pyglet.media.Player()
+        self.player.volume = self.volume
+        self.player.push_handlers(on_player_next_source=self._on_next_source,
+                                  on_player_eos=self._on_eos)
+
+        # Even the first track is opened in the background, so the caller
+        # can show its first frame straight away
+        self._prefetch(self.index)
+        pyglet.clock.schedule_interval(self._poll, PREFETCH_POLL_INTERVAL)
+
+    def pause(self):
+        if self.player is not None:
+            self.player.pause()
+
+    def stop(self):
+        """Stop playing and release the player."""
+        pyglet.clock.unschedule(self._poll)
+        if self.player is not None:
+            self.player.delete()
+            self.player = None
+
+    def _prefetch(self, index):
+        file_name = self.tracks[index % len(self.tracks)]
+        self._prefetching = True
+
+        def load():
+            source = open_track(file_name)
+            with self._ready_lock:
+                self._ready = source
+
+        threading.Thread(target=load, name="music-prefetch", daemon=True).start()
+
+    def _poll(self, delta_time):
+        """Queue a prefetched source. Runs on the main thread."""
+        with self._ready_lock:
+            source, self._ready = self._ready, None
+        if source is None or self.player is None:
+            return
+
+        self._prefetching = False
+        self.player.queue(source)
+        if self._waiting:
+            # Nothing was playing: start now and get the following track ready
+            self._waiting = False
+            self.player.play()
+            self._prefetch(self.index + 1)
+
+    def _on_next_source(self):
+        """The player moved on to the queued track, so fetch the one after it."""
+        self.index = (self.index + 1) % len(self.tracks)
+        if not self._prefetching:
+            self._prefetch(self.index + 1)
+
+    def _on_eos(self):
+        """The playlist ran dry before the next track was ready."""
+        self.index = (self.index + 1) % len(self.tracks)
+        self._waiting = True
+        if not self._prefetching:
+            self._prefetch(self.index)
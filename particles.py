@@ -0,0 +1,307 @@
+"""
+Pooled, batched particles.
+
+Every kind of particle has a pool: one preallocated NumPy array with a row
+per particle (where and when it was born, how it moves, how long it
+lives), mirrored by a GL buffer and drawn with a single instanced draw
+call. A particle's path is a function of its age, so the vertex shader
+works out where every particle is from its row and the time; moving the
+particles costs nothing on the CPU and only the rows spawned since the
+last frame are uploaded. New particles go into the pool as a ring, over
+the oldest ones once it is full, and dead ones are skipped by the shader,
+so nothing is allocated or compacted while particles come and go.
+
+Time is counted in simulation ticks, and particles are drawn between the
+last two ticks like the sprites (see timestep.py).
+"""
+
+import math
+
+import arcade
+import numpy as np
+from PIL import Image
+
+# Columns of a particle's row, all float32
+X, Y, CHANGE_X, CHANGE_Y, BIRTH, LIFE, SCALE, FRAME = range(8)
+FIELDS = 8
+
+# Draw blending, as in renderer.py, and the additive one for glowing particles
+BLEND = (arcade.gl.SRC_ALPHA, arcade.gl.ONE_MINUS_SRC_ALPHA)
+ADDITIVE_BLEND = (arcade.gl.SRC_ALPHA, arcade.gl.ONE)
+
+VERTEX_SHADER = """
+#version 330
+
+uniform WindowBlock {
+    mat4 projection;
+    mat4 view;
+} window;
+
+uniform float time;
+uniform float gravity;
+uniform float frames;
+uniform float frame_ticks;
+uniform vec2 frame_size;
+uniform float fade;
+
+in vec2 in_corner;
+in vec2 in_position;
+in vec2 in_velocity;
+in float in_birth;
+in float in_life;
+in float in_scale;
+in float in_frame;
+
+out vec2 v_uv;
+out float v_alpha;
+
+void main() {
+    float age = max(time - in_birth, 0.0);
+    v_uv = vec2(0.0);
+    v_alpha = 0.0;
+    if (age >= in_life) {
+        // Dead: every corner outside the screen, nothing is drawn
+        gl_Position = vec4(2.0, 2.0, 2.0, 1.0);
+        return;
+    }
+
+    vec2 position = in_position + in_velocity * age + vec2(0.0, 0.5 * gravity * age * age);
+    vec2 corner = in_corner * frame_size * in_scale;
+    gl_Position = window.projection * window.view * vec4(position + corner, 0.0, 1.0);
+
+    // Looping at frame_ticks per frame, or played once over the particle's life
+    float frame = frame_ticks > 0.0 ? mod(in_frame + floor(age / frame_ticks), frames)
+                                    : floor(age / in_life * frames);
+    v_uv = vec2((frame + in_corner.x + 0.5) / frames, 0.5 - in_corner.y);
+    v_alpha = 1.0 - smoothstep(fade, 1.0, age / in_life);
+}
+"""
+
+FRAGMENT_SHADER = """
+#version 330
+
+uniform sampler2D strip;
+
+in vec2 v_uv;
+in float v_alpha;
+out vec4 f_color;
+
+void main() {
+    vec4 color = texture(strip, v_uv);
+    if (color.a * v_alpha <= 0.0) {
+        discard;
+    }
+    f_color = vec4(color.rgb, color.a * v_alpha);
+}
+"""
+
+
+class ParticlePool:
+    """Particles of one kind, all moved and drawn in one batch."""
+
+    def __init__(self, ctx, program, path, frames, frame_ticks=0, capacity=4096,
+                 gravity=0.0, fade=0.5, additive=False, seed=None):
+        """
+        :param ctx: The window's GL context.
+        :param program: Program drawing the particles, shared by the pools.
+        :param path: Image of the animation frames side by side.
+        :param frames: Number of frames in the image.
+        :param frame_ticks: Ticks per frame of a looping animation, 0 to
+            play the frames once over each particle's life.
+        :param capacity: Most particles alive at once; more reuse the oldest.
+        :param gravity: Vertical acceleration in pixels per tick squared,
+            negative to fall.
+        :param fade: Fraction of its life after which a particle fades out.
+        :param additive: Add the particles' color to the frame, for glows.
+        """
+        self.ctx = ctx
+        self.program = program
+        self.frames = frames
+        self.frame_ticks = frame_ticks
+        self.capacity = capacity
+        self.gravity = gravity
+        self.fade = fade
+        self.blend = ADDITIVE_BLEND if additive else BLEND
+
+        image = Image.open(path).convert("RGBA")
+        self.frame_size = (image.width / frames, image.height)
+        self.texture = ctx.texture(image.size, components=4, data=image.tobytes(),
+                                   filter=(ctx.NEAREST, ctx.NEAREST))
+
+        # One row per particle, and random numbers drawn for a spawn
+        self.data = np.zeros((capacity, FIELDS), dtype=np.float32)
+        self.random = np.zeros((7, capacity), dtype=np.float32)
+        self.rng = np.random.default_rng(seed)
+
+        corners = np.array([-0.5, -0.5, 0.5, -0.5, -0.5, 0.5, 0.5, 0.5], dtype=np.float32)
+        self.buffer = ctx.buffer(reserve=self.data.nbytes, usage="dynamic")
+        self.geometry = ctx.geometry(
+            [arcade.gl.BufferDescription(ctx.buffer(data=corners), "2f", ["in_corner"]),
+             arcade.gl.BufferDescription(self.buffer, "2f 2f 1f 1f 1f 1f",
+                                         ["in_position", "in_velocity", "in_birth", "in_life",
+                                          "in_scale", "in_frame"], instanced=True)],
+            mode=ctx.TRIANGLE_STRIP,
+        )
+
+        # Ticks since the pool was made
+        self.time = 0
+
+        # Next row to spawn into, rows in use, and the tick the last
+        # particle alive dies at
+        self.head = 0
+        self.used = 0
+        self.expires = 0
+
+        # Rows spawned into but not uploaded yet, as [low, high)
+        self.dirty = (0, 0)
+
+    def __len__(self):
+        """Rows in use, an upper bound on the particles alive."""
+        return self.used
+
+    def spawn(self, count, x, y, speed=(0.0, 0.0), angle=(0.0, 360.0), life=(60, 60),
+              scale=(1.0, 1.0), spread=(0.0, 0.0)):
+        """
+        Add particles, born at the current time.
+
+        Spawn the particles of a tick before update() moves the time on, so
+        that they are already moving in the frame drawn after the tick.
+
+        Ranges are (low, high) pairs each particle draws its value from.
+
+        :param count: Number of particles.
+        :param x: X they start at, a number or an array of ``count``.
+        :param y: Y they start at, a number or an array of ``count``.
+        :param speed: Pixels per tick.
+        :param angle: Direction of travel in degrees, 0 to the right.
+        :param life: Ticks until they disappear.
+        :param scale: Size relative to a frame of the image.
+        :param spread: Half the width and height of the box around
+            ``x, y`` they start in.
+        """
+        count = min(count, self.capacity)
+        start = self.head
+        first = min(count, self.capacity - start)
+        self._fill(start, start + first, x, y, speed, angle, life, scale, spread, 0)
+        if first < count:
+            self._fill(0, count - first, x, y, speed, angle, life, scale, spread, first)
+            self.used = self.capacity
+            self.dirty = (0, self.capacity)
+        else:
+            self.used = max(self.used, start + first)
+            low, high = self.dirty
+            self.dirty = (start, start + first) if low == high else (min(low, start), max(high, start + first))
+        self.head = (start + count) % self.capacity
+        self.expires = max(self.expires, self.time + life[1])
+
+    def _fill(self, low, high, x, y, speed, angle, life, scale, spread, offset):
+        """Write rows [low, high), the ``offset``-th particle of a spawn first."""
+        n = high - low
+        rows = self.data[low:high]
+        random = self.random[:, :n]
+        for numbers in random:
+            self.rng.random(dtype=np.float32, out=numbers)
+
+        # Position: the given point, anywhere in the spread box around it
+        if np.ndim(x):
+            rows[:, X] = x[offset:offset + n]
+            rows[:, Y] = y[offset:offset + n]
+        else:
+            rows[:, X] = x
+            rows[:, Y] = y
+        for column, numbers, half in ((X, random[0], spread[0]), (Y, random[1], spread[1])):
+            numbers *= 2 * half
+            numbers -= half
+            rows[:, column] += numbers
+
+        # Velocity from a direction and a speed, worked out in place of
+        # the random numbers they come from
+        direction, magnitude = random[2], random[3]
+        direction *= math.radians(angle[1] - angle[0])
+        direction += math.radians(angle[0])
+        magnitude *= speed[1] - speed[0]
+        magnitude += speed[0]
+        np.cos(direction, out=rows[:, CHANGE_X])
+        rows[:, CHANGE_X] *= magnitude
+        np.sin(direction, out=rows[:, CHANGE_Y])
+        rows[:, CHANGE_Y] *= magnitude
+
+        rows[:, BIRTH] = self.time
+        np.multiply(random[4], life[1] - life[0], out=rows[:, LIFE])
+        rows[:, LIFE] += life[0]
+        np.multiply(random[5], scale[1] - scale[0], out=rows[:, SCALE])
+        rows[:, SCALE] += scale[0]
+        np.multiply(random[6], self.frames, out=rows[:, FRAME])
+        np.floor(rows[:, FRAME], out=rows[:, FRAME])
+
+    def update(self):
+        """Advance one tick, emptying the pool once every particle is dead."""
+        self.time += 1
+        if self.used and self.time >= self.expires:
+            self.clear()
+
+    def clear(self):
+        """Remove every particle."""
+        self.head = 0
+        self.used = 0
+        self.dirty = (0, 0)
+
+    def draw(self, alpha=1.0):
+        """
+        Draw the particles with the current camera.
+
+        :param alpha: How far along the next tick the frame is, see
+            timestep.FixedTimestep.alpha.
+        """
+        if not self.used:
+            return
+
+        low, high = self.dirty
+        if low < high:
+            self.buffer.write(self.data[low:high], offset=low * FIELDS * 4)
+            self.dirty = (0, 0)
+
+        program = self.program
+        program["time"] = self.time - 1 + alpha
+        program["gravity"] = self.gravity
+        program["frames"] = self.frames
+        program["frame_ticks"] = self.frame_ticks
+        program["frame_size"] = self.frame_size
+        program["fade"] = self.fade
+        self.texture.use(0)
+        self.ctx.enable(self.ctx.BLEND)
+        self.ctx.blend_func = self.blend
+        self.geometry.render(program, instances=self.used)
+
+
+class ParticleEffects:
+    """A pool for every kind of particle, updated and drawn together."""
+
+    def __init__(self, kinds, seed=None):
+        """
+        :param kinds: Name of every kind of particle to its ParticlePool
+            arguments after the program: image, frame count, ticks per
+            frame, capacity, gravity, fade and additive blending.
+        """
+        ctx = arcade.get_window().ctx
+        program = ctx.program(vertex_shader=VERTEX_SHADER, fragment_shader=FRAGMENT_SHADER)
+        self.pools = {name: ParticlePool(ctx, program, *args, seed=seed) for name, args in kinds.items()}
+
+    def __getitem__(self, name):
+        return self.pools[name]
+
+    def __len__(self):
+        return sum(len(pool) for pool in self.pools.values())
+
+    def clear(self):
+        """Remove every particle, e.g. when the level changes."""
+        for pool in self.pools.values():
+            pool.clear()
+
+    def update(self):
+        for pool in self.pools.values():
+            pool.update()
+
+    def draw(self, alpha=1.0):
+        for pool in self.pools.values():
+            pool.draw(alpha)
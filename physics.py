@@ -0,0 +1,275 @@
+"""
+Tile-grid platformer physics.
+
+Walls are the tiles of a tile layer, each one solid over the bounding box
+of its hit box, and bodies are axis-aligned boxes. A move is swept one
+axis at a time, vertical first like arcade.PhysicsEnginePlatformer: the
+tiles in the cells the move crosses are looked up in the layer's
+TileIndex, and the body stops flush against the first one in its way.
+For tiles whose hit box is a rectangle this is exact, where the arcade
+engine nudges the sprite a quarter pixel at a time until it no longer
+overlaps a polygon. Whether a body stands on something is a look at the
+few cells right under it.
+
+PlatformerPhysics moves the player sprite and carries it on the moving
+platforms it lands on. Bodies moves any number of boxes under gravity at
+once, with the sweeps of all of them done in NumPy.
+
+Bodies are expected to start clear of the walls; a body already
+overlapping a tile is not pushed out of it.
+"""
+
+import numpy as np
+
+from tile_index import EMPTY
+
+# Overlaps thinner than this are contact, not collision, so a body resting
+# flush against a tile is not caught in it by rounding
+EPSILON = 1e-6
+
+
+class TileWalls:
+    """The tiles of a TileIndex as solid boxes."""
+
+    def __init__(self, index):
+        self.index = index
+
+        # Plain lists are faster than arrays for the few tiles of a single query
+        self._left = index.left.tolist()
+        self._right = index.right.tolist()
+        self._bottom = index.bottom.tolist()
+        self._top = index.top.tolist()
+
+    def sweep(self, low, high, across_low, across_high, move, vertical):
+        """
+        How far a box can move along one axis before it hits a tile.
+
+        :param low: Edge of the box the move goes towards when negative.
+        :param high: Edge of the box the move goes towards when positive.
+        :param across_low: Lower edge of the box across the move.
+        :param across_high: Upper edge of the box across the move.
+        :param vertical: Whether the move is along y.
+        :returns: The move, shortened to stop flush against the first tile in the way.
+        """
+        if move == 0:
+            return 0.0
+        if vertical:
+            candidates = self.index.cells(across_low, across_high, min(low, low + move), max(high, high + move))
+            tile_low, tile_high, across_tile_low, across_tile_high = self._bottom, self._top, self._left, self._right
+        else:
+            candidates = self.index.cells(min(low, low + move), max(high, high + move), across_low, across_high)
+            tile_low, tile_high, across_tile_low, across_tile_high = self._left, self._right, self._bottom, self._top
+
+        for tile in candidates:
+            if across_tile_low[tile] >= across_high - EPSILON or across_tile_high[tile] <= across_low + EPSILON:
+                continue
+            if move > 0:
+                if high - EPSILON <= tile_low[tile] < high + move:
+                    move = max(tile_low[tile] - high, 0.0)
+            elif low + move < tile_high[tile] <= low + EPSILON:
+                move = min(tile_high[tile] - low, 0.0)
+        return move
+
+    def overlaps(self, left, right, bottom, top):
+        """Whether any tile overlaps the box."""
+        for tile in self.index.cells(left, right, bottom, top):
+            if (self._left[tile] < right - EPSILON and self._right[tile] > left + EPSILON
+                    and self._bottom[tile] < top - EPSILON and self._top[tile] > bottom + EPSILON):
+                return True
+        return False
+
+    def window(self, left, right, bottom, top):
+        """
+        Record indices of the tiles covering the cells overlapping each of
+        many boxes, padded with EMPTY.
+
+        :returns: Array shaped (boxes, tiles), as many tiles for every box
+            as the largest box needs. A tile covering several of a box's
+            cells is in its row as many times.
+        """
+        index = self.index
+        height, width = index.grid.shape
+        first_column = index.cell_columns(left)
+        last_column = index.cell_columns(right)
+        first_row = index.cell_rows(bottom)
+        last_row = index.cell_rows(top)
+
+        columns = first_column[:, np.newaxis, np.newaxis] + np.arange(int((last_column - first_column).max()) + 1)
+        rows = first_row[:, np.newaxis, np.newaxis] + np.arange(int((last_row - first_row).max()) + 1)[:, np.newaxis]
+        inside = (columns <= last_column[:, np.newaxis, np.newaxis]) & (rows <= last_row[:, np.newaxis, np.newaxis])
+        tiles = index.covering[rows.clip(0, height - 1), columns.clip(0, width - 1)]
+        tiles = np.where(inside[..., np.newaxis], tiles, EMPTY)
+        return tiles.reshape(len(left), -1)
+
+    def sweep_many(self, low, high, across_low, across_high, move, vertical):
+        """sweep() of many boxes at once, every argument an array with one entry per box."""
+        if not move.any():
+            return np.zeros_like(move)
+        index = self.index
+        if vertical:
+            tiles = self.window(across_low, across_high, np.minimum(low, low + move), np.maximum(high, high + move))
+            tile_low, tile_high, across_tile_low, across_tile_high = index.bottom, index.top, index.left, index.right
+        else:
+            tiles = self.window(np.minimum(low, low + move), np.maximum(high, high + move), across_low, across_high)
+            tile_low, tile_high, across_tile_low, across_tile_high = index.left, index.right, index.bottom, index.top
+
+        present = tiles != EMPTY
+        tiles = np.where(present, tiles, 0)
+        low, high, across_low, across_high, move = (value[:, np.newaxis]
+                                                    for value in (low, high, across_low, across_high, move))
+        present &= (across_tile_low[tiles] < across_high - EPSILON) & (across_tile_high[tiles] > across_low + EPSILON)
+
+        # Distance to every tile ahead, in the direction of the move
+        ahead = np.where(move > 0, tile_low[tiles] - high, low - tile_high[tiles])
+        blocking = present & (ahead >= -EPSILON) & (ahead < np.abs(move))
+        stop = np.where(blocking, np.maximum(ahead, 0.0), np.inf).min(axis=1)
+        return np.where(stop < np.abs(move[:, 0]), np.copysign(stop, move[:, 0]), move[:, 0])
+
+
+class PlatformerPhysics:
+    """
+    Moves a sprite under gravity against tile walls and moving platforms.
+
+    A drop-in for the parts of arcade.PhysicsEnginePlatformer the game
+    uses: update() and can_jump().
+    """
+
+    def __init__(self, player_sprite, walls, gravity_constant=0.5, platforms=None, step_height=0.0):
+        """
+        :param player_sprite: The sprite moved. Its hit box is taken once,
+            as the box around its points; sprites are never rotated.
+        :param walls: TileWalls the sprite cannot move through.
+        :param gravity_constant: Downward acceleration per step.
+        :param platforms: Sprite lists of moving platforms, which the
+            sprite stands on and is carried along by. They are moved by
+            their owner, see activation.MovingPlatforms.
+        :param step_height: Highest ledge the sprite walks up onto
+            instead of being stopped by, standing in for the ramps the
+            arcade engine climbs.
+        """
+        self.player_sprite = player_sprite
+        self.walls = walls
+        self.gravity_constant = gravity_constant
+        self.platforms = list(platforms or [])
+        self.step_height = step_height
+
+        # Edges of the hit box relative to the center
+        scale_x, scale_y = player_sprite.scale_xy
+        points = player_sprite.hit_box.points
+        self.hit_left = min(x for x, _ in points) * scale_x
+        self.hit_right = max(x for x, _ in points) * scale_x
+        self.hit_bottom = min(y for _, y in points) * scale_y
+        self.hit_top = max(y for _, y in points) * scale_y
+
+    def _box(self, center_x, center_y):
+        return (center_x + self.hit_left, center_x + self.hit_right,
+                center_y + self.hit_bottom, center_y + self.hit_top)
+
+    def _platforms_in(self, left, right, bottom, top):
+        """Moving platforms overlapping the box."""
+        return [platform for platform_list in self.platforms for platform in platform_list
+                if platform.left < right - EPSILON and platform.right > left + EPSILON
+                and platform.bottom < top - EPSILON and platform.top > bottom + EPSILON]
+
+    def can_jump(self, y_distance=5):
+        """Whether a wall or platform is less than ``y_distance`` under the sprite."""
+        left, right, bottom, top = self._box(*self.player_sprite.position)
+        box = left, right, bottom - y_distance, top - y_distance
+        return self.walls.overlaps(*box) or bool(self._platforms_in(*box))
+
+    def update(self):
+        """Apply gravity and move the sprite by its velocity, stopping at walls and platforms."""
+        sprite = self.player_sprite
+        sprite.change_y -= self.gravity_constant
+        center_x, center_y = sprite.position
+        left, right, bottom, top = self._box(center_x, center_y)
+
+        # --- Move in the y direction
+        change_y = sprite.change_y
+        move_y = self.walls.sweep(bottom, top, left, right, change_y, vertical=True)
+        if move_y != change_y:
+            change_y = 0.0
+        change_x = sprite.change_x
+
+        # Platforms move on their own, so they are found where they are now
+        # rather than swept: the sprite lands on one it is above the middle of
+        for platform in self._platforms_in(left, right, min(bottom, bottom + move_y), max(top, top + move_y)):
+            if center_y >= platform.center_y and platform.top - bottom > move_y:
+                move_y = platform.top - bottom
+                change_y = min(0.0, platform.change_y)
+                change_x += platform.change_x
+            elif center_y < platform.center_y and platform.bottom - top < move_y:
+                move_y = platform.bottom - top
+                change_y = 0.0
+
+        sprite.change_y = change_y
+        center_y += move_y
+        bottom += move_y
+        top += move_y
+
+        # --- Move in the x direction
+        move_x = self.walls.sweep(left, right, bottom, top, change_x, vertical=False)
+        if move_x != change_x and self.step_height:
+            # Try the move again from as high as the ledge may be, then drop
+            # back down onto it
+            rise = self.walls.sweep(bottom, top, left, right, self.step_height, vertical=True)
+            step_x = self.walls.sweep(left, right, bottom + rise, top + rise, change_x, vertical=False)
+            drop = self.walls.sweep(bottom + rise, top + rise, left + step_x, right + step_x, -rise, vertical=True)
+            if abs(step_x) > abs(move_x) and rise + drop > 0:
+                move_x = step_x
+                center_y += rise + drop
+                bottom += rise + drop
+                top += rise + drop
+
+        for platform in self._platforms_in(min(left, left + move_x), max(right, right + move_x), bottom, top):
+            if move_x > 0 and platform.left >= right - EPSILON:
+                move_x = min(move_x, platform.left - right)
+            elif move_x < 0 and platform.right <= left + EPSILON:
+                move_x = max(move_x, platform.right - left)
+
+        sprite.position = center_x + move_x, center_y
+
+
+class Bodies:
+    """Many boxes falling under gravity and sliding along tile walls, moved together."""
+
+    def __init__(self, walls, center_x, center_y, width, height, gravity_constant=0.5):
+        """
+        :param walls: TileWalls the bodies cannot move through.
+        :param center_x: Starting center of every body; with center_y,
+            width and height, an array or a number for all of them.
+        """
+        self.walls = walls
+        self.gravity_constant = gravity_constant
+        self.center_x, self.center_y, width, height = np.broadcast_arrays(
+            *(np.asarray(value, dtype=float) for value in (center_x, center_y, width, height)))
+        self.center_x = self.center_x.copy()
+        self.center_y = self.center_y.copy()
+        self.half_width = width / 2
+        self.half_height = height / 2
+        self.change_x = np.zeros(len(self.center_x))
+        self.change_y = np.zeros(len(self.center_x))
+
+    def __len__(self):
+        return len(self.center_x)
+
+    def update(self):
+        """Apply gravity and move every body by its velocity, stopping at walls."""
+        self.change_y -= self.gravity_constant
+        left = self.center_x - self.half_width
+        right = self.center_x + self.half_width
+        bottom = self.center_y - self.half_height
+        top = self.center_y + self.half_height
+
+        move_y = self.walls.sweep_many(bottom, top, left, right, self.change_y, vertical=True)
+        self.change_y[move_y != self.change_y] = 0.0
+        self.center_y += move_y
+
+        move_x = self.walls.sweep_many(left, right, bottom + move_y, top + move_y, self.change_x, vertical=False)
+        self.center_x += move_x
+
+    def grounded(self, distance=5):
+        """Whether a wall is less than ``distance`` under each body."""
+        return self.walls.sweep_many(self.center_y - self.half_height, self.center_y + self.half_height,
+                                     self.center_x - self.half_width, self.center_x + self.half_width,
+                                     np.full(len(self), -float(distance)), vertical=True) > -distance
@@ -0,0 +1,162 @@
+"""
+Per-phase frame profiler.
+
+Code marks the phases of a frame with ``with profiler.phase("physics"):``.
+While the profiler is enabled, the start and duration of every phase are
+written into a ring buffer holding the last few seconds of frames, from
+which p50/p99 times are computed for the overlay, and which can be
+exported as CSV or as a Chrome trace (load it in chrome://tracing or
+Perfetto). While it is disabled, phase() hands back a shared do-nothing
+context manager, so the instrumentation costs next to nothing.
+"""
+
+import contextlib
+import csv
+import json
+import time
+
+import numpy as np
+
+# Frames kept in the ring buffer
+DEFAULT_CAPACITY = 600
+
+# Distinct phase names the buffer has room for
+MAX_PHASES = 32
+
+_NULL_PHASE = contextlib.nullcontext()
+
+
+class _Phase:
+    """Times one named phase into the current frame's row."""
+
+    __slots__ = ("profiler", "column", "start")
+
+    def __init__(self, profiler, column):
+        self.profiler = profiler
+        self.column = column
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.profiler.record(self.column, self.start, time.perf_counter() - self.start)
+
+
+class FrameProfiler:
+    """Ring buffer of per-phase timings, one row per frame."""
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self.enabled = False
+
+        # Phase names in order of first appearance; the index is the column
+        self.names = []
+        self._phases = {}
+
+        # Seconds since the epoch at which each phase started, and how long
+        # it ran, per frame. NaN where a phase did not run in a frame.
+        self.epoch = time.perf_counter()
+        self.starts = np.full((capacity, MAX_PHASES), np.nan)
+        self.durations = np.full((capacity, MAX_PHASES), np.nan)
+
+        # Number of frames started so far; row frame % capacity is the current one
+        self.frame = 0
+
+    def enable(self, enabled=True):
+        """Start (or stop) recording. Starting again clears the buffer."""
+        if enabled and not self.enabled:
+            self.clear()
+        self.enabled = enabled
+
+    def clear(self):
+        self.starts.fill(np.nan)
+        self.durations.fill(np.nan)
+        self.frame = 0
+
+    def next_frame(self):
+        """Start a new row. Call once at the start of every frame."""
+        if not self.enabled:
+            return
+        self.frame += 1
+        row = self.frame % self.capacity
+        self.starts[row] = np.nan
+        self.durations[row] = np.nan
+
+    def phase(self, name):
+        """Context manager timing a phase of the current frame."""
+        if not self.enabled:
+            return _NULL_PHASE
+        phase = self._phases.get(name)
+        if phase is None:
+            if len(self.names) == MAX_PHASES:
+                raise ValueError(f"More than {MAX_PHASES} profiler phases")
+            phase = self._phases[name] = _Phase(self, len(self.names))
+            self.names.append(name)
+        return phase
+
+    def record(self, column, start, duration):
+        """Add a timing; a phase that runs several times in a frame adds up."""
+        row = self.frame % self.capacity
+        if np.isnan(self.durations[row, column]):
+            self.starts[row, column] = start - self.epoch
+            self.durations[row, column] = duration
+        else:
+            self.durations[row, column] += duration
+
+    def _rows(self):
+        """Indices of the recorded rows, oldest first."""
+        count = min(self.frame + 1, self.capacity)
+        first = self.frame + 1 - count
+        return np.arange(first, self.frame + 1) % self.capacity
+
+    def percentiles(self, percentiles=(50, 99)):
+        """
+        Timings of every phase over the buffered frames.
+
+        :returns: Dict of phase name to a tuple with one duration in
+            seconds per requested percentile, for phases that ran.
+        """
+        durations = self.durations[self._rows()]
+        result = {}
+        for column, name in enumerate(self.names):
+            values = durations[:, column]
+            values = values[~np.isnan(values)]
+            if len(values):
+                result[name] = tuple(np.percentile(values, percentiles).tolist())
+        return result
+
+    def export_csv(self, file_name):
+        """Write one line per buffered frame with every phase's duration in ms."""
+        rows = self._rows()
+        with open(file_name, "w", newline="") as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(["frame"] + self.names)
+            for offset, row in enumerate(rows.tolist()):
+                frame = self.frame - len(rows) + 1 + offset
+                values = self.durations[row, :len(self.names)] * 1000
+                writer.writerow([frame] + ["" if np.isnan(value) else f"{value:.4f}" for value in values])
+
+    def export_chrome_trace(self, file_name):
+        """Write the buffered phases in the Chrome trace event format."""
+        events = []
+        for row in self._rows().tolist():
+            for column, name in enumerate(self.names):
+                duration = self.durations[row, column]
+                if np.isnan(duration):
+                    continue
+                events.append({
+                    "name": name,
+                    "ph": "X",
+                    "ts": self.starts[row, column] * 1e6,
+                    "dur": duration * 1e6,
+                    "pid": 0,
+                    "tid": 0,
+                })
+        events.sort(key=lambda event: (event["ts"], -event["dur"]))
+        with open(file_name, "w") as trace_file:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, trace_file)
+
+
+# The profiler every part of the game reports to
+profiler = FrameProfiler()
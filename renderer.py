@@ -0,0 +1,219 @@
+"""
+Baked rendering of static level layers.
+
+Tiles that never move do not need to be submitted as sprites every frame.
+Each chunk of the level (see level_cache.CHUNK_COLUMNS) is composited once
+into a texture per run of consecutive static layers, and a frame only draws
+the chunk textures overlapping the camera, one quad each. Draw calls and
+per-frame CPU time then depend on the screen size, not the map size.
+
+Animated tiles can't be baked; they stay sprites in the scene and are drawn
+in between as usual. Chunks are baked when the camera gets near and
+released once it has moved on, like LevelStreamer does with sprites.
+"""
+
+import math
+
+import arcade
+from arcade.gl.geometry import screen_rectangle
+
+import level_cache
+from streaming import DEFAULT_MARGIN_CHUNKS, chunk_range
+
+# Sprites are composited with premultiplied alpha so the baked texture
+# blends over the frame exactly like the sprites would have
+BAKE_BLEND = (arcade.gl.SRC_ALPHA, arcade.gl.ONE_MINUS_SRC_ALPHA,
+              arcade.gl.ONE, arcade.gl.ONE_MINUS_SRC_ALPHA)
+DRAW_BLEND = (arcade.gl.ONE, arcade.gl.ONE_MINUS_SRC_ALPHA)
+
+VERTEX_SHADER = """
+#version 330
+
+uniform WindowBlock {
+    mat4 projection;
+    mat4 view;
+} window;
+
+in vec2 in_vert;
+in vec2 in_uv;
+out vec2 v_uv;
+
+void main() {
+    gl_Position = window.projection * window.view * vec4(in_vert, 0.0, 1.0);
+    v_uv = in_uv;
+}
+"""
+
+FRAGMENT_SHADER = """
+#version 330
+
+uniform sampler2D baked;
+
+in vec2 v_uv;
+out vec4 f_color;
+
+void main() {
+    f_color = texture(baked, v_uv);
+}
+"""
+
+
+class StaticLayerRenderer:
+    """Draws the static tiles of some layers from baked chunk textures."""
+
+    def __init__(self, level, layers, margin_chunks=DEFAULT_MARGIN_CHUNKS):
+        """
+        :param level: The LevelData to bake.
+        :param layers: Names of the layers whose static tiles are baked.
+            The scene's sprite lists for these layers are only drawn if the
+            layer has animated tiles, so they should hold nothing else.
+        :param margin_chunks: Extra chunks to keep baked on each side.
+        """
+        self.level = level
+        self.ctx = arcade.get_window().ctx
+        self.program = self.ctx.program(vertex_shader=VERTEX_SHADER, fragment_shader=FRAGMENT_SHADER)
+        self.margin_chunks = margin_chunks
+
+        # Which records of each layer are static
+        self.static = {}
+        # Baked layers that still have animated sprites to draw
+        self.animated_layers = set()
+        with_sprites = [layer["name"] for layer in level.layers if layer["sprites"] is not None]
+        for name in layers:
+            if name not in with_sprites:
+                continue
+            static = level.sprites(name)["animation"] < 0
+            if not static.any():
+                continue
+            self.static[name] = static
+            if not static.all():
+                self.animated_layers.add(name)
+
+        # Runs of consecutive baked layers, each baked into one texture per chunk
+        self.runs = []
+        run = None
+        for layer in level.layers:
+            if layer["sprites"] is None:
+                continue
+            if layer["name"] in self.static:
+                if run is None:
+                    run = []
+                    self.runs.append(run)
+                run.append(layer["name"])
+            else:
+                run = None
+        self.run_starts = {run[0]: i for i, run in enumerate(self.runs)}
+
+        # (run, chunk) -> (texture, geometry), or None for empty chunks
+        self.baked = {}
+
+        # Range of chunks wanted by the last update(), as (first, last)
+        self.wanted = (0, -1)
+
+    def chunk_range(self, left, right):
+        """First and last chunk needed to cover the given horizontal span."""
+        return chunk_range(self.level, left, right, self.margin_chunks)
+
+    def update(self, left, right):
+        """Bake the chunks covering [left, right] and release the others."""
+        for _ in self.bake_steps(left, right):
+            pass
+
+    def bake_steps(self, left, right):
+        """Generator doing what update() does, one chunk baked per step, e.g. as a loading.AssetLoader upload."""
+        first, last = self.chunk_range(left, right)
+        if (first, last) == self.wanted:
+            return
+
+        for key in list(self.baked):
+            if not first <= key[1] <= last:
+                del self.baked[key]
+
+        for run in range(len(self.runs)):
+            for chunk in range(first, last + 1):
+                if (run, chunk) not in self.baked:
+                    self.baked[run, chunk] = self.bake(run, chunk)
+                    yield
+
+        # Only once everything is baked, so an update() after an unfinished
+        # bake_steps() bakes the rest
+        self.wanted = (first, last)
+
+    def _static_sprites(self, run, chunk):
+        """Static sprites of a run that overlap a chunk, in draw order."""
+        level = self.level
+        x0 = chunk * level.chunk_width
+        x1 = x0 + level.chunk_width
+        sprites = arcade.SpriteList()
+        for name in self.runs[run]:
+            # Sprites of neighbouring chunks can stick out into this one
+            spread = math.ceil(level.reach(name) / level.chunk_width)
+            records = level.sprites(name)
+            offsets = level.chunk_offsets(name)
+            static = self.static[name]
+            first = max(chunk - spread, 0)
+            last = min(chunk + spread, level.chunk_count - 1)
+            for index in range(int(offsets[first]), int(offsets[last + 1])):
+                if not static[index]:
+                    continue
+                sprite = level_cache.make_sprite(level, records[index])
+                if sprite.right > x0 and sprite.left < x1:
+                    sprites.append(sprite)
+        return sprites
+
+    def bake(self, run, chunk):
+        """Composite the static sprites of a run in a chunk into a texture."""
+        sprites = self._static_sprites(run, chunk)
+        if not sprites:
+            return None
+
+        left = chunk * self.level.chunk_width
+        bottom = math.floor(min(sprite.bottom for sprite in sprites))
+        top = math.ceil(max(sprite.top for sprite in sprites))
+        size = math.ceil(self.level.chunk_width), top - bottom
+
+        texture = self.ctx.texture(size, components=4)
+        framebuffer = self.ctx.framebuffer(color_attachments=[texture])
+        projection = self.ctx.projection_2d_matrix
+        with framebuffer.activate():
+            framebuffer.clear()
+            self.ctx.projection_2d = (left, left + size[0], bottom, top)
+            sprites.draw(blend_function=BAKE_BLEND)
+        self.ctx.projection_2d_matrix = projection
+
+        return texture, screen_rectangle(left, bottom, size[0], size[1])
+
+    def draw_run(self, run, first, last):
+        """Draw the baked chunks ``first`` to ``last`` of a run."""
+        self.ctx.enable(self.ctx.BLEND)
+        self.ctx.blend_func = DRAW_BLEND
+        for chunk in range(first, last + 1):
+            baked = self.baked.get((run, chunk))
+            if baked is not None:
+                texture, geometry = baked
+                texture.use(0)
+                geometry.render(self.program)
+        self.ctx.blend_func = self.ctx.BLEND_DEFAULT
+
+    def draw(self, scene, names, left, right):
+        """
+        Draw the scene's layers in order with baked layers from their chunk textures.
+
+        :param names: Sprite list names of the scene, in draw order.
+        :param left: Left edge of the camera in world coordinates.
+        :param right: Right edge of the camera in world coordinates.
+        """
+        self.update(left, right)
+        # The margin chunks are only baked ahead of time, never drawn; a
+        # chunk's texture is exactly as wide as the chunk
+        first, last = chunk_range(self.level, left, right, margin_chunks=0)
+        for name in names:
+            if name in self.run_starts:
+                self.draw_run(self.run_starts[name], first, last)
+            if name in self.static and name not in self.animated_layers:
+                continue
+            scene[name].draw()
+
+    def texture_count(self):
+        """Number of chunk textures currently baked."""
+        return sum(baked is not None for baked in self.baked.values())
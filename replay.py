@@ -0,0 +1,174 @@
+"""
+Compact input recordings and deterministic replays.
+
+The game logic only depends on the held input bits handed to each step,
+so a session is recorded as those bits, one value per tick, and stored as
+runs of unchanged keys: a few bytes per key change. Every few ticks a
+checksum of the game state is stored too. Replaying feeds the same keys
+back tick by tick and compares the checksums, so a replay that diverges
+from the recorded session is caught close to where it happened.
+
+File layout, little endian:
+
+- header: magic, version, checksum interval, tick count, length of the
+  map list followed by the map list as JSON
+- key runs: run count, then per run the keys byte and a varint length
+- checksums: count, then one uint32 per interval
+"""
+
+import json
+import struct
+
+import numpy as np
+
+MAGIC = b"SVIN"
+
+# Bumped with the file layout, and whenever the game logic changes so that
+# older recordings would no longer replay
+VERSION = 2
+
+# Ticks between two state checksums
+DEFAULT_CHECKSUM_INTERVAL = 60
+
+_HEADER = struct.Struct("<4sHHIH")
+_COUNT = struct.Struct("<I")
+
+
+class ReplayDivergence(Exception):
+    """A replay no longer matches the game state it recorded."""
+
+    def __init__(self, tick, expected, actual):
+        super().__init__(f"Replay diverged at tick {tick}: state checksum {actual:08x}, recorded {expected:08x}")
+        self.tick = tick
+        self.expected = expected
+        self.actual = actual
+
+
+def _write_varint(output, value):
+    while value >= 0x80:
+        output.append(value & 0x7F | 0x80)
+        value >>= 7
+    output.append(value)
+
+
+def _read_varint(data, offset):
+    value = shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+class InputRecording:
+    """The keys of every tick of a session, and the state checksums taken along the way."""
+
+    def __init__(self, maps, checksum_interval=DEFAULT_CHECKSUM_INTERVAL):
+        """
+        :param maps: Map names the session played, in order.
+        :param checksum_interval: Ticks between two state checksums.
+        """
+        self.maps = list(maps)
+        self.checksum_interval = checksum_interval
+
+        # Held input bits handed to every step, and the checksum after every interval
+        self.keys = bytearray()
+        self.checksums = []
+
+    def __len__(self):
+        return len(self.keys)
+
+    def record(self, keys, state):
+        """
+        Add the keys of a tick, after the step that used them.
+
+        :param state: Object whose checksum() describes the game state,
+            called once every checksum interval.
+        """
+        self.keys.append(keys)
+        if len(self.keys) % self.checksum_interval == 0:
+            self.checksums.append(state.checksum())
+
+    def save(self, file_name):
+        maps = json.dumps(self.maps).encode()
+        output = bytearray(_HEADER.pack(MAGIC, VERSION, self.checksum_interval, len(self.keys), len(maps)))
+        output += maps
+
+        # Runs of ticks with the same keys
+        keys = np.frombuffer(bytes(self.keys), dtype=np.uint8)
+        starts = np.flatnonzero(np.diff(keys.astype(np.int16), prepend=-1))
+        lengths = np.diff(starts, append=len(keys))
+        output += _COUNT.pack(len(starts))
+        for value, length in zip(keys[starts].tolist(), lengths.tolist()):
+            output.append(value)
+            _write_varint(output, length)
+
+        output += _COUNT.pack(len(self.checksums))
+        output += np.array(self.checksums, dtype="<u4").tobytes()
+
+        with open(file_name, "wb") as recording_file:
+            recording_file.write(output)
+
+    @classmethod
+    def load(cls, file_name):
+        with open(file_name, "rb") as recording_file:
+            data = recording_file.read()
+
+        magic, version, interval, ticks, maps_length = _HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{file_name} is not a version {VERSION} input recording")
+        offset = _HEADER.size
+        recording = cls(json.loads(data[offset:offset + maps_length]), interval)
+        offset += maps_length
+
+        (runs,) = _COUNT.unpack_from(data, offset)
+        offset += _COUNT.size
+        for _ in range(runs):
+            value = data[offset]
+            length, offset = _read_varint(data, offset + 1)
+            recording.keys += bytes([value]) * length
+        if len(recording.keys) != ticks:
+            raise ValueError(f"{file_name} holds {len(recording.keys)} ticks instead of {ticks}")
+
+        (count,) = _COUNT.unpack_from(data, offset)
+        offset += _COUNT.size
+        recording.checksums = np.frombuffer(data, dtype="<u4", count=count, offset=offset).tolist()
+        return recording
+
+
+class ReplayPlayer:
+    """Feeds a recording back one tick at a time and checks the game stays on track."""
+
+    def __init__(self, recording):
+        self.recording = recording
+
+        # Ticks replayed so far, and checksums that matched
+        self.tick = 0
+        self.verified = 0
+
+    @property
+    def done(self):
+        return self.tick >= len(self.recording)
+
+    def next_keys(self):
+        """Keys for the next step."""
+        return self.recording.keys[self.tick]
+
+    def verify(self, state):
+        """
+        Call after the step that used next_keys().
+
+        :raises ReplayDivergence: When a checksum is due and does not match.
+        """
+        self.tick += 1
+        if self.tick % self.recording.checksum_interval:
+            return
+        index = self.tick // self.recording.checksum_interval - 1
+        if index < len(self.recording.checksums):
+            expected = self.recording.checksums[index]
+            actual = state.checksum()
+            if actual != expected:
+                raise ReplayDivergence(self.tick, expected, actual)
+            self.verified += 1
@@ -0,0 +1,131 @@
+"""
+Chunked level streaming.
+
+Only the chunks of a compiled level that are near the camera have sprites.
+As the camera moves, chunks ahead are materialized from their records and
+chunks left behind are released, so the number of live sprites, and the
+work done on them each frame, does not depend on how long the level is.
+"""
+
+import math
+
+import numpy as np
+
+import level_cache
+
+# Chunks kept loaded on each side of the ones the camera overlaps
+DEFAULT_MARGIN_CHUNKS = 1
+
+
+def chunk_range(level, left, right, margin_chunks=DEFAULT_MARGIN_CHUNKS, reach=0):
+    """
+    First and last chunk of a level needed to cover a horizontal span.
+
+    :param margin_chunks: Extra chunks on each side.
+    :param reach: How far, in pixels, sprites stick out of their chunk.
+    """
+    width = level.chunk_width
+    first = math.floor((left - reach) / width) - margin_chunks
+    last = math.floor((right + reach) / width) + margin_chunks
+    return max(first, 0), min(last, level.chunk_count - 1)
+
+
+class LevelStreamer:
+    """Keeps the sprite lists of streamed layers filled around the camera."""
+
+    def __init__(self, level, scene, layers, margin_chunks=DEFAULT_MARGIN_CHUNKS, skip=None):
+        """
+        :param level: The LevelData to stream from.
+        :param scene: Scene whose (empty) sprite lists receive the sprites.
+        :param layers: Names of the streamed layers.
+        :param margin_chunks: Extra chunks to keep loaded on each side.
+        :param skip: Per layer callable taking a record index and returning
+            True for records that should not be materialized, e.g. coins
+            that were already collected.
+        """
+        self.level = level
+        self.scene = scene
+        self.layers = [name for name in layers if name in level.layer_names]
+        self.margin_chunks = margin_chunks
+        self.skip = skip or {}
+
+        # Sprites stick out of their chunk by at most this many pixels
+        self.reach = max((level.reach(name) for name in self.layers), default=0)
+
+        # chunk -> {layer name: [sprites]}
+        self.loaded = {}
+
+        # layer name -> {record index: sprite} for every materialized sprite
+        self.sprites = {name: {} for name in self.layers}
+
+        # Range of chunks wanted by the last update(), as (first, last)
+        self.wanted = (0, -1)
+
+    def chunk_range(self, left, right):
+        """First and last chunk needed to cover the given horizontal span."""
+        return chunk_range(self.level, left, right, self.margin_chunks, self.reach)
+
+    def update(self, left, right):
+        """Load the chunks covering [left, right] and release the others."""
+        first, last = self.chunk_range(left, right)
+        if (first, last) == self.wanted:
+            return
+        self.wanted = (first, last)
+
+        for chunk in list(self.loaded):
+            if not first <= chunk <= last:
+                self.unload(chunk)
+
+        for chunk in range(first, last + 1):
+            if chunk not in self.loaded:
+                self.load(chunk)
+
+    def load(self, chunk):
+        self.loaded[chunk] = {name: self._materialize(chunk, name) for name in self.layers}
+
+    def _materialize(self, chunk, name):
+        offsets = self.level.chunk_offsets(name)
+        records = self.level.sprites(name)
+        skip = self.skip.get(name)
+        sprite_list = self.scene[name]
+        by_index = self.sprites[name]
+        sprites = []
+        for index in range(int(offsets[chunk]), int(offsets[chunk + 1])):
+            if skip is not None and skip(index):
+                continue
+            sprite = level_cache.make_sprite(self.level, records[index])
+            sprite.properties["record_index"] = index
+            sprite_list.append(sprite)
+            sprites.append(sprite)
+            by_index[index] = sprite
+        return sprites
+
+    def unload(self, chunk):
+        for name, sprites in self.loaded.pop(chunk).items():
+            self._release(name, sprites)
+
+    def _release(self, name, sprites):
+        by_index = self.sprites[name]
+        for sprite in sprites:
+            sprite.remove_from_sprite_lists()
+            del by_index[sprite.properties["record_index"]]
+
+    def reload(self, name):
+        """Materialize one layer of the loaded chunks again, e.g. after its skip set changed."""
+        for layers in self.loaded.values():
+            self._release(name, layers[name])
+        for chunk, layers in self.loaded.items():
+            layers[name] = self._materialize(chunk, name)
+
+    def discard(self, name, index):
+        """Release the sprite of one record, e.g. a collected coin, if it is materialized."""
+        sprite = self.sprites[name].pop(index, None)
+        if sprite is None:
+            return
+        sprite.remove_from_sprite_lists()
+        chunk = int(np.searchsorted(self.level.chunk_offsets(name), index, side="right")) - 1
+        self.loaded[chunk][name].remove(sprite)
+
+    def sprite_count(self):
+        """Number of sprites currently materialized."""
+        return sum(len(sprites) for layers in self.loaded.values() for sprites in layers.values())
@@ -0,0 +1,82 @@
+"""
+Process-wide texture and animation registry.
+
+Every image is decoded, mirrored and given a hit box once per process.
+Sprites only hold references to the shared textures, so spawning another
+enemy or restarting the level does not load anything. Images in the loaded
+asset pack are cut from its sheets instead of decoded (see assets.py).
+
+Textures are loaded from the asset loader and level prefetch threads while
+the main thread reads the registry, so every access goes through a lock.
+Images are decoded outside of it; if two threads load the same image at
+once, the first one stored wins.
+"""
+
+import threading
+
+import arcade
+
+import assets
+
+# file name -> (right facing, left facing) textures
+_texture_pairs = {}
+
+# (path format, first, last) -> tuple of texture pairs
+_animations = {}
+
+# Guards both dicts above
+_lock = threading.Lock()
+
+
+def load_texture_pair(file_name):
+    """Get the right/left facing textures for an image, loading them on first use."""
+    with _lock:
+        pair = _texture_pairs.get(file_name)
+    if pair is None:
+        pack = assets.current()
+        if pack is not None and file_name in pack:
+            pair = pack.texture_pair(file_name)
+        else:
+            pair = arcade.load_texture_pair(file_name)
+        with _lock:
+            pair = _texture_pairs.setdefault(file_name, pair)
+    return pair
+
+
+def load_animation(path_format, first, last):
+    """
+    Get the texture pairs of a numbered frame sequence.
+
+    :param path_format: File name with a ``{}`` where the frame number goes.
+    :param first: Number of the first frame.
+    :param last: Number of the last frame, inclusive.
+    :returns: Tuple of (right facing, left facing) texture pairs.
+    """
+    key = (path_format, first, last)
+    with _lock:
+        frames = _animations.get(key)
+    if frames is None:
+        frames = tuple(load_texture_pair(path_format.format(i)) for i in range(first, last + 1))
+        with _lock:
+            frames = _animations.setdefault(key, frames)
+    return frames
+
+
+def loaded_textures():
+    """Every texture loaded so far, both facings of every image."""
+    with _lock:
+        pairs = list(_texture_pairs.values())
+    return [texture for pair in pairs for texture in pair]
+
+
+def loaded_count():
+    """Number of distinct images loaded so far."""
+    with _lock:
+        return len(_texture_pairs)
+
+
+def clear():
+    """Forget every loaded texture."""
+    with _lock:
+        _texture_pairs.clear()
+        _animations.clear()
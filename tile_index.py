@@ -0,0 +1,207 @@
+"""
+Tile-grid collision index.
+
+Coins and hazards sit on a tile layer, so there is no need to test the
+player against every sprite of the layer, or even to keep a spatial hash
+of them. The index maps each grid cell to the record of the tile in it,
+and to the records of the tiles whose hit box bounds overlap the cell,
+which can be more than one when hit boxes stick out of their tile. A
+query looks up the few cells the player's bounding box overlaps and only
+tests the hit boxes of the tiles found there. Removing a tile, e.g. a
+collected coin, just clears it from its cells.
+"""
+
+import math
+
+import numpy as np
+from arcade.geometry import are_polygons_intersecting
+
+# Value of a cell holding no tile
+EMPTY = -1
+
+# Queries with more candidate tiles than this test them all at once with NumPy
+VECTORIZE_ABOVE = 16
+
+
+def _normals(polygons):
+    """Normal of every edge of polygons shaped (..., points, 2)."""
+    following = np.roll(polygons, -1, axis=-2)
+    return np.stack([following[..., 1] - polygons[..., 1], polygons[..., 0] - following[..., 0]], axis=-1)
+
+
+def _separated(projected_a, projected_b):
+    """True where the projections, reduced over their last axis, do not overlap."""
+    return ((projected_a.max(axis=-1) <= projected_b.min(axis=-1))
+            | (projected_b.max(axis=-1) <= projected_a.min(axis=-1)))
+
+
+def _intersecting(polygon, polygons):
+    """
+    arcade.geometry.are_polygons_intersecting() of one polygon against many.
+
+    :param polygon: Array of shape (points, 2).
+    :param polygons: Array of shape (count, points, 2).
+    :returns: Boolean array with one entry per polygon in ``polygons``.
+    """
+    # Axes of the single polygon, shared by all pairs
+    axes = _normals(polygon)
+    separated = _separated((polygon @ axes.T).T[np.newaxis], np.einsum("mkd,jd->mjk", polygons, axes))
+
+    # Axes of each of the other polygons
+    axes = _normals(polygons)
+    separated |= _separated(np.einsum("pd,mkd->mkp", polygon, axes), np.einsum("mjd,mkd->mkj", polygons, axes))
+
+    return ~separated.any(axis=-1)
+
+
+class TileIndex:
+    """Which sprite record of a tile layer sits in each grid cell."""
+
+    def __init__(self, level, name):
+        """
+        :param level: The LevelData holding the layer.
+        :param name: Name of a tile layer.
+        """
+        records = level.sprites(name)
+        gids = level.gids(name)
+        if np.count_nonzero(gids) != len(records):
+            raise ValueError(f"Layer '{name}' has {np.count_nonzero(gids)} tiles but {len(records)} sprites")
+
+        # Size of a cell in world pixels, taking the layer's own scaling into account
+        scale = float(records["scale_x"][0]) if len(records) else level.scaling
+        self.cell_width = level.tile_width * scale
+        self.cell_height = level.tile_height * scale
+
+        # Larger side of every tile, for the same distance early-out as
+        # arcade.check_for_collision so both always agree
+        textures = level.header["textures"]
+        widths = np.array([textures[texture]["rect"][2] for texture in records["texture"]])
+        heights = np.array([textures[texture]["rect"][3] for texture in records["texture"]])
+        self.sizes = np.maximum(widths * records["scale_x"], heights * records["scale_y"])
+        self.center_x = np.array(records["center_x"])
+        self.center_y = np.array(records["center_y"])
+        self._sizes = self.sizes.tolist()
+        self._centers = list(zip(self.center_x.tolist(), self.center_y.tolist()))
+
+        # Hit box of every tile in world coordinates, and its bounds. Tiles are never rotated.
+        self.hit_boxes = []
+        for record in records:
+            points = level.header["hit_boxes"][record["hit_box"]]
+            self.hit_boxes.append([(float(record["center_x"] + x * record["scale_x"]),
+                                    float(record["center_y"] + y * record["scale_y"])) for x, y in points])
+        # Hit boxes with the same number of points, stacked for the separating axis test
+        self.point_counts = np.array([len(points) for points in self.hit_boxes])
+        self.polygons = {count: np.array([points if len(points) == count else [(np.nan, np.nan)] * count
+                                          for points in self.hit_boxes])
+                         for count in np.unique(self.point_counts).tolist()}
+        self.left = np.array([min(x for x, _ in points) for points in self.hit_boxes])
+        self.right = np.array([max(x for x, _ in points) for points in self.hit_boxes])
+        self.bottom = np.array([min(y for _, y in points) for points in self.hit_boxes])
+        self.top = np.array([max(y for _, y in points) for points in self.hit_boxes])
+
+        # Row 0 is the bottom row, unlike the Tiled data
+        self.columns = np.floor(records["center_x"] / self.cell_width).astype(np.int64)
+        self.rows = np.floor(records["center_y"] / self.cell_height).astype(np.int64)
+        self.grid = np.full(gids.shape, EMPTY, dtype=np.int32)
+        self.grid[self.rows, self.columns] = np.arange(len(records))
+
+        # Cells the bounds of every hit box overlap, as [first, last] ranges
+        height, width = gids.shape
+        self.first_columns = self.cell_columns(self.left)
+        self.last_columns = self.cell_columns(self.right)
+        self.first_rows = self.cell_rows(self.bottom)
+        self.last_rows = self.cell_rows(self.top)
+
+        # Records covering every cell, as lists for single queries and as
+        # an array padded with EMPTY to the most a cell has for many at once
+        covering = [[[] for _ in range(width)] for _ in range(height)]
+        for index, (first_column, last_column, first_row, last_row) in enumerate(zip(
+                self.first_columns.tolist(), self.last_columns.tolist(),
+                self.first_rows.tolist(), self.last_rows.tolist())):
+            for row in range(first_row, last_row + 1):
+                for column in range(first_column, last_column + 1):
+                    covering[row][column].append(index)
+        depth = max((len(cell) for cells in covering for cell in cells), default=0)
+        self._initial_covering = np.full((height, width, depth), EMPTY, dtype=np.int32)
+        for row, cells in enumerate(covering):
+            for column, cell in enumerate(cells):
+                self._initial_covering[row, column, :len(cell)] = cell
+        self.covering = self._initial_covering.copy()
+        self._cells = covering
+
+    def __len__(self):
+        return len(self.hit_boxes)
+
+    def cell_columns(self, x):
+        """Columns of the cells at ``x``, those past the edges in the first or last one."""
+        return np.clip(np.floor(x / self.cell_width).astype(np.int64), 0, self.grid.shape[1] - 1)
+
+    def cell_rows(self, y):
+        """Rows of the cells at ``y``, those past the edges in the first or last one."""
+        return np.clip(np.floor(y / self.cell_height).astype(np.int64), 0, self.grid.shape[0] - 1)
+
+    def cells(self, left, right, bottom, top):
+        """Record indices of the tiles covering the cells overlapping the box, as a list."""
+        height, width = self.grid.shape
+        first_column = min(max(math.floor(left / self.cell_width), 0), width - 1)
+        last_column = min(max(math.floor(right / self.cell_width), 0), width - 1)
+        first_row = min(max(math.floor(bottom / self.cell_height), 0), height - 1)
+        last_row = min(max(math.floor(top / self.cell_height), 0), height - 1)
+        found = []
+        for row in self._cells[first_row:last_row + 1]:
+            for cell in row[first_column:last_column + 1]:
+                found.extend(cell)
+        # A tile covering several of the cells is found in each of them
+        return list(dict.fromkeys(found)) if len(found) > 1 else found
+
+    def collisions(self, sprite):
+        """Record indices of the tiles colliding with a sprite."""
+        points = sprite.hit_box.get_adjusted_points()
+        xs = [x for x, _ in points]
+        ys = [y for _, y in points]
+        left, right, bottom, top = min(xs), max(xs), min(ys), max(ys)
+        candidates = self.cells(left, right, bottom, top)
+        if len(candidates) <= VECTORIZE_ABOVE:
+            return [index for index in candidates if self._collides(sprite, points, index)]
+        candidates = np.array(candidates)
+
+        # Bounding boxes must overlap and centers be close enough
+        radius = (max(sprite.width, sprite.height) + self.sizes[candidates]) * 0.71
+        near = ((self.left[candidates] <= right) & (self.right[candidates] >= left)
+                & (self.bottom[candidates] <= top) & (self.top[candidates] >= bottom)
+                & ((self.center_x[candidates] - sprite.center_x) ** 2
+                   + (self.center_y[candidates] - sprite.center_y) ** 2 <= radius * radius))
+        candidates = candidates[near]
+        hits = np.zeros(len(candidates), dtype=bool)
+        counts = self.point_counts[candidates]
+        for count, polygons in self.polygons.items():
+            group = counts == count
+            if group.any():
+                hits[group] = _intersecting(np.array(points, dtype=float), polygons[candidates[group]])
+        return candidates[hits].tolist()
+
+    def _collides(self, sprite, points, index):
+        # Same distance early-out as arcade.check_for_collision
+        radius = (max(sprite.width, sprite.height) + self._sizes[index]) * 0.71
+        x, y = self._centers[index]
+        return ((sprite.center_x - x) ** 2 + (sprite.center_y - y) ** 2 <= radius * radius
+                and are_polygons_intersecting(points, self.hit_boxes[index]))
+
+    def remove(self, index):
+        """Take a tile out of the index."""
+        self.grid[self.rows[index], self.columns[index]] = EMPTY
+        block = self.covering[self.first_rows[index]:self.last_rows[index] + 1,
+                              self.first_columns[index]:self.last_columns[index] + 1]
+        block[block == index] = EMPTY
+        for row in self._cells[self.first_rows[index]:self.last_rows[index] + 1]:
+            for cell in row[self.first_columns[index]:self.last_columns[index] + 1]:
+                if index in cell:
+                    cell.remove(index)
+
+    def restore(self, present):
+        """Put back exactly the tiles flagged in a boolean mask, one per record."""
+        self.grid[self.rows, self.columns] = np.where(present, np.arange(len(self)), EMPTY)
+        # EMPTY indexes the extra False at the end
+        keep = np.append(present, False)
+        self.covering = np.where(keep[self._initial_covering], self._initial_covering, EMPTY).astype(np.int32)
+        self._cells = [[[index for index in cell if index != EMPTY] for cell in row] for row in self.covering.tolist()]
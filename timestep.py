@@ -0,0 +1,99 @@
+"""
+Fixed-timestep scheduling.
+
+The game logic advances in ticks of a fixed length whatever the frame
+rate. Every frame adds its duration to an accumulator, and as many ticks
+run as there are whole tick lengths in it; what is left over says how far
+along the next tick the frame is drawn, and sprites are drawn that far
+between where the last two ticks left them. A frame runs a few ticks at
+most: when the logic falls further behind, after a hitch or while the
+window is dragged, the backlog is dropped and the game slows down for a
+moment instead of spiralling into ever longer frames.
+"""
+
+import contextlib
+import math
+
+# Most ticks run in one frame before the backlog is dropped
+DEFAULT_MAX_TICKS = 5
+
+# Fraction of a tick the accumulator may fall short of a whole tick by and
+# still run it, so frames exactly one tick long are not lost to rounding
+TOLERANCE = 1e-6
+
+
+class FixedTimestep:
+    """Turns frame durations into a number of fixed-length ticks to run."""
+
+    def __init__(self, rate, max_ticks=DEFAULT_MAX_TICKS):
+        """
+        :param rate: Ticks per second.
+        :param max_ticks: Most ticks run for a single frame.
+        """
+        self.rate = rate
+        self.delta = 1 / rate
+        self.max_ticks = max_ticks
+
+        # Seconds not turned into ticks yet
+        self.accumulator = 0.0
+
+        # Ticks handed out, and seconds of backlog dropped, so far
+        self.ticks = 0
+        self.dropped = 0.0
+
+    def advance(self, delta_time):
+        """Add the duration of a frame and return how many ticks to run for it."""
+        self.accumulator += delta_time
+        ticks = math.floor(self.accumulator / self.delta + TOLERANCE)
+        self.accumulator = max(self.accumulator - ticks * self.delta, 0.0)
+        if ticks > self.max_ticks:
+            self.dropped += (ticks - self.max_ticks) * self.delta
+            ticks = self.max_ticks
+        self.ticks += ticks
+        return ticks
+
+    @property
+    def alpha(self):
+        """How far along the next tick the current frame is, from 0 to 1."""
+        return min(self.accumulator / self.delta, 1.0)
+
+    def reset(self):
+        """Forget the time accumulated, e.g. after a hitch that should not be caught up on."""
+        self.accumulator = 0.0
+
+
+class SpriteInterpolator:
+    """Draws sprites between the positions of the last two ticks."""
+
+    def __init__(self):
+        # Position of every sprite before the last tick
+        self.previous = {}
+
+    def capture(self, sprites):
+        """Remember where the sprites are; call right before the tick they are drawn after."""
+        self.previous = {sprite: sprite.position for sprite in sprites}
+
+    def clear(self):
+        """Draw the sprites where they are until the next capture(), e.g. after a teleport."""
+        self.previous = {}
+
+    @contextlib.contextmanager
+    def blend(self, sprites, alpha):
+        """
+        Move the sprites ``alpha`` of the way from their captured positions
+        to their current ones for the duration of the block.
+        """
+        moved = []
+        for sprite in sprites:
+            previous = self.previous.get(sprite)
+            if previous is None:
+                continue
+            current = sprite.position
+            moved.append((sprite, current))
+            sprite.position = (previous[0] + (current[0] - previous[0]) * alpha,
+                               previous[1] + (current[1] - previous[1]) * alpha)
+        try:
+            yield
+        finally:
+            for sprite, current in moved:
+                sprite.position = current